@@ -4,15 +4,25 @@
 from pyStratAlpha.analyzer.factor.cleanData import adjust_factor_date
 from pyStratAlpha.analyzer.factor.cleanData import get_multi_index_data
 from pyStratAlpha.analyzer.factor.cleanData import get_report_date
+from pyStratAlpha.analyzer.factor.cleanData import get_universe_multi_factor
 from pyStratAlpha.analyzer.factor.cleanData import get_universe_single_factor
 from pyStratAlpha.analyzer.factor.cleanData import factor_na_handler
 from pyStratAlpha.analyzer.factor.dynamicContext import DCAMAnalyzer
 from pyStratAlpha.analyzer.factor.dynamicContext import DCAMHelper
+from pyStratAlpha.analyzer.factor.dynamicContext import SecGroupCache
+from pyStratAlpha.analyzer.factor.factorCache import FactorCache
+from pyStratAlpha.analyzer.factor.factorPanel import FactorPanel
+from pyStratAlpha.analyzer.factor.factorStore import FactorStore
+from pyStratAlpha.analyzer.factor.factorStore import convert_csv_to_factor_store
+from pyStratAlpha.analyzer.factor.factorStore import get_factor_store_path
 from pyStratAlpha.analyzer.factor.loadData import FactorLoader
 from pyStratAlpha.analyzer.factor.loadData import get_data_div
 from pyStratAlpha.analyzer.factor.norm import get_industry_matrix
 from pyStratAlpha.analyzer.factor.norm import neutralize
+from pyStratAlpha.analyzer.factor.norm import neutralize_batch
 from pyStratAlpha.analyzer.factor.norm import normalize
+from pyStratAlpha.analyzer.factor.norm import normalize_multi_factor_data
+from pyStratAlpha.analyzer.factor.norm import normalize_single_factor_data
 from pyStratAlpha.analyzer.factor.norm import standardize
 from pyStratAlpha.analyzer.factor.norm import winsorize
 from pyStratAlpha.analyzer.factor.selector import Selector
@@ -20,14 +30,25 @@ from pyStratAlpha.analyzer.factor.selector import Selector
 __all__ = ['get_report_date',
            'adjust_factor_date',
            'get_universe_single_factor',
+           'get_universe_multi_factor',
            'factor_na_handler',
            'get_multi_index_data',
            'DCAMAnalyzer',
            'DCAMHelper',
+           'SecGroupCache',
            'winsorize',
            'standardize',
            'get_industry_matrix',
            'normalize',
+           'neutralize',
+           'neutralize_batch',
+           'normalize_single_factor_data',
+           'normalize_multi_factor_data',
            'get_data_div',
            'FactorLoader',
+           'FactorCache',
+           'FactorPanel',
+           'FactorStore',
+           'convert_csv_to_factor_store',
+           'get_factor_store_path',
            'Selector']
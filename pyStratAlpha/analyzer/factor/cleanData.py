@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 import datetime
+import weakref
+import numpy as np
 import pandas as pd
 from PyFin.DateUtilities import Calendar
 from PyFin.DateUtilities import Date
 from PyFin.Enums import BizDayConventions
+from pyStratAlpha.analyzer.factor.factorPanel import FactorPanel
 from pyStratAlpha.utils import date_utils
 from pyStratAlpha.enums import FactorNAHandler
 
@@ -99,9 +102,47 @@ def get_universe_single_factor(file_path,
     return ret
 
 
+def get_universe_multi_factor(file_path,
+                              factor_names,
+                              index_name=['tradeDate', 'secID'],
+                              return_biz_day=True,
+                              date_format='%Y%m%d',
+                              na_handler=FactorNAHandler.Drop):
+    """
+    :param file_path: str, file_path of csv file, col =[datetime, secid, factor1, factor2, ...]
+    :param factor_names: list of str, 因子名称
+    :param index_name: multi index name to be set
+    :param return_biz_day: bool, 是否返回交易日
+    :param date_format: str， 日期格式
+    :param na_handler: enum, 对na值处理的枚举变量
+    :return: dict, {factor_name: pd.Series, multiindex =[datetime, secid] value = factor}
+    与get_universe_single_factor结果相同, 但同一个csv文件只读取一次, 且只读取需要的列
+    """
+    header = pd.read_csv(file_path, nrows=0).columns.tolist()
+    date_col, sec_col = header[0], header[1]
+    use_cols = [date_col, sec_col] + [name for name in factor_names if name not in (date_col, sec_col)]
+    data = pd.read_csv(file_path, usecols=use_cols)
+
+    # 日期转换和交易日映射对所有因子只做一次
+    trade_date = pd.to_datetime(data[date_col], format=date_format)
+    if return_biz_day:
+        valid_date = trade_date.dropna()
+        trade_date.loc[valid_date.index] = date_utils.map_to_biz_day(valid_date)
+
+    ret = {}
+    for name in factor_names:
+        factor = pd.DataFrame({'tradeDate': trade_date, 'secID': data[sec_col], 'factor': data[name]},
+                              columns=['tradeDate', 'secID', 'factor'])
+        factor = factor_na_handler(factor, na_handler)
+        factor = factor[factor['secID'].str.contains(r'^[^<A>]+$$')]  # 去除类似AXXXX的代码(IPO终止)
+        index = pd.MultiIndex.from_arrays([factor['tradeDate'].values, factor['secID'].values], names=index_name)
+        ret[name] = pd.Series(factor['factor'].values, index=index, name='factor')
+    return ret
+
+
 def adjust_factor_date(factor_raw, start_date, end_date, freq='m'):
     """
-    :param factor_raw: pd.DataFrame, multiindex =['tradeDate','secID']
+    :param factor_raw: pd.Series/pd.DataFrame(含'factor'列), multiindex =['tradeDate','secID']
     :param start_date: str/datetime.datetime, start date of factor data
     :param end_date: str/datetime.datetime, end date of factor data
     :param freq: str, optional, tiaocang frequency
@@ -109,45 +150,133 @@ def adjust_factor_date(factor_raw, start_date, end_date, freq='m'):
     此函数的主要目的是 把原始以报告日为对应日期的因子数据 改成 调仓日为日期（读取对应报告日数据）
     """
 
-    ret = pd.Series()
-
     # 获取调仓日日期
     tiaocang_date = date_utils.get_pos_adj_date(start_date, end_date, freq=freq)
     report_date = [get_report_date(date, return_biz_day=True) for date in tiaocang_date]
 
-    for i in range(len(tiaocang_date)):
-        query = factor_raw.loc[factor_raw.index.get_level_values('tradeDate') == report_date[i]]
-        query = query.reset_index().drop('tradeDate', axis=1)
-        query['tiaoCangDate'] = [tiaocang_date[i]] * query['secID'].count()
-        ret = pd.concat([ret, query], axis=0)
-    ret = ret[['tiaoCangDate', 'secID', 'factor']]  # 清理列
+    # 按报告日稳定排序后, 每个调仓日对应的报告日数据是一段连续区间, 通过searchsorted一次性定位
+    trade_date = factor_raw.index.get_level_values('tradeDate').values
+    order = np.argsort(trade_date, kind='mergesort')
+    sorted_trade_date = trade_date[order]
+    report_date = pd.to_datetime(report_date).values
+    lo = np.searchsorted(sorted_trade_date, report_date, side='left')
+    hi = np.searchsorted(sorted_trade_date, report_date, side='right')
+
+    nb_rows = hi - lo
+    row_start = np.repeat(lo, nb_rows)
+    row_offset = np.arange(nb_rows.sum()) - np.repeat(np.cumsum(nb_rows) - nb_rows, nb_rows)
+    pos = order[row_start + row_offset]
 
-    index = pd.MultiIndex.from_arrays([ret['tiaoCangDate'].values, ret['secID'].values],
+    index = pd.MultiIndex.from_arrays([pd.to_datetime(tiaocang_date).values.repeat(nb_rows),
+                                       factor_raw.index.get_level_values('secID').values[pos]],
                                       names=['tiaoCangDate', 'secID'])
-    ret = pd.Series(ret['factor'].values, index=index, name='factor')
+    factor_value = factor_raw['factor'].values if isinstance(factor_raw, pd.DataFrame) else factor_raw.values
+    ret = pd.Series(factor_value[pos], index=index, name='factor')
 
     return ret
 
 
 def get_multi_index_data(multi_idx_data, first_idx_name, first_idx_val, sec_idx_name=None, sec_idx_val=None):
     """
-    :param multi_idx_data: pd.Series, multi-index =[first_idx_name, sec_idx_name]
+    :param multi_idx_data: pd.Series/FactorPanel, multi-index =[first_idx_name, sec_idx_name]
     :param first_idx_name: str, first index name of multiIndex series
     :param first_idx_val: str/list/datetime.date, selected value of first index
     :param sec_idx_name: str, second index name of multiIndex series
     :param sec_idx_val: str/list/datetime.date, selected valuer of second index
     :return: pd.Series, selected value with multi-index = [first_idx_name, sec_idx_name]
     """
+    if isinstance(multi_idx_data, FactorPanel):
+        return multi_idx_data.get_multi_index_data(first_idx_name, first_idx_val, sec_idx_name, sec_idx_val)
 
     if isinstance(first_idx_val, basestring) or isinstance(first_idx_val, datetime.datetime):
         first_idx_val = [first_idx_val]
 
-    data = multi_idx_data.loc[multi_idx_data.index.get_level_values(first_idx_name).isin(first_idx_val)]
+    slicer = MultiIndexSlicer.get_slicer(multi_idx_data.index)
+    pos = slicer.get_positions(first_idx_name, first_idx_val)
     if sec_idx_name is not None:
         if isinstance(sec_idx_val, basestring) or isinstance(sec_idx_val, datetime.date):
             sec_idx_val = [sec_idx_val]
-        data = data.loc[data.index.get_level_values(sec_idx_name).isin(sec_idx_val)]
-    return data
+        pos = slicer.filter_positions(pos, sec_idx_name, sec_idx_val)
+    return multi_idx_data.iloc[pos]
+
+
+class MultiIndexSlicer(object):
+    """
+    multi index的索引: 对每一层的编码做一次稳定排序并记录每个取值的区间,
+    之后选取某些取值只需要拼接对应的连续区间, 不再对全部数据做isin扫描
+    """
+
+    # (id(index), index names) -> (weakref, slicer), index的取值不可变, 但names可以原地修改, 因此一并作为key
+    _cache = {}
+
+    def __init__(self, index):
+        """
+        :param index: pd.MultiIndex
+        """
+        self._levels = index.levels
+        self._labels = [np.asarray(labels) for labels in index.labels]
+        self._names = list(index.names)
+        self._order = {}
+        self._offsets = {}
+
+    @classmethod
+    def get_slicer(cls, index):
+        """
+        :param index: pd.MultiIndex
+        :return: MultiIndexSlicer, 同一个index对象只建立一次索引
+        """
+        key = (id(index), tuple(index.names))
+        cached = cls._cache.get(key)
+        if cached is not None and cached[0]() is index:
+            return cached[1]
+
+        slicer = cls(index)
+        cls._cache[key] = (weakref.ref(index, lambda _: cls._cache.pop(key, None)), slicer)
+        return slicer
+
+    def _get_level_number(self, level_name):
+        return self._names.index(level_name)
+
+    def _get_level_codes(self, level, values):
+        level_values = self._levels[level]
+        if isinstance(level_values, pd.DatetimeIndex):
+            values = pd.DatetimeIndex(values)
+        codes = level_values.get_indexer(values)
+        return np.unique(codes[codes >= 0])
+
+    def _build_level(self, level):
+        if level not in self._order:
+            labels = self._labels[level]
+            order = np.argsort(labels, kind='mergesort')
+            self._order[level] = order
+            self._offsets[level] = np.searchsorted(labels[order], np.arange(len(self._levels[level]) + 1))
+        return self._order[level], self._offsets[level]
+
+    def get_positions(self, level_name, values):
+        """
+        :param level_name: str, index名称
+        :param values: list, 选取的取值
+        :return: np.array, 选中行的位置, 按原始顺序排列
+        """
+        level = self._get_level_number(level_name)
+        order, offsets = self._build_level(level)
+        codes = self._get_level_codes(level, values)
+        if len(codes) == 1:
+            return order[offsets[codes[0]]:offsets[codes[0] + 1]]
+        pos = np.concatenate([order[offsets[code]:offsets[code + 1]] for code in codes]) if len(codes) > 0 \
+            else np.array([], dtype=np.int64)
+        return np.sort(pos)
+
+    def filter_positions(self, pos, level_name, values):
+        """
+        :param pos: np.array, 已选中行的位置
+        :param level_name: str, index名称
+        :param values: list, 选取的取值
+        :return: np.array, pos中该层取值在values中的位置
+        """
+        level = self._get_level_number(level_name)
+        codes = self._get_level_codes(level, values)
+        return pos[np.in1d(self._labels[level][pos], codes)]
 
 
 if __name__ == "__main__":
@@ -2,26 +2,59 @@
 # ref 动态情景多因子Alpha模型----因子选股系列研究之八，朱剑涛
 # ref https://uqer.io/community/share/57ff3f9e228e5b3658fac3ed
 
-from math import e
+import copy
+import itertools
+import multiprocessing
+
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import scipy.stats as st
 from PyFin.DateUtilities import Date
 from PyFin.Utilities import pyFinAssert
 from matplotlib.ticker import MultipleLocator, FormatStrFormatter
 from pyStratAlpha.analyzer.factor.cleanData import factor_na_handler
 from pyStratAlpha.analyzer.factor.cleanData import get_multi_index_data
+from pyStratAlpha.analyzer.factor.factorPanel import as_factor_series
+from pyStratAlpha.analyzer.factor.factorPanel import as_factor_series_list
 from pyStratAlpha.analyzer.factor.loadData import FactorLoader
 from pyStratAlpha.enums import FactorNAHandler
 from pyStratAlpha.enums import FactorWeightType
 from pyStratAlpha.enums import FactorNormType
 from pyStratAlpha.enums import FactorICSign
 from pyStratAlpha.enums import DCAMFactorType
+from pyStratAlpha.maths.stats import ks_2samp_2d
+from pyStratAlpha.maths.stats import levene_2d
+from pyStratAlpha.maths.stats import spearman_corr
+from pyStratAlpha.maths.stats import ttest_ind_2d
 from pyStratAlpha.utils import pickle_dump_data
 from pyStratAlpha.utils import pickle_load_data
 
-_factor_pkl_path = 'factor.pkl'
+_factor_cache_path = 'factor_cache'
+
+# 子进程中使用的analyzer, 在进程池创建时(fork)继承自父进程, 因子数据按copy-on-write共享, 不随每个任务pickle
+_worker_analyzer = None
+
+
+def _init_score_worker(analyzer):
+    global _worker_analyzer
+    _worker_analyzer = analyzer
+
+
+def _calc_sec_score_on_date_worker(date):
+    return _worker_analyzer.calc_sec_score_on_date(date)
+
+
+def _calc_ic_ir(n, s1, s2):
+    """
+    :param n: np.array, 窗口内有效rank ic的个数
+    :param s1: np.array, 窗口内rank ic之和
+    :param s2: np.array, 窗口内rank ic平方之和
+    :return: np.array, IC_IR = 均值/标准差, 有效个数不足两个时为na
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = s1 / n
+        std = np.sqrt(np.maximum(s2 - s1 * mean, 0.0) / (n - 1))
+        return np.where(n > 1, mean / std, np.nan)
 
 
 class DCAMHelper(object):
@@ -29,21 +62,77 @@ class DCAMHelper(object):
         pass
 
     @classmethod
-    def seperate_sec_group(cls, factor, date):
+    def get_group_names(cls, nb_group=2):
+        """
+        :param nb_group: int, optional, 分组数
+        :return: list of str, 分组名称, 两组时为low/high, 否则为group1, group2, ... (因子值由低至高)
+        """
+        if nb_group == 2:
+            return ['low', 'high']
+        return ['group{0}'.format(i + 1) for i in range(nb_group)]
+
+    @classmethod
+    def _split_sec_group(cls, data, nb_group=2):
+        """
+        :param data: pd.Series, 某一调仓日的情景分层因子
+        :param nb_group: int, optional, 分组数
+        :return: tuple, (按分层因子值从小到大排序后的位置, 对应的分组, 0为因子值最小的一组)
+        排序方式与pd.Series.sort_values相同(quicksort, na值排在最后), 排序后第i组为[int(n*i/N), int(n*(i+1)/N))
+        """
+        pyFinAssert(nb_group >= 2, ValueError, "number of groups must be at least 2")
+        values = data.values
+        good = ~pd.isnull(values)
+        good_pos = np.flatnonzero(good)
+        order = np.concatenate([good_pos[np.argsort(values[good], kind='quicksort')], np.flatnonzero(~good)])
+        bounds = [len(order) * i // nb_group for i in range(1, nb_group)]
+        group = np.searchsorted(bounds, np.arange(len(order)), side='right')
+        return order, group
+
+    @classmethod
+    def get_sorted_sec_group(cls, factor, date, nb_group=2):
         """
-        :param date: datetime, 调仓日
         :param factor: multi index pd.Series, 情景分层因子
-        :return: list
-        给定某一时间，按因子把股票分为数量相同的两组（大/小）
+        :param date: datetime, 调仓日
+        :param nb_group: int, optional, 分组数
+        :return: tuple, (np.array, 按因子值从小到大排序的secID, np.array, 对应的分组, 0为因子值最小的一组)
         """
         data = get_multi_index_data(factor, 'tiaoCangDate', date)
-        # 按分层因子值从小到大排序
-        data.sort_values(ascending=True, inplace=True)
-        sec_ids = data.index.get_level_values('secID').tolist()
-        # 分组,因子值小的哪一组股票为low,高的为high
-        group_low = sec_ids[:np.round(len(data)) / 2]
-        group_high = sec_ids[np.round(len(data)) / 2:]
-        return group_low, group_high
+        order, group = cls._split_sec_group(data, nb_group)
+        return data.index.get_level_values('secID').values[order], group
+
+    @classmethod
+    def seperate_sec_group(cls, factor, date, nb_group=2):
+        """
+        :param date: datetime, 调仓日
+        :param factor: multi index pd.Series, 情景分层因子
+        :param nb_group: int, optional, 分组数
+        :return: tuple of list, 两组时为(low, high)
+        给定某一时间，按因子把股票分为数量相同的nb_group组, 因子值由低至高
+        """
+        sec_ids, group = cls.get_sorted_sec_group(factor, date, nb_group)
+        return tuple(sec_ids[group == i].tolist() for i in range(nb_group))
+
+    @classmethod
+    def get_sec_group_table(cls, factor, dates, group_cache=None, nb_group=2):
+        """
+        :param factor: multi index pd.Series, 情景分层因子
+        :param dates: list of datetime, 调仓日
+        :param group_cache: SecGroupCache, optional, 分组缓存, 已计算过的调仓日不再重新排序
+        :param nb_group: int, optional, 分组数, 使用分组缓存时以缓存的分组数为准
+        :return: pd.DataFrame, col = [datePos, secID, group], datePos为调仓日在dates中的位置, group = 0, 1, ...
+        所有调仓日的分组, 与逐日调用seperate_sec_group的结果相同
+        """
+        tables = []
+        for j, date in enumerate(dates):
+            if group_cache is None:
+                sec_ids, group = cls.get_sorted_sec_group(factor, date, nb_group)
+            else:
+                sec_ids, group = group_cache.get_sorted_sec_group(factor, date)
+            tables.append(pd.DataFrame({'datePos': j,
+                                        'secID': sec_ids,
+                                        'group': group},
+                                       columns=['datePos', 'secID', 'group']))
+        return pd.concat(tables, ignore_index=True)
 
     @classmethod
     def get_sec_return_on_date(cls, sec_return, sec_ids, date):
@@ -78,40 +167,131 @@ class DCAMHelper(object):
         return ret
 
     @classmethod
-    def calc_rank_ic(cls, layer_factor, alpha_factors, sec_return, tiaocang_date, na_handler):
+    def _get_data_on_dates(cls, factor, dates, name):
+        """
+        :return: pd.DataFrame, col = [datePos, secID, name], 因子在给定调仓日的数据, datePos为调仓日在dates中的位置
+        """
+        data = get_multi_index_data(factor, 'tiaoCangDate', dates)
+        date_pos = pd.DatetimeIndex(dates).get_indexer(data.index.get_level_values('tiaoCangDate'))
+        return pd.DataFrame({'datePos': date_pos,
+                             'secID': data.index.get_level_values('secID').values,
+                             name: data.values},
+                            columns=['datePos', 'secID', name])
+
+    @classmethod
+    def calc_rank_ic(cls, layer_factor, alpha_factors, sec_return, tiaocang_date, na_handler, group_cache=None,
+                     nb_group=2):
         """
         :param layer_factor: pd.Series, 分层因子
         :param alpha_factors: list of pd.Series, alpha_factor构成的list
         :param sec_return: multi index pd.Series,
         :param tiaocang_date: list, datetime.datetime. 调仓日构成的list
         :param na_handler: enum， 如何处理na的枚举变量
-        :return: pd.DataFrame, index = tiaocang_date, col = [alpha factor names]
+        :param group_cache: SecGroupCache, optional, 分组缓存
+        :param nb_group: int, optional, 分组数, 使用分组缓存时以缓存的分组数为准
+        :return: tuple of pd.DataFrame, 每组一个, index = tiaocang_date, col = [alpha factor names]
         给定分层因子，计算每个调仓日对应的alpha因子IC
+        所有调仓日和alpha因子一次性计算: 以(调仓日, 分组)为组, 由maths.stats.spearman_corr计算组内下期收益和当期因子的rank ic
         """
         alpha_factor_names = [alpha_factor.name for alpha_factor in alpha_factors]
-        low = pd.DataFrame(index=tiaocang_date[:-1], columns=alpha_factor_names)
-        high = pd.DataFrame(index=tiaocang_date[:-1], columns=alpha_factor_names)
-
-        for j in range(0, len(tiaocang_date) - 1):  # 对时间做循环，得到每个时间点的rankIC
-            date = tiaocang_date[j]
-            next_date = tiaocang_date[j + 1]
-            group_low, group_high = DCAMHelper.seperate_sec_group(layer_factor, date)  # 分组
-            return_low = DCAMHelper.get_sec_return_on_date(sec_return, group_low, next_date)
-            return_high = DCAMHelper.get_sec_return_on_date(sec_return, group_high, next_date)  # 得到下期收益序列
-            factor_low = DCAMHelper.get_factor_on_date(alpha_factors, group_low, date)
-            factor_high = DCAMHelper.get_factor_on_date(alpha_factors, group_high, date)  # 得到当期因子序列
-            table_low = pd.concat([return_low, factor_low], axis=1)
-            table_high = pd.concat([return_high, factor_high], axis=1)
-            table_low = factor_na_handler(table_low, na_handler)
-            table_high = factor_na_handler(table_high, na_handler)
-            for k in alpha_factor_names:
-                tmp_low, _ = st.spearmanr(table_low['RETURN'], table_low[k])
-                tmp_high, _ = st.spearmanr(table_high['RETURN'], table_high[k])
-                low[k][j] = tmp_low
-                high[k][j] = tmp_high
-        return low, high
+        dates = tiaocang_date[:-1]
+        keys = ['datePos', 'group']
+        return_col = '__return__'
+        cols = [return_col] + alpha_factor_names
+
+        # 每个(调仓日, 分组)的数据表: 组内股票的下期收益和当期因子, 收益和因子按secID外连接
+        data = cls._get_data_on_dates(sec_return, tiaocang_date[1:], return_col)
+        for alpha_factor in alpha_factors:
+            data = data.merge(cls._get_data_on_dates(alpha_factor, dates, alpha_factor.name),
+                              on=['datePos', 'secID'], how='outer')
+        nb_group = nb_group if group_cache is None else group_cache.nb_group
+        table = cls.get_sec_group_table(layer_factor, dates, group_cache, nb_group)
+        table = table.merge(data, on=['datePos', 'secID'], how='inner')
+
+        if na_handler == FactorNAHandler.Drop:
+            table = table.dropna(subset=cols)
+        elif na_handler == FactorNAHandler.ReplaceWithMean:
+            table[cols] = table[cols].fillna(table.groupby(keys)[cols].transform('mean'))
+        elif na_handler == FactorNAHandler.ReplaceWithMedian:
+            table[cols] = table[cols].fillna(table.groupby(keys)[cols].transform('median'))
+        elif na_handler != FactorNAHandler.Ignore:
+            raise NotImplementedError
+
+        # 组内含有na值时为na(与scipy.stats.spearmanr相同)
+        ic = spearman_corr(table[alpha_factor_names], table[return_col], groups=[table[key].values for key in keys],
+                           nan_policy='propagate')
+
+        ret = []
+        for group in range(nb_group):
+            group_ic = ic.xs(group, level=1) if group in ic.index.get_level_values(1) else pd.DataFrame(
+                columns=alpha_factor_names)
+            group_ic = group_ic.reindex(np.arange(len(dates)))
+            ret.append(pd.DataFrame(group_ic.values.astype(np.float64), index=dates, columns=alpha_factor_names))
+        return tuple(ret)
+
 
+class SecGroupCache(object):
+    """
+    (分层因子, 调仓日)的分组缓存: 保存按分层因子排序后各组的secID以及各组股票对应的alpha因子数据,
+    rank ic的计算与打分共用同一份分组, 每个(分层因子, 调仓日)只排序一次
+    因子数据改变后需要调用invalidate清除对应的缓存
+    """
 
+    def __init__(self, alpha_factors, nb_group=2):
+        """
+        :param alpha_factors: list of pd.Series, alpha_factor构成的list
+        :param nb_group: int, optional, 分组数
+        """
+        self._alphaFactors = alpha_factors
+        self._nbGroup = nb_group
+        self._secGroup = {}
+        self._alphaFactorData = {}
+
+    @property
+    def nb_group(self):
+        return self._nbGroup
+
+    def get_sorted_sec_group(self, layer_factor, date):
+        """
+        :param layer_factor: multi index pd.Series, 情景分层因子
+        :param date: datetime, 调仓日
+        :return: tuple, see DCAMHelper.get_sorted_sec_group
+        """
+        key = (layer_factor.name, date)
+        if key not in self._secGroup:
+            self._secGroup[key] = DCAMHelper.get_sorted_sec_group(layer_factor, date, self._nbGroup)
+        return self._secGroup[key]
+
+    def seperate_sec_group(self, layer_factor, date):
+        """
+        :return: tuple of list, see DCAMHelper.seperate_sec_group
+        """
+        sec_ids, group = self.get_sorted_sec_group(layer_factor, date)
+        return tuple(sec_ids[group == i].tolist() for i in range(self._nbGroup))
+
+    def get_alpha_factor_on_date(self, layer_factor, date):
+        """
+        :param layer_factor: multi index pd.Series, 情景分层因子
+        :param date: datetime, 调仓日
+        :return: tuple of pd.DataFrame, 各组股票的alpha因子, see DCAMHelper.get_factor_on_date
+        """
+        key = (layer_factor.name, date)
+        if key not in self._alphaFactorData:
+            self._alphaFactorData[key] = tuple(DCAMHelper.get_factor_on_date(self._alphaFactors, sec_ids, date)
+                                               for sec_ids in self.seperate_sec_group(layer_factor, date))
+        return self._alphaFactorData[key]
+
+    def invalidate(self, layer_factor_name=None, date=None):
+        """
+        :param layer_factor_name: str, optional, 分层因子名称, 默认为所有分层因子
+        :param date: datetime, optional, 调仓日, 默认为所有调仓日
+        :return:
+        清除给定分层因子和调仓日的缓存
+        """
+        for cache in [self._secGroup, self._alphaFactorData]:
+            for key in list(cache.keys()):
+                if (layer_factor_name is None or key[0] == layer_factor_name) and (date is None or key[1] == date):
+                    del cache[key]
 
 
 class DCAMAnalyzer(object):
@@ -124,12 +304,17 @@ class DCAMAnalyzer(object):
                  save_sec_score=True,
                  factor_weight_type=FactorWeightType.ICWeight,
                  alpha_factor_sign=None,
-                 na_handler=FactorNAHandler.ReplaceWithMedian):
-        self._layerFactor = layer_factor
+                 na_handler=FactorNAHandler.ReplaceWithMedian,
+                 n_jobs=1,
+                 nb_group=2):
+        """
+        :param nb_group: int, optional, 每个分层因子下的分组数, 默认为2(low/high)
+        """
+        self._layerFactor = as_factor_series_list(layer_factor)
         self._layerFactorNames = [layer_factor.name for layer_factor in self._layerFactor]
-        self._alphaFactor = alpha_factor
+        self._alphaFactor = as_factor_series_list(alpha_factor)
         self._alphaFactorNames = [alpha_factor.name for alpha_factor in self._alphaFactor]
-        self._secReturn = sec_return
+        self._secReturn = as_factor_series(sec_return)
         self._tiaoCangDate = tiaocang_date
         self._startDate = str(Date.fromDateTime(self._tiaoCangDate[0]))
         self._endDate = str(Date.fromDateTime(self._tiaoCangDate[-1]))
@@ -141,7 +326,16 @@ class DCAMAnalyzer(object):
         self._factorWeightType = factor_weight_type
         self._alphaFactorSign = alpha_factor_sign
         self._na_handler = na_handler
+        self._nJobs = n_jobs
+        self._nbGroup = nb_group
+        self._groupNames = DCAMHelper.get_group_names(nb_group)
         self._rank_ic = None
+        self._alphaFactorICWeight = None
+        self._secGroupCache = SecGroupCache(self._alphaFactor, nb_group)
+        self._layerFactorQuantile = {}
+        self._tiaoCangDatePos = dict((date, pos) for pos, date in enumerate(self._tiaoCangDate))
+        # 滚动状态下只保留最后一个调仓日的因子数据, 见_set_walk_forward_state
+        self._walkForward = False
         if self._factorWeightType == FactorWeightType.EqualWeight:
             pyFinAssert(len(self._alphaFactorSign) == len(self._alphaFactor), ValueError,
                         "length of alpha_factor_sign({0}), does not equal to that of alpha factor({1})".format(
@@ -153,7 +347,11 @@ class DCAMAnalyzer(object):
 
     @na_handler.setter
     def na_handler(self, handler):
+        self._check_full_history('na_handler setter')
         self._na_handler = handler
+        # rank ic及其导出的权重依赖于na值的处理方式
+        self._rank_ic = None
+        self._alphaFactorICWeight = None
 
     @property
     def factor_weight_type(self):
@@ -163,70 +361,125 @@ class DCAMAnalyzer(object):
     def factor_weight_type(self, factor_weight_type):
         self._factorWeightType = factor_weight_type
 
+    def invalidate_cache(self, layer_factor_name=None, date=None):
+        """
+        :param layer_factor_name: str, optional, 分层因子名称, 默认为所有分层因子
+        :param date: datetime, optional, 调仓日, 默认为所有调仓日
+        :return:
+        因子数据改变后清除对应的分组缓存, 以及依赖于分组的rank ic和权重
+        """
+        self._check_full_history('invalidate_cache')
+        self._secGroupCache.invalidate(layer_factor_name, date)
+        if date is None:
+            self._layerFactorQuantile.clear()
+        else:
+            self._layerFactorQuantile.pop(date, None)
+        self._rank_ic = None
+        self._alphaFactorICWeight = None
+
+    def _check_full_history(self, name):
+        """
+        :param name: str, 调用的方法名
+        :return:
+        滚动状态下没有历史调仓日的因子数据, 需要由全部历史重新计算的方法抛出ValueError
+        """
+        pyFinAssert(not self._walkForward,
+                    ValueError,
+                    "{0} needs the full factor history, which is not kept after append_period/load_state".format(name))
+
     def calc_rank_ic(self):
         """
         :param
-        :return: pd.DataFrame, index = [layer_factor], cols= [alpha factor name]
+        :return: tuple of pd.Series, 每组一个(两组时为(low, high)), index = [layer_factor], value = rank ic的pd.DataFrame
         """
-        ret_low = pd.Series()
-        ret_high = pd.Series()
+        self._check_full_history('calc_rank_ic')
+        ret = tuple(pd.Series() for _ in range(self._nbGroup))
         for layer_factor in self._layerFactor:
-            tmp_low, tmp_high = DCAMHelper.calc_rank_ic(layer_factor=layer_factor,
-                                                        alpha_factors=self._alphaFactor,
-                                                        sec_return=self._secReturn,
-                                                        tiaocang_date=self._tiaoCangDate,
-                                                        na_handler=self._na_handler)
-
-            ret_low[layer_factor.name] = tmp_low
-            ret_high[layer_factor.name] = tmp_high
-        return ret_low, ret_high
+            rank_ic = DCAMHelper.calc_rank_ic(layer_factor=layer_factor,
+                                              alpha_factors=self._alphaFactor,
+                                              sec_return=self._secReturn,
+                                              tiaocang_date=self._tiaoCangDate,
+                                              na_handler=self._na_handler,
+                                              group_cache=self._secGroupCache)
+            for group_ret, group_ic in zip(ret, rank_ic):
+                group_ret[layer_factor.name] = group_ic
+        return ret
 
-    def get_analysis(self, layer_factor_name, save_file=False):
+    def _get_rank_ic_on_layer_factor(self, layer_factor_name):
+        """
+        :param layer_factor_name: str, 分层因子名称
+        :return: tuple of pd.DataFrame, 每组一个, see DCAMHelper.calc_rank_ic
+        已经计算过全部分层因子的rank ic时直接使用缓存
+        """
+        if self._rank_ic is not None:
+            return tuple(rank_ic[layer_factor_name] for rank_ic in self._rank_ic)
+        layer_factor = self._layerFactor[self._layerFactorNames.index(layer_factor_name)]
+        return DCAMHelper.calc_rank_ic(layer_factor=layer_factor,
+                                       alpha_factors=self._alphaFactor,
+                                       sec_return=self._secReturn,
+                                       tiaocang_date=self._tiaoCangDate,
+                                       na_handler=self._na_handler,
+                                       group_cache=self._secGroupCache)
+
+    def _calc_analysis_table(self, layer_factor_name):
+        """
+        :param layer_factor_name: str, 分层因子名称
+        :return: pd.DataFrame, index = alpha factor names, col = 统计量
+        所有alpha因子的统计量一次性计算, 多于两组时比较因子值最低和最高的两组
         """
-        :param layer_factor_name str, 分层因子名称
+        rank_ic = self._get_rank_ic_on_layer_factor(layer_factor_name)
+        low, high = rank_ic[0], rank_ic[-1]
+        low = low[self._alphaFactorNames].values.astype(np.float64)
+        high = high[self._alphaFactorNames].values.astype(np.float64)
+        mean_low = low.mean(axis=0)
+        mean_high = high.mean(axis=0)
+        std_low = low.std(axis=0)
+        std_high = high.std(axis=0)
+        # 均值的t检验, 原假设为两个独立样本的均值相同
+        t, p_t = ttest_ind_2d(low, high, equal_var=False)
+        # 方差的F检验，原假设为两个独立样本的方差相同
+        f, p_f = levene_2d(low, high)
+        # 分布的K-S检验，原假设为两个独立样本是否来自同一个连续分布
+        ks, p_ks = ks_2samp_2d(low, high)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = np.column_stack([mean_low, mean_high, std_low, std_high,
+                                      mean_low / std_low, mean_high / std_high, t, p_t, f, p_f, ks, p_ks])
+
+        columns = [['mean', 'mean', 'std', 'std', 'IR', 'IR', 'Two sample t test', 'Two sample t test', 'levene test',
+                    'levene test', 'K-S test', 'K-S test'],
+                   ['low', 'high', 'low', 'high', 'low', 'high', 't', 'p_value', 'f', 'p_value', 'KS', 'p_value']]
+        return pd.DataFrame(values, index=self._alphaFactorNames,
+                            columns=pd.MultiIndex.from_tuples(list(zip(*columns))))
+
+    def get_analysis(self, layer_factor_name=None, save_file=False):
+        """
+        :param layer_factor_name str, optional, 分层因子名称, 默认为None, 返回所有分层因子的结果
         :param save_file,bool save file or not
         :return:  对给定情景因子分层后的股票组合进行的统计分析
+        layer_factor_name为None时返回所有分层因子合并的表, index = [layerFactor, alphaFactor]
         """
-        layer_factor = self._layerFactor[self._layerFactorNames.index(layer_factor_name)]
-        low, high = DCAMHelper.calc_rank_ic(layer_factor=layer_factor,
-                                            alpha_factors=self._alphaFactor,
-                                            sec_return=self._secReturn,
-                                            tiaocang_date=self._tiaoCangDate,
-                                            na_handler=self._na_handler)
-        result = pd.DataFrame(columns=self._alphaFactorNames, index=np.arange(12))
-        for i in self._alphaFactorNames:
-            mean_low = np.array(low[i]).mean()
-            mean_high = np.array(high[i]).mean()
-            std_low = np.array(low[i]).std()
-            std_high = np.array(high[i]).std()
-            # 均值的t检验, 原假设为两个独立样本的均值相同
-            t, p_t = st.ttest_ind(low[i], high[i], equal_var=False)
-            # 方差的F检验，原假设为两个独立样本的方差相同
-            f, p_f = st.levene(low[i], high[i])
-            # 分布的K-S检验，原假设为两个独立样本是否来自同一个连续分布
-            ks, p_ks = st.ks_2samp(low[i], high[i])
-            result[i] = [mean_low, mean_high, std_low, std_high,
-                         mean_low / std_low, mean_high / std_high, t, p_t, f, p_f, ks, p_ks]
-
-        result = result.T
-        np.arrays = [['mean', 'mean', 'std', 'std', 'IR', 'IR', 'Two sample t test', 'Two sample t test', 'levene test',
-                      'levene test', 'K-S test',
-                      'K-S test'],
-                     ['low', 'high', 'low', 'high', 'low', 'high', 't', 'p_value', 'f', 'p_value', 'KS', 'p_value']]
-        result.columns = pd.MultiIndex.from_tuples(zip(*np.arrays))
-        ret = pd.concat([result], axis=1,
-                        keys=[layer_factor.name + '分层后因子表现     时间：' + self._startDate + ' -- ' + self._endDate])
+        self._check_full_history('get_analysis')
+        if layer_factor_name is None:
+            if self._rank_ic is None:
+                self._rank_ic = self.calc_rank_ic()
+            result = pd.concat([self._calc_analysis_table(name) for name in self._layerFactorNames],
+                               keys=self._layerFactorNames, names=['layerFactor', 'alphaFactor'])
+            title = '分层后因子表现     时间：'
+        else:
+            result = self._calc_analysis_table(layer_factor_name)
+            title = layer_factor_name + '分层后因子表现     时间：'
+        ret = pd.concat([result], axis=1, keys=[title + self._startDate + ' -- ' + self._endDate])
         if save_file:
             ret.to_csv('analysis.csv')
         return ret
 
     def calc_layer_factor_distance(self, percentile):
         """
-        :param percentile: float, 个股在分层因子下的分位数, [0,1]
-        :return: float, 个股的分层因子上的属性量化分数
+        :param percentile: float/np.array, 个股在分层因子下的分位数, [0,1]
+        :return: float/np.array, 个股的分层因子上的属性量化分数
         """
         if self._factorWeightType == FactorWeightType.EqualWeight:
-            return 1
+            return 1 if np.isscalar(percentile) else np.ones(np.shape(percentile))
         elif self._factorWeightType == FactorWeightType.ICWeight:
             return sigmoid_modif(percentile)
         else:
@@ -236,7 +489,10 @@ class DCAMAnalyzer(object):
         """
         :param date: datetime, 调仓日
         :return: pd.DataFrame, index=secid, col = layerFactorNames
+        分位数与窗口、权重类型以及na值处理方式无关, 每个调仓日只计算一次
         """
+        if date in self._layerFactorQuantile:
+            return self._layerFactorQuantile[date]
         ret = pd.DataFrame()
         for layerFactor in self._layerFactor:
             data = get_multi_index_data(layerFactor, 'tiaoCangDate', date)
@@ -246,46 +502,233 @@ class DCAMAnalyzer(object):
             rank = rank.divide(len(sec_ids))
             ret = pd.concat([ret, pd.Series(rank.values, index=sec_ids)], axis=1)
         ret.columns = self._layerFactorNames
+        self._layerFactorQuantile[date] = ret
         return ret
 
+    def _get_tiaocang_date_pos(self, date):
+        """
+        :param date: str/datetime, 调仓日
+        :return: int, 调仓日在self._tiaoCangDate中的位置
+        """
+        if isinstance(date, basestring):
+            date = Date.strptime(date).toDateTime()
+        return self._tiaoCangDatePos[date]
+
+    def calc_alpha_factor_ic_weight(self):
+        """
+        :return: tuple of np.array, 每组一个(两组时为(low, high)),
+        shape = (nb_tiaocang_date, nb_layer_factor, nb_alpha_factor)
+        所有调仓日的IC_IR权重: 第i个调仓日的权重为前tiaocang_date_window_size个调仓日rank ic的均值/标准差,
+        由rank ic的累积和一次性算出; 窗口不完整的调仓日权重为na
+        """
+        if self._alphaFactorICWeight is not None:
+            return self._alphaFactorICWeight
+        if self._rank_ic is None:
+            self._rank_ic = self.calc_rank_ic()
+
+        window = self._tiaoCangDateWindowSize
+        nb_date = len(self._tiaoCangDate)
+        ret = []
+        for rank_ic in self._rank_ic:
+            # shape = (nb_tiaocang_date - 1, nb_layer_factor, nb_alpha_factor)
+            ic = np.stack([rank_ic[name].values.astype(np.float64) for name in self._layerFactorNames], axis=1)
+            is_valid = ~np.isnan(ic)
+            ic = np.where(is_valid, ic, 0.0)
+            zeros = np.zeros((1,) + ic.shape[1:])
+            count = np.concatenate([zeros, np.cumsum(is_valid, axis=0)])
+            sum_ic = np.concatenate([zeros, np.cumsum(ic, axis=0)])
+            sum_ic2 = np.concatenate([zeros, np.cumsum(ic ** 2, axis=0)])
+
+            weight = np.empty((nb_date,) + ic.shape[1:])
+            weight.fill(np.nan)
+            end = np.arange(window, nb_date)
+            weight[window:] = _calc_ic_ir(count[end] - count[end - window],
+                                          sum_ic[end] - sum_ic[end - window],
+                                          sum_ic2[end] - sum_ic2[end - window])
+            ret.append(weight)
+        self._alphaFactorICWeight = tuple(ret)
+        return self._alphaFactorICWeight
+
+    def _calc_last_alpha_factor_ic_weight(self, rank_ic):
+        """
+        :param rank_ic: tuple of pd.Series, see calc_rank_ic, 只含最近tiaocang_date_window_size行rank ic
+        :return: tuple of np.array, 每组一个, shape = (1, nb_layer_factor, nb_alpha_factor)
+        由最近tiaocang_date_window_size行rank ic计算最新调仓日的权重, 不重新计算历史权重
+        """
+        ret = []
+        for group_ic in rank_ic:
+            ic = np.stack([group_ic[name].values.astype(np.float64) for name in self._layerFactorNames], axis=1)
+            is_valid = ~np.isnan(ic)
+            ic = np.where(is_valid, ic, 0.0)
+            ret.append(_calc_ic_ir(is_valid.sum(axis=0), ic.sum(axis=0), (ic ** 2).sum(axis=0))[np.newaxis])
+        return tuple(ret)
+
+    def _get_walk_forward_state(self):
+        """
+        :return: dict, 滚动计算下一个调仓日所需的最少数据: 最近tiaocang_date_window_size + 1个调仓日及其权重,
+        最近tiaocang_date_window_size行rank ic, 以及最后一个调仓日的因子和收益
+        """
+        window = self._tiaoCangDateWindowSize
+        last_date = self._tiaoCangDate[-1]
+        weight = self.calc_alpha_factor_ic_weight()
+
+        def get_last_date_data(factor):
+            data = get_multi_index_data(factor, 'tiaoCangDate', last_date)
+            data.name = factor.name
+            return data
+
+        rank_ic = tuple(pd.Series() for _ in range(self._nbGroup))
+        for group_ret, group_ic in zip(rank_ic, self._rank_ic):
+            for name in self._layerFactorNames:
+                group_ret[name] = group_ic[name].iloc[-window:]
+        return {'layer_factor': [get_last_date_data(factor) for factor in self._layerFactor],
+                'alpha_factor': [get_last_date_data(factor) for factor in self._alphaFactor],
+                'sec_return': get_last_date_data(self._secReturn),
+                'tiaocang_date': list(self._tiaoCangDate[-(window + 1):]),
+                'rank_ic': rank_ic,
+                'alpha_factor_ic_weight': tuple(group_weight[-(window + 1):] for group_weight in weight)}
+
+    def _set_walk_forward_state(self, state):
+        """
+        :param state: dict, see _get_walk_forward_state
+        :return:
+        以滚动状态替换因子数据、调仓日、rank ic和权重, 并清除分组和分位数缓存
+        """
+        self._layerFactor = state['layer_factor']
+        self._alphaFactor = state['alpha_factor']
+        self._secReturn = state['sec_return']
+        self._tiaoCangDate = state['tiaocang_date']
+        self._tiaoCangDatePos = dict((date, pos) for pos, date in enumerate(self._tiaoCangDate))
+        self._startDate = str(Date.fromDateTime(self._tiaoCangDate[0]))
+        self._endDate = str(Date.fromDateTime(self._tiaoCangDate[-1]))
+        self._rank_ic = state['rank_ic']
+        self._alphaFactorICWeight = state['alpha_factor_ic_weight']
+        self._secGroupCache = SecGroupCache(self._alphaFactor, self._nbGroup)
+        self._layerFactorQuantile = {}
+        self._walkForward = True
+
+    def append_period(self, date, layer_factor, alpha_factor, sec_return):
+        """
+        :param date: datetime, 新的调仓日, 需晚于已有的所有调仓日
+        :param layer_factor: list of pd.Series/FactorPanel, 新调仓日的分层因子, multi index = [tiaoCangDate, secID]
+        :param alpha_factor: list of pd.Series/FactorPanel, 新调仓日的alpha因子
+        :param sec_return: pd.Series/FactorPanel, 上一调仓日至新调仓日的股票收益
+        :return: pd.Series, index = secID, 新调仓日的股票打分
+        滚动(walk-forward)模式: 由上一调仓日的因子和新调仓日的收益计算一行rank ic, 由最近tiaocang_date_window_size行
+        rank ic计算新调仓日的权重, 并只对新调仓日打分. 之后只保留滚动状态(见_get_walk_forward_state),
+        计算量和内存与历史长度无关, 历史调仓日的因子数据不再保留
+        """
+        if isinstance(date, basestring):
+            date = Date.strptime(date).toDateTime()
+        pyFinAssert(date > self._tiaoCangDate[-1],
+                    ValueError,
+                    "new tiaoCangDate {0} must be later than the last one {1}".format(date, self._tiaoCangDate[-1]))
+
+        state = self._get_walk_forward_state()
+        last_date = state['tiaocang_date'][-1]
+
+        def get_new_date_data(factors, new_factors):
+            new_factors = dict((factor.name, factor) for factor in as_factor_series_list(new_factors))
+            pyFinAssert(all(factor.name in new_factors for factor in factors),
+                        ValueError,
+                        "data of factors {0} must be given on new tiaoCangDate".format([f.name for f in factors]))
+            ret = []
+            for factor in factors:
+                data = get_multi_index_data(new_factors[factor.name], 'tiaoCangDate', date)
+                data.name = factor.name
+                ret.append(data)
+            return ret
+
+        new_layer_factor = get_new_date_data(state['layer_factor'], layer_factor)
+        new_alpha_factor = get_new_date_data(state['alpha_factor'], alpha_factor)
+        sec_return = as_factor_series(sec_return)
+        new_sec_return = get_multi_index_data(sec_return, 'tiaoCangDate', date)
+        new_sec_return.name = sec_return.name
+
+        # 上一调仓日的因子与新调仓日的收益构成新的一行rank ic
+        window = self._tiaoCangDateWindowSize
+        for layer_factor in state['layer_factor']:
+            rank_ic = DCAMHelper.calc_rank_ic(layer_factor=layer_factor,
+                                              alpha_factors=state['alpha_factor'],
+                                              sec_return=new_sec_return,
+                                              tiaocang_date=[last_date, date],
+                                              na_handler=self._na_handler,
+                                              nb_group=self._nbGroup)
+            for group_ret, group_ic in zip(state['rank_ic'], rank_ic):
+                group_ret[layer_factor.name] = pd.concat([group_ret[layer_factor.name], group_ic]).iloc[-window:]
+        new_weight = self._calc_last_alpha_factor_ic_weight(state['rank_ic'])
+
+        state['layer_factor'] = new_layer_factor
+        state['alpha_factor'] = new_alpha_factor
+        state['sec_return'] = new_sec_return
+        state['tiaocang_date'] = state['tiaocang_date'][1:] + [date]
+        state['alpha_factor_ic_weight'] = tuple(np.concatenate([group_weight[1:], group_new_weight])
+                                                for group_weight, group_new_weight in
+                                                zip(state['alpha_factor_ic_weight'], new_weight))
+        self._set_walk_forward_state(state)
+        return self.calc_sec_score_on_date(date)
+
+    def save_state(self, path):
+        """
+        :param path: str, *.pkl
+        :return:
+        保存参数和滚动状态(见_get_walk_forward_state), 下次运行时由load_state恢复并继续append_period
+        """
+        state = self._get_walk_forward_state()
+        state.update({'tiaocang_date_window_size': self._tiaoCangDateWindowSize,
+                      'save_sec_score': self._saveSecScore,
+                      'factor_weight_type': self._factorWeightType,
+                      'alpha_factor_sign': self._alphaFactorSign,
+                      'na_handler': self._na_handler,
+                      'n_jobs': self._nJobs,
+                      'nb_group': self._nbGroup})
+        pickle_dump_data(state, path)
+
+    @classmethod
+    def load_state(cls, path):
+        """
+        :param path: str, *.pkl, see save_state
+        :return: DCAMAnalyzer, 只含滚动状态, 历史调仓日的因子数据不可用
+        """
+        state = pickle_load_data(path)
+        analyzer = cls(layer_factor=state['layer_factor'],
+                       alpha_factor=state['alpha_factor'],
+                       sec_return=state['sec_return'],
+                       tiaocang_date=state['tiaocang_date'],
+                       tiaocang_date_window_size=state['tiaocang_date_window_size'],
+                       save_sec_score=state['save_sec_score'],
+                       factor_weight_type=state['factor_weight_type'],
+                       alpha_factor_sign=state['alpha_factor_sign'],
+                       na_handler=state['na_handler'],
+                       n_jobs=state['n_jobs'],
+                       nb_group=state['nb_group'])
+        analyzer._set_walk_forward_state(state)
+        return analyzer
+
     def calc_alpha_factor_weight_on_date(self, date):
         """
         :param date: datetime, 调仓日
-        :return:  pd.DataFrame,  index = [layerFactor], cols= [alpha factor name]
+        :return:  tuple of pd.DataFrame, 每组一个(两组时为(low, high)), index = [layerFactor], cols= [alpha factor name]
         给定调仓日，计算alpha因子的加权矩阵
         """
         if isinstance(date, basestring):
             date = Date.strptime(date).toDateTime()
 
-        ret_low = pd.DataFrame(columns=self._alphaFactorNames)
-        ret_high = pd.DataFrame(columns=self._alphaFactorNames)
-
-        tiao_cang_date_range = self._tiaoCangDate[
-                               self._tiaoCangDate.index(date) - self._tiaoCangDateWindowSize: self._tiaoCangDate.index(
-                                   date)]
-
-        for layerFactor in self._layerFactor:
-            if self._factorWeightType == FactorWeightType.EqualWeight:
-                ret_low.loc[layerFactor.name] = self._alphaFactorSign
-                ret_high.loc[layerFactor.name] = self._alphaFactorSign
-            else:
-                if self._rank_ic is None:
-                    self._rank_ic = self.calc_rank_ic()
-                low, high = self._rank_ic[0][layerFactor.name], self._rank_ic[1][layerFactor.name]
-                low_to_use = low.loc[tiao_cang_date_range]
-                high_to_use = high.loc[tiao_cang_date_range]
-                weight_low = low_to_use.mean(axis=0) / low_to_use.std(axis=0)
-                weight_high = high_to_use.mean(axis=0) / high_to_use.std(axis=0)
-                ret_low.loc[layerFactor.name] = weight_low.values
-                ret_high.loc[layerFactor.name] = weight_high.values
+        if self._factorWeightType == FactorWeightType.EqualWeight:
+            ret = tuple(pd.DataFrame(columns=self._alphaFactorNames) for _ in range(self._nbGroup))
+            for layerFactor in self._layerFactor:
+                for group_ret in ret:
+                    group_ret.loc[layerFactor.name] = self._alphaFactorSign
+            return ret
 
-        return ret_low, ret_high
+        pos = self._get_tiaocang_date_pos(date)
+        return tuple(pd.DataFrame(weight[pos], index=self._layerFactorNames, columns=self._alphaFactorNames)
+                     for weight in self.calc_alpha_factor_ic_weight())
 
-    def calc_alpha_factor_rank_on_date(self, date, factor_low_weight, factor_high_weight):
+    def calc_alpha_factor_rank_on_date(self, date, *factor_weights):
         """
         :param date, str/datetime, tiaoCangDate
-        :param factor_low_weight, pd.DataFrame, see calc_alpha_factor_weight_on_date
-        :param factor_high_weight, pd.DataFrame,
+        :param factor_weights, pd.DataFrame, 每组一个(两组时为low, high), see calc_alpha_factor_weight_on_date
         :return:  pd.DataFrame,  index = [layerFactor, secID, low/high], index = layerfactor, col = alpha factor
         给定调仓日，计算secIDs的alpha因子的排位
         """
@@ -293,29 +736,27 @@ class DCAMAnalyzer(object):
         if isinstance(date, basestring):
             date = Date.strptime(date).toDateTime()
         for layerFactor in self._layerFactor:
-            # 分层因子下股票分为两组
-            group_low, group_high = DCAMHelper.seperate_sec_group(layerFactor, date)
-            factor_low = DCAMHelper.get_factor_on_date(self._alphaFactor, group_low, date)
-            factor_high = DCAMHelper.get_factor_on_date(self._alphaFactor, group_high, date)
+            # 分层因子下股票分为nb_group组
+            group_factors = self._secGroupCache.get_alpha_factor_on_date(layerFactor, date)
             # 排序的顺序由权重决定
             # 如果权重为正，那么从低到高排序
             # 如果权重为负，那么从高到底排序
             # 加权的时候权重使用绝对值
-            factor_low_rank = pd.DataFrame()
-            factor_high_rank = pd.DataFrame()
-            for alphaFactorName in self._alphaFactorNames:
-                flag_low = True if factor_low_weight[alphaFactorName][layerFactor.name] >= 0 else False
-                flag_high = True if factor_high_weight[alphaFactorName][layerFactor.name] >= 0 else False
-                factor_low_rank_col = factor_low[alphaFactorName].rank(ascending=flag_low, axis=0)
-                factor_high_rank_col = factor_high[alphaFactorName].rank(ascending=flag_high, axis=0)
-                factor_low_rank = pd.concat([factor_low_rank, factor_low_rank_col], axis=1)
-                factor_high_rank = pd.concat([factor_high_rank, factor_high_rank_col], axis=1)
+            group_ranks = []
+            for factor, factor_weight in zip(group_factors, factor_weights):
+                factor_rank = pd.DataFrame()
+                for alphaFactorName in self._alphaFactorNames:
+                    flag = True if factor_weight[alphaFactorName][layerFactor.name] >= 0 else False
+                    factor_rank = pd.concat([factor_rank, factor[alphaFactorName].rank(ascending=flag, axis=0)],
+                                            axis=1)
+                group_ranks.append(factor_rank)
             # multi index DataFrame
-            sec_id_index = np.append(factor_low_rank.index, factor_high_rank.index)
+            sec_id_index = np.concatenate([factor_rank.index.values for factor_rank in group_ranks])
             layer_factor_index = [layerFactor.name] * len(sec_id_index)
-            high_low_index = ['low'] * len(factor_low_rank) + ['high'] * len(factor_high_rank)
-            factor_rank_array = pd.concat([factor_low_rank, factor_high_rank], axis=0).values
-            index = pd.MultiIndex.from_arrays([sec_id_index, layer_factor_index, high_low_index],
+            group_index = np.repeat(np.array(self._groupNames, dtype=object),
+                                    [len(factor_rank) for factor_rank in group_ranks])
+            factor_rank_array = pd.concat(group_ranks, axis=0).values
+            index = pd.MultiIndex.from_arrays([sec_id_index, layer_factor_index, group_index],
                                               names=['secID', 'layerFactor', 'low_high'])
             alpha_factor_rank = pd.DataFrame(factor_rank_array, index=index, columns=self._alphaFactorNames)
             # merge
@@ -329,43 +770,72 @@ class DCAMAnalyzer(object):
         :return: pd.Series, index = secID, cols = score, industry
         给定调仓日, 返回股票打分列表
         """
-        alpha_weight_low, alpha_weight_high = self.calc_alpha_factor_weight_on_date(date)
-        alpha_factor_rank = self.calc_alpha_factor_rank_on_date(date, alpha_weight_low, alpha_weight_high)
+        if isinstance(date, basestring):
+            date = Date.strptime(date).toDateTime()
+        pyFinAssert(not self._walkForward or date == self._tiaoCangDate[-1],
+                    ValueError,
+                    "only the last tiaoCangDate {0} can be scored after append_period/load_state".format(
+                        self._tiaoCangDate[-1]))
+        alpha_weights = self.calc_alpha_factor_weight_on_date(date)
+        alpha_factor_rank = self.calc_alpha_factor_rank_on_date(date, *alpha_weights)
         layer_factor_quantile = self.calc_layer_factor_quantile_on_date(date)
-        sec_ids = layer_factor_quantile.index.tolist()
-        ret = pd.Series(index=sec_ids, name=date)
-        for secID in sec_ids:
-            # 提取secID对应的alphaFactorRank DataFrame, index = [layerFactor, high/low], col = alphaFactor
-            factor_rank_matrix = get_multi_index_data(alpha_factor_rank, 'secID', secID)
-            weighted_rank = 0.0
-            for layerFactor in factor_rank_matrix.index.get_level_values('layerFactor'):
-                factor_rank_on_layer_factor = factor_rank_matrix.loc[
-                    factor_rank_matrix.index.get_level_values('layerFactor') == layerFactor]
-                rank = factor_rank_on_layer_factor.values.flatten()
-                low_high = factor_rank_on_layer_factor.index.get_level_values('low_high')
-                # 权重取绝对值
-                weight = abs(alpha_weight_low.loc[layerFactor].values) if low_high == 'low' else abs(
-                    alpha_weight_high.loc[layerFactor].values)
-                # normalize
-                # weight = [i / weight.sum() for i in weight]
-                layer_factor_quantile_to_use = layer_factor_quantile[layerFactor][secID]
-                weighted_rank += np.dot(weight, rank) * abs(
-                    self.calc_layer_factor_distance(layer_factor_quantile_to_use))
-            ret[secID] = weighted_rank
-
-        return ret
-
-    def calc_sec_score(self):
+        sec_ids = layer_factor_quantile.index
+        layer_pos = dict((name, i) for i, name in enumerate(self._layerFactorNames))
+
+        # 股票 × 分层因子 × alpha因子 的排位张量和对应的权重张量(权重取绝对值), 股票在某分层因子下没有排位时记为0
+        nb_sec, nb_layer, nb_alpha = len(sec_ids), len(self._layerFactorNames), len(self._alphaFactorNames)
+        rank = np.zeros((nb_sec, nb_layer, nb_alpha))
+        weight = np.zeros((nb_sec, nb_layer, nb_alpha))
+        has_rank = np.zeros((nb_sec, nb_layer), dtype=bool)
+        sec_pos = sec_ids.get_indexer(alpha_factor_rank.index.get_level_values('secID'))
+        row_layer_pos = np.array([layer_pos[name] for name in alpha_factor_rank.index.get_level_values('layerFactor')],
+                                 dtype=int)
+        row_group_pos = pd.Index(self._groupNames).get_indexer(alpha_factor_rank.index.get_level_values('low_high'))
+        # shape = (nb_group, nb_layer, nb_alpha)
+        group_weight = np.abs(np.stack([alpha_weight.loc[self._layerFactorNames].values.astype(np.float64)
+                                        for alpha_weight in alpha_weights]))
+        rank[sec_pos, row_layer_pos] = alpha_factor_rank.values
+        weight[sec_pos, row_layer_pos] = group_weight[row_group_pos, row_layer_pos]
+        has_rank[sec_pos, row_layer_pos] = True
+
+        # 股票 × 分层因子 的属性量化分数
+        quantile = layer_factor_quantile[self._layerFactorNames].values.astype(np.float64)
+        distance = np.where(has_rank, np.abs(self.calc_layer_factor_distance(quantile)), 0.0)
+        score = np.einsum('slk,slk,sl->s', rank, weight, distance)
+        return pd.Series(score, index=sec_ids.tolist(), name=date)
+
+    def calc_sec_score(self, n_jobs=None):
         """
-        :param self:
+        :param n_jobs: int, optional, 并行计算的进程数, 默认使用初始化时的n_jobs, 1为串行计算, -1为使用全部cpu
         :return: pd.Series, index = [tiaoCangDate, secID], value = score
         返回所有调仓日的股票打分列表
         """
+        self._check_full_history('calc_sec_score')
+        n_jobs = self._nJobs if n_jobs is None else n_jobs
+        if n_jobs is not None and n_jobs < 0:
+            n_jobs = multiprocessing.cpu_count()
+        dates = self._tiaoCangDate[self._tiaoCangDateWindowSize:]
+
+        if n_jobs is None or n_jobs <= 1 or len(dates) <= 1:
+            sec_scores = [self.calc_sec_score_on_date(date) for date in dates]
+        else:
+            # 所有调仓日共用的ic权重在fork之前计算一次, 子进程只计算各自调仓日的打分
+            if self._factorWeightType == FactorWeightType.ICWeight:
+                self.calc_alpha_factor_ic_weight()
+            pool = multiprocessing.Pool(processes=min(n_jobs, len(dates)),
+                                        initializer=_init_score_worker,
+                                        initargs=(self,))
+            try:
+                # map按输入顺序返回结果, 与串行计算的合并顺序一致
+                sec_scores = pool.map(_calc_sec_score_on_date_worker, dates)
+            finally:
+                pool.close()
+                pool.join()
+
         date_index = []
         sec_id_index = []
         sec_score_value = []
-        for date in self._tiaoCangDate[self._tiaoCangDateWindowSize:]:
-            sec_score = self.calc_sec_score_on_date(date)
+        for date, sec_score in zip(dates, sec_scores):
             date_index += [date] * len(sec_score.values)
             sec_id_index += sec_score.index.tolist()
             sec_score_value += sec_score.values.tolist()
@@ -376,13 +846,63 @@ class DCAMAnalyzer(object):
             ret.reset_index().to_csv('sec_score.csv', date_format='%Y-%m-%d')
         return ret
 
+    def calc_sec_score_sweep(self, param_grid, n_jobs=None):
+        """
+        :param param_grid: dict, key = tiaocang_date_window_size/factor_weight_type/na_handler, value = list of 参数取值,
+        未给出的参数使用analyzer本身的取值
+        :param n_jobs: int, optional, see calc_sec_score
+        :return: pd.DataFrame, col = [tiaocang_date_window_size, factor_weight_type, na_handler, tiaoCangDate, secID,
+        score], 每个参数组合的股票打分
+        对参数网格中的每个组合计算打分: 分组、alpha因子数据和分层因子分位数与参数无关, 所有组合共用;
+        rank ic只与na值处理方式有关, 每种处理方式只计算一次, 不同窗口的权重由同一份rank ic得到
+        """
+        param_names = ['tiaocang_date_window_size', 'factor_weight_type', 'na_handler']
+        unknown_names = [name for name in param_grid if name not in param_names]
+        pyFinAssert(len(unknown_names) == 0, ValueError, "unknown parameters {0} in param_grid".format(unknown_names))
+        self._check_full_history('calc_sec_score_sweep')
+        default_params = {'tiaocang_date_window_size': [self._tiaoCangDateWindowSize],
+                          'factor_weight_type': [self._factorWeightType],
+                          'na_handler': [self._na_handler]}
+        param_values = [param_grid.get(name, default_params[name]) for name in param_names]
+
+        rank_ic = {self._na_handler: self._rank_ic} if self._rank_ic is not None else {}
+        ret = []
+        for window_size, factor_weight_type, na_handler in itertools.product(*param_values):
+            pyFinAssert(len(self._tiaoCangDate) > window_size,
+                        ValueError,
+                        "length of tiaoCangDate must be larger than moving window size")
+            if factor_weight_type == FactorWeightType.EqualWeight:
+                pyFinAssert(self._alphaFactorSign is not None and len(self._alphaFactorSign) == len(self._alphaFactor),
+                            ValueError,
+                            "alpha_factor_sign must be given for each alpha factor for equal weight")
+            # 浅复制共享因子数据、分组缓存和分位数缓存
+            analyzer = copy.copy(self)
+            analyzer._tiaoCangDateWindowSize = window_size
+            analyzer._factorWeightType = factor_weight_type
+            analyzer._na_handler = na_handler
+            analyzer._saveSecScore = False
+            analyzer._rank_ic = rank_ic.get(na_handler)
+            analyzer._alphaFactorICWeight = None
+
+            sec_score = analyzer.calc_sec_score(n_jobs=n_jobs).reset_index()
+            if analyzer._rank_ic is not None:
+                rank_ic[na_handler] = analyzer._rank_ic
+            sec_score.insert(0, 'na_handler', na_handler)
+            sec_score.insert(0, 'factor_weight_type', factor_weight_type)
+            sec_score.insert(0, 'tiaocang_date_window_size', window_size)
+            ret.append(sec_score)
+
+        if self._rank_ic is None:
+            self._rank_ic = rank_ic.get(self._na_handler)
+        return pd.concat(ret, ignore_index=True)
+
 
 def sigmoid_modif(x):
     """
-    :param x: float
+    :param x: float/np.array
     :return: modified sigmoid value given x
     """
-    return 10 * (1 / (1 + e ** (-(10 * (x - 0.5)))) - 0.5)
+    return 10 * (1 / (1 + np.exp(-(10 * (np.asarray(x) - 0.5)))) - 0.5)
 
 
 def plot_layer_factor_distance():
@@ -433,13 +953,10 @@ def get_analyzer_table(factor_loader_params,
     factor = FactorLoader(start_date=start_date,
                           end_date=end_date,
                           factor_norm_dict=factor_norm_dict,
-                          na_handler=na_handler)
+                          na_handler=na_handler,
+                          cache_path=_factor_cache_path)
 
-    if update_factor:
-        factor_data = factor.get_norm_factor_data()
-        pickle_dump_data(factor_data, _factor_pkl_path)
-    else:
-        factor_data = pickle_load_data(_factor_pkl_path)
+    factor_data = factor.get_norm_factor_data(refresh_cache=update_factor)
 
     layer_factor = [factor_data[name] for name in factor_norm_dict.keys() if
                     factor_norm_dict[name][1] == DCAMFactorType.layerFactor]
@@ -8,7 +8,6 @@ from PyFin import DateUtilities
 from PyFin.api.DateUtilities import bizDatesList
 from alphalens.performance import mean_return_by_quantile
 from alphalens.performance import compute_mean_returns_spread
-from alphalens.performance import factor_information_coefficient
 from alphalens.utils import get_clean_factor_and_forward_returns
 from alphalens.plotting import plot_mean_quantile_returns_spread_time_series
 from alphalens.plotting import plot_cumulative_returns_by_quantile
@@ -21,11 +20,13 @@ from pyStratAlpha.enums import DataSource
 from pyStratAlpha.enums import FreqType
 from pyStratAlpha.utils import get_sec_price
 from pyStratAlpha.enums import FactorNormType
+from pyStratAlpha.maths.stats import spearman_corr
 from pyStratAlpha.utils import time_index_slicer
 from pyStratAlpha.analyzer.factor import FactorLoader
 
 _alphaLensFactorIndexName = ['date', 'asset']
 _alphaLensFactorColName = 'factor'
+_alphaLensNonReturnColName = ['factor', 'group', 'factor_quantile']
 
 
 class FactorAnalyzer(object):
@@ -138,9 +139,24 @@ class FactorAnalyzer(object):
         plt.show()
         return
 
+    @staticmethod
+    def calc_factor_ic(factor_and_return):
+        """
+        :param factor_and_return: pd.DataFrame, see alphalens.utils.get_clean_factor_and_forward_returns
+        :return: pd.DataFrame, index = date, col = 各期远期收益, 每个日期因子与远期收益的rank ic
+        所有日期和所有期限一次性计算, 与alphalens.performance.factor_information_coefficient相同
+        """
+        return_cols = [col for col in factor_and_return.columns if col not in _alphaLensNonReturnColName]
+        ic = spearman_corr(factor_and_return[return_cols],
+                           factor_and_return[_alphaLensFactorColName],
+                           groups=factor_and_return.index.get_level_values(_alphaLensFactorIndexName[0]),
+                           nan_policy='propagate')
+        ic.index.name = _alphaLensFactorIndexName[0]
+        return ic
+
     def create_ic_tear_sheet(self):
         factor_and_return = self._get_clean_factor_and_fwd_return(self._factor, self._factor_freq)
-        ic = factor_information_coefficient(factor_and_return)
+        ic = self.calc_factor_ic(factor_and_return)
         plot_ic_hist(ic)
         self.ic_bar_tear_sheet(ic)
         plot_monthly_ic_heatmap(ic)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+
+from pyStratAlpha.utils import pickle_dump_data
+from pyStratAlpha.utils import pickle_load_data
+
+_cacheFileSuffix = '.pkl'
+
+
+def get_source_signature(file_path):
+    """
+    :param file_path: str, 数据文件路径
+    :return: tuple, (绝对路径, 修改时间, 文件大小), 数据文件被更新后签名随之改变
+    """
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), int(stat.st_mtime), stat.st_size
+
+
+class FactorCache(object):
+    """
+    按内容寻址的因子缓存: 每个(标准化后的)因子单独存为一个pickle文件, 文件名为生成该因子的全部参数的hash
+    参数或数据文件改变时hash改变, 旧的缓存不会被误用, 并在超出容量上限时按最近使用时间(LRU)淘汰
+    """
+
+    def __init__(self, cache_path, max_size=2 * 1024 ** 3):
+        """
+        :param cache_path: str, 缓存文件夹路径
+        :param max_size: int, optional, 缓存文件总大小上限(字节)
+        :return:
+        """
+        self._cachePath = cache_path
+        self._maxSize = max_size
+        if not os.path.exists(cache_path):
+            os.makedirs(cache_path)
+
+    @staticmethod
+    def get_key(*args):
+        """
+        :param args: 生成因子数据的参数, 需要有稳定的repr
+        :return: str, 参数的hash
+        """
+        return hashlib.sha1(repr(args).encode('utf-8')).hexdigest()
+
+    def _get_file_path(self, key):
+        return os.path.join(self._cachePath, key + _cacheFileSuffix)
+
+    def __contains__(self, key):
+        return os.path.exists(self._get_file_path(key))
+
+    def load(self, key):
+        """
+        :param key: str, see get_key
+        :return: 缓存的数据, 不存在时返回None
+        """
+        file_path = self._get_file_path(key)
+        if not os.path.exists(file_path):
+            return None
+        data = pickle_load_data(file_path)
+        os.utime(file_path, None)  # 记录最近使用时间
+        return data
+
+    def save(self, key, data):
+        """
+        :param key: str, see get_key
+        :param data: 需要缓存的数据
+        :return:
+        """
+        file_path = self._get_file_path(key)
+        tmp_path = file_path + '.tmp'
+        pickle_dump_data(data, tmp_path)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        os.rename(tmp_path, file_path)
+        self._evict(keep=file_path)
+
+    def _evict(self, keep=None):
+        """
+        :param keep: str, optional, 不被淘汰的缓存文件
+        :return:
+        按最近使用时间从旧到新删除缓存文件, 直到总大小不超过上限
+        """
+        files = [os.path.join(self._cachePath, name) for name in os.listdir(self._cachePath)
+                 if name.endswith(_cacheFileSuffix)]
+        files = sorted(files, key=os.path.getmtime)
+        total_size = sum(os.path.getsize(name) for name in files)
+        for name in files:
+            if total_size <= self._maxSize:
+                break
+            if name == keep:
+                continue
+            total_size -= os.path.getsize(name)
+            os.remove(name)
+
+    def clear(self):
+        for name in os.listdir(self._cachePath):
+            if name.endswith(_cacheFileSuffix):
+                os.remove(os.path.join(self._cachePath, name))
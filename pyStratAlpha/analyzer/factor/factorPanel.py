@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+
+import numpy as np
+import pandas as pd
+from PyFin.Utilities import pyFinAssert
+
+
+class FactorPanel(object):
+    """
+    稠密的因子面板数据, values.shape = (日期数, 股票数, 因子数)
+    日期和secID以整数编码为数组的前两个维度, 单个日期的截面数据是连续内存上的切片(O(1))
+    mask记录每个(日期, secID, 因子)在原始数据中是否存在, 以区分"缺失"与"值为NaN"
+    面板不记录原始数据的行顺序, 转换回multi index数据(to_series, to_frame, get_multi_index_data)时总是按日期、secID升序排列
+    """
+
+    def __init__(self,
+                 values,
+                 dates,
+                 sec_ids,
+                 factor_names,
+                 mask=None,
+                 date_index_name='tiaoCangDate',
+                 sec_index_name='secID'):
+        """
+        :param values: np.array, shape = (nb_dates, nb_secs, nb_factors), float
+        :param dates: list/pd.DatetimeIndex, 升序排列的日期
+        :param sec_ids: list/pd.Index, secID
+        :param factor_names: list of str, 因子名称
+        :param mask: np.array of bool, optional, shape与values相同, 原始数据中存在的元素, 默认为非NaN的元素
+        :param date_index_name: str, optional, 转换为multi index数据时的日期index名称
+        :param sec_index_name: str, optional, 转换为multi index数据时的secID index名称
+        """
+        self._values = np.ascontiguousarray(values, dtype=np.float64)
+        self._dates = pd.DatetimeIndex(dates)
+        self._secIDs = pd.Index(sec_ids)
+        self._factorNames = list(factor_names)
+        pyFinAssert(self._values.shape == (len(self._dates), len(self._secIDs), len(self._factorNames)),
+                    ValueError,
+                    "shape of values {0} does not match that of dates, sec ids and factor names".format(
+                        self._values.shape))
+        pyFinAssert(self._dates.is_monotonic_increasing and self._dates.is_unique,
+                    ValueError,
+                    "dates must be unique and sorted in ascending order")
+        self._mask = ~np.isnan(self._values) if mask is None else np.asarray(mask, dtype=bool)
+        self._dateIndexName = date_index_name
+        self._secIndexName = sec_index_name
+
+    @classmethod
+    def from_series(cls, factors, factor_names=None, date_index_name='tiaoCangDate', sec_index_name='secID'):
+        """
+        :param factors: list of pd.Series/dict/pd.Series of pd.Series(FactorLoader.get_factor_data的结果),
+        multi index = [date_index_name, sec_index_name], value = factor
+        :param factor_names: list of str, optional, 需要转换的因子名称, 仅当factors为dict或pd.Series时有效
+        :param date_index_name: str, optional, 日期index名称
+        :param sec_index_name: str, optional, secID index名称
+        :return: FactorPanel
+        """
+        if isinstance(factors, (dict, pd.Series)):
+            factor_names = list(factors.keys()) if factor_names is None else list(factor_names)
+            factors = [factors[name] for name in factor_names]
+        else:
+            factors = list(factors)
+            factor_names = [factor.name for factor in factors]
+
+        for factor in factors:
+            pyFinAssert(np.issubdtype(factor.dtype, np.number),
+                        TypeError,
+                        "factor {0} is not numeric and can not be stored in FactorPanel".format(factor.name))
+
+        dates = pd.DatetimeIndex(sorted(set().union(*[factor.index.get_level_values(date_index_name).unique()
+                                                      for factor in factors])))
+        sec_ids = pd.Index(sorted(set().union(*[factor.index.get_level_values(sec_index_name).unique()
+                                                for factor in factors])))
+
+        values = np.empty((len(dates), len(sec_ids), len(factors)))
+        values.fill(np.nan)
+        mask = np.zeros(values.shape, dtype=bool)
+        for k, factor in enumerate(factors):
+            date_pos = dates.get_indexer(factor.index.get_level_values(date_index_name))
+            sec_pos = sec_ids.get_indexer(factor.index.get_level_values(sec_index_name))
+            values[date_pos, sec_pos, k] = factor.values
+            mask[date_pos, sec_pos, k] = True
+
+        return cls(values,
+                   dates,
+                   sec_ids,
+                   factor_names,
+                   mask=mask,
+                   date_index_name=date_index_name,
+                   sec_index_name=sec_index_name)
+
+    @property
+    def values(self):
+        return self._values
+
+    @property
+    def mask(self):
+        return self._mask
+
+    @property
+    def nan_mask(self):
+        return np.isnan(self._values)
+
+    @property
+    def dates(self):
+        return self._dates
+
+    @property
+    def sec_ids(self):
+        return self._secIDs
+
+    @property
+    def factor_names(self):
+        return self._factorNames
+
+    @property
+    def shape(self):
+        return self._values.shape
+
+    def get_date_pos(self, date):
+        """
+        :param date: str/datetime.datetime, 日期
+        :return: int, 日期在面板中的位置
+        """
+        return self._dates.get_loc(pd.Timestamp(date))
+
+    def get_factor_pos(self, factor_name):
+        return self._factorNames.index(factor_name)
+
+    def get_factor(self, factor_name):
+        """
+        :param factor_name: str, 因子名称
+        :return: np.array, shape = (nb_dates, nb_secs), 因子数据(视图, 不复制)
+        """
+        return self._values[:, :, self.get_factor_pos(factor_name)]
+
+    def get_cross_section(self, date, factor_names=None):
+        """
+        :param date: str/datetime.datetime, 日期
+        :param factor_names: list of str, optional, 因子名称
+        :return: pd.DataFrame, index = secID (至少一个因子存在), col = factor names
+        """
+        pos = self.get_date_pos(date)
+        factor_names = self._factorNames if factor_names is None else factor_names
+        factor_pos = [self.get_factor_pos(name) for name in factor_names]
+        sec_pos = np.flatnonzero(self._mask[pos][:, factor_pos].any(axis=1))
+        ret = pd.DataFrame(self._values[pos][sec_pos][:, factor_pos],
+                           index=self._secIDs[sec_pos],
+                           columns=factor_names)
+        ret.index.name = self._secIndexName
+        return ret
+
+    def slice_dates(self, start_date=None, end_date=None):
+        """
+        :param start_date: str/datetime.datetime, optional, 开始日期
+        :param end_date: str/datetime.datetime, optional, 结束日期
+        :return: FactorPanel, 日期范围内的面板(共享内存)
+        """
+        lo = 0 if start_date is None else self._dates.searchsorted(pd.Timestamp(start_date), side='left')
+        hi = len(self._dates) if end_date is None else self._dates.searchsorted(pd.Timestamp(end_date), side='right')
+        return FactorPanel(self._values[lo:hi],
+                           self._dates[lo:hi],
+                           self._secIDs,
+                           self._factorNames,
+                           mask=self._mask[lo:hi],
+                           date_index_name=self._dateIndexName,
+                           sec_index_name=self._secIndexName)
+
+    def to_series(self, factor_name=None):
+        """
+        :param factor_name: str, optional, 因子名称, 面板中只有一个因子时可省略
+        :return: pd.Series, multi index = [date_index_name, sec_index_name], value = factor
+        按日期、secID升序排列
+        """
+        if factor_name is None:
+            pyFinAssert(len(self._factorNames) == 1, ValueError, "factor name must be given for multi-factor panel")
+            factor_name = self._factorNames[0]
+        k = self.get_factor_pos(factor_name)
+        date_pos, sec_pos = np.nonzero(self._mask[:, :, k])
+        index = pd.MultiIndex.from_arrays([self._dates[date_pos], self._secIDs[sec_pos]],
+                                          names=[self._dateIndexName, self._secIndexName])
+        return pd.Series(self._values[date_pos, sec_pos, k], index=index, name=factor_name)
+
+    def to_series_list(self, factor_names=None):
+        """
+        :param factor_names: list of str, optional, 因子名称
+        :return: list of pd.Series, see to_series
+        """
+        factor_names = self._factorNames if factor_names is None else factor_names
+        return [self.to_series(name) for name in factor_names]
+
+    def to_frame(self, factor_names=None):
+        """
+        :param factor_names: list of str, optional, 因子名称
+        :return: pd.DataFrame, multi index = [date_index_name, sec_index_name], col = factor names
+        """
+        factor_names = self._factorNames if factor_names is None else factor_names
+        factor_pos = [self.get_factor_pos(name) for name in factor_names]
+        date_pos, sec_pos = np.nonzero(self._mask[:, :, factor_pos].any(axis=2))
+        index = pd.MultiIndex.from_arrays([self._dates[date_pos], self._secIDs[sec_pos]],
+                                          names=[self._dateIndexName, self._secIndexName])
+        return pd.DataFrame(self._values[date_pos, sec_pos][:, factor_pos], index=index, columns=factor_names)
+
+    def get_multi_index_data(self, first_idx_name, first_idx_val, sec_idx_name=None, sec_idx_val=None):
+        """
+        :return: pd.Series(单因子)/pd.DataFrame(多因子), 与cleanData.get_multi_index_data相同的切片,
+        但只对选中的日期或secID转换, 不需要扫描全部数据
+        注意: 结果按日期、secID升序排列, 而cleanData.get_multi_index_data按原始数据的行顺序返回;
+        原始数据未排序时, 两者只在sort_index之后相同
+        """
+        pyFinAssert(first_idx_name in [self._dateIndexName, self._secIndexName],
+                    ValueError,
+                    "unknown index name {0}".format(first_idx_name))
+        if isinstance(first_idx_val, basestring) or isinstance(first_idx_val, datetime.datetime):
+            first_idx_val = [first_idx_val]
+        if sec_idx_name is None:
+            sec_idx_val = None
+        elif isinstance(sec_idx_val, basestring) or isinstance(sec_idx_val, datetime.date):
+            sec_idx_val = [sec_idx_val]
+
+        if first_idx_name == self._dateIndexName:
+            date_val, sec_val = first_idx_val, sec_idx_val
+        else:
+            date_val, sec_val = sec_idx_val, first_idx_val
+        date_pos = np.arange(len(self._dates)) if date_val is None else self._dates.get_indexer(date_val)
+        date_pos = np.unique(date_pos[date_pos >= 0])
+        sec_pos = np.arange(len(self._secIDs)) if sec_val is None else self._secIDs.get_indexer(sec_val)
+        sec_pos = np.unique(sec_pos[sec_pos >= 0])
+
+        sub_mask = self._mask[date_pos][:, sec_pos].any(axis=2)
+        sub_date_pos, sub_sec_pos = np.nonzero(sub_mask)
+        date_pos, sec_pos = date_pos[sub_date_pos], sec_pos[sub_sec_pos]
+        index = pd.MultiIndex.from_arrays([self._dates[date_pos], self._secIDs[sec_pos]],
+                                          names=[self._dateIndexName, self._secIndexName])
+        if len(self._factorNames) == 1:
+            return pd.Series(self._values[date_pos, sec_pos, 0], index=index, name=self._factorNames[0])
+        return pd.DataFrame(self._values[date_pos, sec_pos], index=index, columns=self._factorNames)
+
+
+def as_factor_series(factor):
+    """
+    :param factor: pd.Series/FactorPanel(单因子)
+    :return: pd.Series, multi index = [tiaoCangDate, secID]
+    已有的接口通过此函数同时接受multi index pd.Series和FactorPanel
+    DCAMAnalyzer, Selector和IndexComp在构造时即转换为pd.Series, 之后的计算不使用面板;
+    转换结果按日期、secID升序排列, 与原始pd.Series的行顺序可能不同
+    """
+    if isinstance(factor, FactorPanel):
+        return factor.to_series()
+    return factor
+
+
+def as_factor_series_list(factors):
+    """
+    :param factors: list of pd.Series/FactorPanel
+    :return: list of pd.Series, multi index = [tiaoCangDate, secID]
+    """
+    if isinstance(factors, FactorPanel):
+        return factors.to_series_list()
+    return list(factors)
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from PyFin.Utilities import pyFinAssert
+
+from pyStratAlpha.analyzer.factor.cleanData import factor_na_handler
+from pyStratAlpha.enums import FactorNAHandler
+from pyStratAlpha.utils import date_utils
+
+_metaFileName = 'meta.json'
+_datesFileName = 'dates.npy'
+_dateOffsetsFileName = 'date_offsets.npy'
+_secIDsFileName = 'sec_ids.npy'
+_secCodesFileName = 'sec_codes.npy'
+_rowOrderFileName = 'row_order.npy'
+_labelsSuffix = '.labels'
+
+
+def get_factor_store_path(csv_path):
+    """
+    :param csv_path: str, 因子csv文件路径
+    :return: str, 对应的因子库文件夹路径
+    """
+    return os.path.splitext(csv_path)[0] + '_store'
+
+
+def is_factor_store_outdated(csv_path, store_path=None):
+    """
+    :param csv_path: str, 因子csv文件路径
+    :param store_path: str, optional, 因子库文件夹路径
+    :return: bool, 因子库不存在、早于csv文件生成或缺少行顺序文件(旧版本因子库)时返回True
+    """
+    store_path = get_factor_store_path(csv_path) if store_path is None else store_path
+    meta_path = os.path.join(store_path, _metaFileName)
+    return not os.path.exists(meta_path) or os.path.getmtime(meta_path) < os.path.getmtime(csv_path) or \
+        not os.path.exists(os.path.join(store_path, _rowOrderFileName))
+
+
+def convert_csv_to_factor_store(csv_path, store_path=None, date_format='%Y%m%d'):
+    """
+    :param csv_path: str, 因子csv文件路径, col =[datetime, secid, factor1, factor2, ...]
+    :param store_path: str, optional, 因子库文件夹路径, 默认为csv文件同名文件夹
+    :param date_format: str, optional, csv中日期格式
+    :return: str, 因子库文件夹路径
+    把csv因子文件一次性转换为按列存储的npy文件夹:
+    行按日期(稳定)排序, 日期缺失的行排在最后, 并保存每行在csv中的位置, 读取时恢复csv中的行顺序;
+    日期和secID以字典编码存储(secID缺失时编码为-1), 每个因子一个npy文件, 字符串因子(如行业)以编码+标签存储
+    """
+    store_path = get_factor_store_path(csv_path) if store_path is None else store_path
+    if not os.path.exists(store_path):
+        os.makedirs(store_path)
+
+    data = pd.read_csv(csv_path)
+    date_col, sec_col = data.columns[0], data.columns[1]
+    trade_date = pd.to_datetime(data[date_col], format=date_format)
+    sec_codes, sec_ids = pd.factorize(data[sec_col])
+
+    valid = trade_date.notnull().values
+    date_values = trade_date.values[valid].astype('datetime64[ns]').view('int64')
+    # 同一日期内保持csv中原有的行顺序, 日期缺失的行排在最后
+    order = np.flatnonzero(valid)[np.argsort(date_values, kind='mergesort')]
+    dates, date_codes = np.unique(trade_date.values[order].astype('datetime64[ns]').view('int64'),
+                                  return_inverse=True)
+    date_offsets = np.searchsorted(date_codes, np.arange(len(dates) + 1)).astype('int64')
+    order = np.concatenate([order, np.flatnonzero(~valid)])
+
+    np.save(os.path.join(store_path, _datesFileName), dates)
+    np.save(os.path.join(store_path, _dateOffsetsFileName), date_offsets)
+    np.save(os.path.join(store_path, _secIDsFileName), np.array([str(sec_id) for sec_id in sec_ids]))
+    np.save(os.path.join(store_path, _secCodesFileName), sec_codes[order].astype('int32'))
+    np.save(os.path.join(store_path, _rowOrderFileName), order.astype('int64'))
+
+    factor_names = data.columns[2:].tolist()
+    categorical = []
+    for name in factor_names:
+        column = data[name].values[order]
+        if column.dtype == object:
+            codes, labels = pd.factorize(column)
+            np.save(os.path.join(store_path, name + '.npy'), codes.astype('int32'))
+            np.save(os.path.join(store_path, name + _labelsSuffix + '.npy'),
+                    np.array([str(label) for label in labels]))
+            categorical.append(name)
+        else:
+            np.save(os.path.join(store_path, name + '.npy'), column)
+
+    meta = {'date_col': date_col,
+            'sec_col': sec_col,
+            'factor_names': factor_names,
+            'categorical': categorical}
+    with open(os.path.join(store_path, _metaFileName), 'w') as f:
+        json.dump(meta, f)
+    return store_path
+
+
+class FactorStore(object):
+    def __init__(self, store_path, mmap_mode='r'):
+        """
+        :param store_path: str, 因子库文件夹路径, see convert_csv_to_factor_store
+        :param mmap_mode: str, optional, np.load的内存映射模式, 多个进程读取同一因子库时共享page cache
+        :return:
+        """
+        pyFinAssert(os.path.exists(os.path.join(store_path, _metaFileName)),
+                    ValueError,
+                    "factor store {0} does not exist".format(store_path))
+        self._storePath = store_path
+        self._mmapMode = mmap_mode
+        with open(os.path.join(store_path, _metaFileName), 'r') as f:
+            self._meta = json.load(f)
+        self._dates = np.load(os.path.join(store_path, _datesFileName)).view('datetime64[ns]')
+        self._dateOffsets = np.load(os.path.join(store_path, _dateOffsetsFileName))
+        self._secIDs = np.load(os.path.join(store_path, _secIDsFileName)).astype(object)
+        self._secCodes = np.load(os.path.join(store_path, _secCodesFileName), mmap_mode=mmap_mode)
+        self._rowOrder = np.load(os.path.join(store_path, _rowOrderFileName), mmap_mode=mmap_mode)
+        self._bizDates = None
+
+    @property
+    def factor_names(self):
+        return [str(name) for name in self._meta['factor_names']]
+
+    @property
+    def dates(self):
+        return pd.DatetimeIndex(self._dates)
+
+    def _get_biz_dates(self):
+        if self._bizDates is None:
+            self._bizDates = pd.DatetimeIndex(date_utils.map_to_biz_day(pd.Series(self._dates)).values)
+        return self._bizDates
+
+    @staticmethod
+    def _get_date_range(dates, start_date, end_date):
+        """
+        :return: tuple, 日期范围对应的日期编码区间[lo, hi)
+        日期按交易日映射后仍然有序, 因此日期范围对应连续的日期编码(和连续的行)
+        """
+        lo = 0 if start_date is None else dates.searchsorted(pd.Timestamp(start_date), side='left')
+        hi = len(dates) if end_date is None else dates.searchsorted(pd.Timestamp(end_date), side='right')
+        return lo, hi
+
+    def _read_column(self, factor_name, lo, hi, row_order):
+        """
+        :param row_order: np.array of int, [lo, hi)内的行恢复为csv中行顺序的排列
+        """
+        values = np.load(os.path.join(self._storePath, factor_name + '.npy'), mmap_mode=self._mmapMode)[lo:hi]
+        values = np.asarray(values)[row_order]
+        if factor_name in self._meta['categorical']:
+            labels = np.load(os.path.join(self._storePath, factor_name + _labelsSuffix + '.npy')).astype(object)
+            codes = values
+            values = labels[codes]
+            values[codes < 0] = np.nan
+        return values
+
+    def load_factors(self,
+                     factor_names,
+                     start_date=None,
+                     end_date=None,
+                     index_name=['tradeDate', 'secID'],
+                     return_biz_day=True,
+                     na_handler=FactorNAHandler.Drop):
+        """
+        :param factor_names: list of str, 因子名称, 只读取对应的npy文件
+        :param start_date: str/datetime.datetime, optional, 只读取此日期之后的数据
+        :param end_date: str/datetime.datetime, optional, 只读取此日期之前的数据
+        :param index_name: multi index name to be set
+        :param return_biz_day: bool, 是否返回交易日
+        :param na_handler: enum, 对na值处理的枚举变量
+        :return: dict, {factor_name: pd.Series, multiindex =[datetime, secid] value = factor}
+        与get_universe_multi_factor结果相同(日期范围内), 行按csv中的顺序排列;
+        日期缺失的行只在没有给定日期范围时返回
+        """
+        for name in factor_names:
+            pyFinAssert(name in self._meta['factor_names'],
+                        ValueError,
+                        "factor {0} is not in factor store {1}".format(name, self._storePath))
+
+        dates = self._get_biz_dates() if return_biz_day else self.dates
+        date_lo, date_hi = self._get_date_range(dates, start_date, end_date)
+        lo, hi = self._dateOffsets[date_lo], self._dateOffsets[date_hi]
+        date_codes = np.repeat(np.arange(date_lo, date_hi), np.diff(self._dateOffsets[date_lo:date_hi + 1]))
+        trade_date = dates.values[date_codes]
+        if start_date is None and end_date is None:
+            # 日期缺失的行存储在最后
+            hi = len(self._secCodes)
+            no_date = np.empty(hi - self._dateOffsets[-1], dtype=trade_date.dtype)
+            no_date.fill(np.datetime64('NaT'))
+            trade_date = np.concatenate([trade_date, no_date])
+        # 恢复csv中的行顺序
+        row_order = np.argsort(np.asarray(self._rowOrder[lo:hi]), kind='mergesort')
+        trade_date = pd.Series(trade_date[row_order])
+        sec_codes = np.asarray(self._secCodes[lo:hi])[row_order]
+        sec_id = self._secIDs[sec_codes]
+        sec_id[sec_codes < 0] = np.nan
+        sec_id = pd.Series(sec_id)
+
+        ret = {}
+        for name in factor_names:
+            factor = pd.DataFrame({'tradeDate': trade_date, 'secID': sec_id,
+                                   'factor': self._read_column(name, lo, hi, row_order)},
+                                  columns=['tradeDate', 'secID', 'factor'])
+            factor = factor_na_handler(factor, na_handler)
+            factor = factor[factor['secID'].str.contains(r'^[^<A>]+$$')]  # 去除类似AXXXX的代码(IPO终止)
+            index = pd.MultiIndex.from_arrays([factor['tradeDate'].values, factor['secID'].values], names=index_name)
+            ret[name] = pd.Series(factor['factor'].values, index=index, name='factor')
+        return ret
+
+    def load_factor(self, factor_name, start_date=None, end_date=None, index_name=['tradeDate', 'secID'],
+                    return_biz_day=True, na_handler=FactorNAHandler.Drop):
+        """
+        :return: pd.Series, multiindex =[datetime, secid] value = factor, see load_factors
+        """
+        return self.load_factors([factor_name],
+                                 start_date=start_date,
+                                 end_date=end_date,
+                                 index_name=index_name,
+                                 return_biz_day=return_biz_day,
+                                 na_handler=na_handler)[factor_name]
@@ -5,8 +5,16 @@ import pandas as pd
 from PyFin.Utilities import pyFinAssert
 
 from pyStratAlpha.analyzer.factor.cleanData import adjust_factor_date
+from pyStratAlpha.analyzer.factor.cleanData import get_report_date
+from pyStratAlpha.analyzer.factor.cleanData import get_universe_multi_factor
 from pyStratAlpha.analyzer.factor.cleanData import get_universe_single_factor
-from pyStratAlpha.analyzer.factor.norm import normalize_single_factor_data
+from pyStratAlpha.analyzer.factor.factorCache import FactorCache
+from pyStratAlpha.analyzer.factor.factorCache import get_source_signature
+from pyStratAlpha.analyzer.factor.factorStore import FactorStore
+from pyStratAlpha.analyzer.factor.factorStore import convert_csv_to_factor_store
+from pyStratAlpha.analyzer.factor.factorStore import get_factor_store_path
+from pyStratAlpha.analyzer.factor.factorStore import is_factor_store_outdated
+from pyStratAlpha.analyzer.factor.norm import normalize_multi_factor_data
 from pyStratAlpha.enums import FactorNAHandler
 from pyStratAlpha.enums import FactorNormType
 from pyStratAlpha.utils import get_pos_adj_date
@@ -90,7 +98,10 @@ class FactorLoader(object):
                  zip_path="..//..//data",
                  factor_path_dict=_factorPathDict,
                  date_format='%Y%m%d',
-                 na_handler=FactorNAHandler.Ignore):
+                 na_handler=FactorNAHandler.Ignore,
+                 use_factor_store=False,
+                 cache_path=None,
+                 cache_size_limit=2 * 1024 ** 3):
         """
         :param start_date: str/datetime.datetime, 提取因子数据的开始日期
         :param end_date: str/datetime.datetime, 提取因子数据的结束日期
@@ -98,6 +109,9 @@ class FactorLoader(object):
         :param freq: str, optional, 因子数据的频率
         :param zip_path: str, optional, 数据文件压缩包地址
         :param date_format: str, optional, 数据文件中时间格式
+        :param use_factor_store: bool, optional, 是否从npy因子库读取数据, 因子库不存在或过期时自动从csv转换
+        :param cache_path: str, optional, 标准化因子数据的缓存文件夹, None表示不使用缓存
+        :param cache_size_limit: int, optional, 缓存文件总大小上限(字节)
         :return: class， 存储清理后的因子数据
         """
         self._startDate = start_date
@@ -110,6 +124,8 @@ class FactorLoader(object):
         self._factorPathDict = factor_path_dict
         self._dateFormat = date_format
         self._na_handler = na_handler
+        self._useFactorStore = use_factor_store
+        self._cache = FactorCache(cache_path, max_size=cache_size_limit) if cache_path is not None else None
         # 由于因子csv文件较大,所以默认存储为压缩格式的文件, 第一次使用时自动解压缩
         unzip_csv_folder(zip_path)
 
@@ -124,45 +140,166 @@ class FactorLoader(object):
     def get_tiaocang_date(self):
         return get_pos_adj_date(self._startDate, self._endDate, freq=self._freq)
 
-    def get_factor_data(self):
+    def _load_raw_factor_data(self, factor_names):
+        """
+        :param factor_names: list of str, 因子名称
+        :return: dict, {factor_name: pd.Series, multiindex =[tradeDate, secID]}
+        同一数据文件中的因子合并读取, 每个文件只解析一次
+        """
+        names_by_path = {}
+        for name in factor_names:
+            names_by_path.setdefault(self._factorPathDict[name]['path'], []).append(name)
+
+        ret = {}
+        for path_to_use, names in names_by_path.items():
+            if self._useFactorStore:
+                ret.update(self._load_factor_store_data(path_to_use, names))
+            else:
+                ret.update(get_universe_multi_factor(path_to_use,
+                                                     factor_names=names,
+                                                     date_format=self._dateFormat,
+                                                     na_handler=self._na_handler))
+        return ret
+
+    def _load_factor_store_data(self, csv_path, factor_names):
+        """
+        :param csv_path: str, 因子csv文件路径
+        :param factor_names: list of str, 因子名称
+        :return: dict, {factor_name: pd.Series, multiindex =[tradeDate, secID]}
+        从因子库读取, 只读取需要的因子列; na处理只依赖单行数据时(Ignore/Drop), 只读取所需的日期范围
+        """
+        store_path = get_factor_store_path(csv_path)
+        if is_factor_store_outdated(csv_path, store_path):
+            convert_csv_to_factor_store(csv_path, store_path, date_format=self._dateFormat)
+        store = FactorStore(store_path)
+
+        if self._na_handler in [FactorNAHandler.Ignore, FactorNAHandler.Drop]:
+            # 季度因子需要读取开始日期对应的报告日之后的数据
+            need_report_date = any(self._factorPathDict[name]['freq'] != self._freq for name in factor_names)
+            start_date = get_report_date(self._startDate) if need_report_date else self._startDate
+            end_date = self._endDate
+        else:
+            start_date = None
+            end_date = None
+        return store.load_factors(factor_names,
+                                  start_date=start_date,
+                                  end_date=end_date,
+                                  na_handler=self._na_handler)
+
+    def get_factor_data(self, factor_names=None):
+        """
+        :param factor_names: list of str, optional, 需要读取的因子名称, 默认为全部因子
+        :return: pd.Series, index = factor names, value = pd.Series(multiindex =[tiaoCangDate, secID])
+        """
+        factor_names = self._factorNames if factor_names is None else factor_names
         returns = pd.Series()
-        for name in self._factorNames:
-            path_to_use = self._factorPathDict[name]['path']
+        factor_raw_dict = self._load_raw_factor_data(factor_names)
+        for name in factor_names:
             original_freq = self._factorPathDict[name]['freq']
+            factor_raw = factor_raw_dict[name]
             if original_freq != self._freq:
-                factor_raw = get_universe_single_factor(path_to_use, factor_name=name, date_format=self._dateFormat,
-                                                        na_handler=self._na_handler)
                 factors = adjust_factor_date(factor_raw, self._startDate, self._endDate, self._freq)
             else:
-                factor_raw = get_universe_single_factor(path_to_use, index_name=['tiaoCangDate', 'secID'],
-                                                        factor_name=name,
-                                                        date_format=self._dateFormat,
-                                                        na_handler=self._na_handler)
+                factor_raw.index.names = ['tiaoCangDate', 'secID']
                 factor_raw = factor_raw.loc[factor_raw.index.get_level_values('tiaoCangDate') >= self._startDate]
                 factors = factor_raw.loc[factor_raw.index.get_level_values('tiaoCangDate') <= self._endDate]
             factors.name = name
             returns[name] = factors
         return returns
 
-    def get_norm_factor_data(self):
-        factor_data = self.get_factor_data()
-        for name in self._factorNames:
-            if self._factorNormDict[name][0] == FactorNormType.IndustryAndCapNeutral:
-                pyFinAssert(('INDUSTRY' in self._factorNames and 'MV' in self._factorNames),
-                            ValueError,
-                            'Failed to neutralize because of missing industry and cap data')
-                factor_data[name] = normalize_single_factor_data(factor_data[name],
-                                                                 industries=factor_data['INDUSTRY'],
-                                                                 caps=factor_data['MV'])
-            elif self._factorNormDict[name][0] == FactorNormType.IndustryNeutral:
-                pyFinAssert(('INDUSTRY' in self._factorNames),
-                            ValueError,
-                            'Failed to neutralize because of missing industry')
-                factor_data[name] = normalize_single_factor_data(factor_data[name],
-                                                                 industries=factor_data['INDUSTRY'])
-
-        return factor_data
+    def _get_dependent_factor_names(self, name):
+        """
+        :param name: str, 因子名称
+        :return: list of str, 该因子标准化时需要用到的因子(自身, 行业, 市值)
+        """
+        norm_type = self._factorNormDict[name][0]
+        if norm_type == FactorNormType.IndustryAndCapNeutral:
+            pyFinAssert(('INDUSTRY' in self._factorNames and 'MV' in self._factorNames),
+                        ValueError,
+                        'Failed to neutralize because of missing industry and cap data')
+            return [name, 'INDUSTRY', 'MV']
+        elif norm_type == FactorNormType.IndustryNeutral:
+            pyFinAssert(('INDUSTRY' in self._factorNames),
+                        ValueError,
+                        'Failed to neutralize because of missing industry')
+            return [name, 'INDUSTRY']
+        return [name]
 
+    def _get_cache_key(self, name):
+        """
+        :param name: str, 因子名称
+        :return: str, 由生成标准化因子数据的全部参数(包括所依赖数据文件的修改时间和大小)决定的缓存key
+        """
+        sources = [(dep_name,
+                    self._factorPathDict[dep_name]['freq'],
+                    get_source_signature(self._factorPathDict[dep_name]['path']))
+                   for dep_name in self._get_dependent_factor_names(name)]
+        return FactorCache.get_key(name,
+                                   pd.Timestamp(self._startDate).strftime('%Y%m%d'),
+                                   pd.Timestamp(self._endDate).strftime('%Y%m%d'),
+                                   self._freq,
+                                   int(self._factorNormDict[name][0]),
+                                   int(self._na_handler),
+                                   self._dateFormat,
+                                   sources)
+
+    def _normalize_factor_data(self, factor_names, factor_data):
+        """
+        :param factor_names: list of str, 需要标准化的因子名称
+        :param factor_data: pd.Series, see get_factor_data, 包含标准化所需的行业/市值数据
+        :return: dict, {factor_name: pd.Series, multiindex =[tiaoCangDate, secID]}
+        相同标准化方式的因子一起处理, 每个调仓日的暴露矩阵只构建一次
+        中性化总是使用原始(未标准化)的行业/市值数据, 即使MV本身也需要标准化; 结果与因子在factor_norm_dict中的顺序无关
+        """
+        ret = {}
+        for norm_type in [FactorNormType.IndustryAndCapNeutral, FactorNormType.IndustryNeutral]:
+            names = [name for name in factor_names if self._factorNormDict[name][0] == norm_type]
+            if len(names) == 0:
+                continue
+            caps = factor_data['MV'] if norm_type == FactorNormType.IndustryAndCapNeutral else None
+            normed = normalize_multi_factor_data([factor_data[name] for name in names],
+                                                 industries=factor_data['INDUSTRY'],
+                                                 caps=caps)
+            ret.update(zip(names, normed))
+        for name in factor_names:
+            if name not in ret:
+                ret[name] = factor_data[name]
+        return ret
+
+    def get_norm_factor_data(self, refresh_cache=False):
+        """
+        :param refresh_cache: bool, optional, 是否忽略已有缓存并重新计算(计算结果仍写入缓存)
+        :return: pd.Series, index = factor names, value = pd.Series(multiindex =[tiaoCangDate, secID])
+        使用缓存时, 只有缓存中不存在的因子(及其标准化所需的行业/市值数据)会被读取和计算
+        注意: 行业/市值中性化使用原始的INDUSTRY/MV数据; 旧版本按因子顺序原地替换, 排在标准化后的MV之后的因子会用标准化后的MV做中性化
+        """
+        cached = {}
+        if self._cache is not None:
+            cache_keys = dict((name, self._get_cache_key(name)) for name in self._factorNames)
+            if not refresh_cache:
+                for name in self._factorNames:
+                    data = self._cache.load(cache_keys[name])
+                    if data is not None:
+                        cached[name] = data
+
+        missing_names = [name for name in self._factorNames if name not in cached]
+        raw_names = []
+        for name in missing_names:
+            for dep_name in self._get_dependent_factor_names(name):
+                if dep_name not in raw_names:
+                    raw_names.append(dep_name)
+        factor_data = self.get_factor_data(raw_names) if len(raw_names) > 0 else pd.Series()
+
+        norm_data = self._normalize_factor_data(missing_names, factor_data)
+        if self._cache is not None:
+            for name in missing_names:
+                self._cache.save(cache_keys[name], norm_data[name])
+        norm_data.update(cached)
+
+        returns = pd.Series()
+        for name in self._factorNames:
+            returns[name] = norm_data[name]
+        return returns
 
 if __name__ == "__main__":
     factor = FactorLoader('2015-01-05',
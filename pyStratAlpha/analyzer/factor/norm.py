@@ -51,14 +51,11 @@ def get_industry_matrix(industries, mkt_cap=None):
     :param mkt_cap: pd.Series, index = secID, value = 市值
     :return: numpy.matrix, 行业虚拟矩阵，see alphaNote
     """
-    sec_ids = industries.index.tolist()
-    nb_sec_id = len(sec_ids)
-    unique_industry = industries.unique()
-    nb_unique_industry = len(unique_industry)
-    ret = np.zeros((nb_sec_id, nb_unique_industry))
-    for i in range(len(sec_ids)):
-        col_index = np.where(unique_industry == industries[i])[0]
-        ret[i][col_index] = 1.0
+    codes, unique_industry = pd.factorize(industries.values)
+    ret = np.zeros((len(industries), len(unique_industry)))
+    # 行业缺失的股票对应全零行
+    has_industry = codes >= 0
+    ret[np.flatnonzero(has_industry), codes[has_industry]] = 1.0
 
     if mkt_cap is not None:
         array_cap = mkt_cap.values.reshape(mkt_cap.values.shape[0], 1)
@@ -120,27 +117,211 @@ def normalize(factors, industries=None, caps=None):
     return ret
 
 
+def _group_na_handler(values, group_codes, handler, valid=None):
+    """
+    :param values: np.array, shape = (nb_sec, nb_factor), 因子数据
+    :param group_codes: np.array, 每行所属的组(日期)编码
+    :param handler: enum, method to handle the na values
+    :param valid: np.array of bool, optional, 与values同形状, 为False的位置(对齐时补充的行)不做填充
+    :return: np.array, 按组分别处理na值后的因子, 与factor_na_handler逐组处理的结果相同(Drop除外, Drop时na值保留, 由调用者删除)
+    """
+    if handler in [FactorNAHandler.Ignore, FactorNAHandler.Drop]:
+        return values
+    grouped = pd.DataFrame(values).groupby(group_codes)
+    if handler == FactorNAHandler.ReplaceWithMean:
+        fill = grouped.transform('mean').values
+    elif handler == FactorNAHandler.ReplaceWithMedian:
+        fill = grouped.transform('median').values
+    else:
+        raise NotImplementedError
+    is_na = np.isnan(values)
+    if valid is not None:
+        is_na &= valid
+    return np.where(is_na, fill, values)
+
+
+def _winsorize_by_group(values, group_codes, nb_std=3):
+    """
+    :return: np.array, shape = (nb_sec, nb_factor), 按组(日期)去极值后的因子, see winsorize
+    """
+    grouped = pd.DataFrame(values).groupby(group_codes)
+    median = grouped.transform('median').values
+    std = grouped.transform('std').values
+    lower = median - nb_std * std
+    upper = median + nb_std * std
+    with np.errstate(invalid='ignore'):
+        ret = np.where(values < lower, lower, values)
+        return np.where(ret > upper, upper, ret)
+
+
+def _standardize_by_group(values, group_codes):
+    """
+    :return: np.array, shape = (nb_sec, nb_factor), 按组(日期)标准化后的因子, see standardize
+    """
+    grouped = pd.DataFrame(values).groupby(group_codes)
+    return (values - grouped.transform('mean').values) / grouped.transform('std').values
+
+
+def _neutralize_on_date(industry_codes, lcap, y):
+    """
+    :param industry_codes: np.array, 当天每只股票的行业编码(从0开始连续编码)
+    :param lcap: np.array/None, 当天每只股票的对数市值
+    :param y: np.array, shape = (nb_sec, nb_factor), 当天的因子, 可以含na值
+    :return: np.array, 对行业虚拟变量(和对数市值)回归后的残差, 因子为na的位置仍为na
+    暴露矩阵只构建一次, 没有na值的因子列通过一次lstsq(多列右端项)同时求解, 含na值的因子列去掉na行后单独求解
+    """
+    x = np.zeros((len(industry_codes), industry_codes.max() + 1))
+    x[np.arange(len(industry_codes)), industry_codes] = 1.0
+    if lcap is not None:
+        x = np.hstack((x, lcap.reshape(-1, 1)))
+
+    residues = np.empty(y.shape)
+    residues.fill(np.nan)
+    is_na = np.isnan(y)
+    full_cols = np.flatnonzero(~is_na.any(axis=0))
+    if len(full_cols) > 0:
+        coef = np.linalg.lstsq(x, y[:, full_cols], rcond=None)[0]
+        residues[:, full_cols] = y[:, full_cols] - np.dot(x, coef)
+    for col in np.flatnonzero(is_na.any(axis=0)):
+        rows = ~is_na[:, col]
+        if rows.any():
+            coef = np.linalg.lstsq(x[rows], y[rows, col], rcond=None)[0]
+            residues[rows, col] = y[rows, col] - np.dot(x[rows], coef)
+    return residues
+
+
+def _neutralize_values(index, values, industries, caps=None, na_handler=FactorNAHandler.ReplaceWithMedian,
+                       valid=None):
+    """
+    :param index: pd.MultiIndex, [tiaoCangDate, secID]
+    :param values: np.array, shape = (nb_sec, nb_factor), 对齐到同一个index的多个因子
+    :param industries: pd.Series, multi index = [tiaoCangDate, secID], value = 行业名称
+    :param caps: optional, pd.Series, multi index = [tiaoCangDate, secID], value = caps value
+    :param na_handler: enum, handler for na values
+    :param valid: np.array of bool, optional, 与values同形状, 每个因子实际包含的行, 默认全部有效
+    :return: tuple, (按调仓日排序后的index, 中性化后的因子, 无法计算及无效的位置为na)
+    只对行业中性化时, 残差即为因子减去当天的行业均值; 对行业和市值中性化时, 每个调仓日按有效行分组,
+    有效行相同的因子列共用一个暴露矩阵并通过一次numpy lstsq求解
+    """
+    if valid is None:
+        valid = np.ones(values.shape, dtype=bool)
+    dates = index.get_level_values('tiaoCangDate').values
+    order = np.argsort(dates, kind='mergesort')
+    index = index[order]
+    valid = valid[order]
+    date_codes, _ = pd.factorize(dates[order])
+
+    industry = industries.reindex(index).fillna('other').values
+    y = _group_na_handler(values[order].astype(np.float64), date_codes, na_handler, valid)
+    residues = np.empty(y.shape)
+    residues.fill(np.nan)
+
+    if caps is None:
+        # 对行业虚拟变量回归的残差就是因子减去(日期, 行业)组内均值
+        group_mean = pd.DataFrame(y).groupby([date_codes, industry]).transform('mean').values
+        residues = y - group_mean
+    else:
+        lcap = np.log(caps.reindex(index).values.astype(np.float64))
+        bounds = np.searchsorted(date_codes, np.arange(date_codes.max() + 2 if len(date_codes) > 0 else 1))
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            # 当天有效行相同的因子列为一组, 市值的na值按该组的行处理, 与逐个因子计算的结果一致
+            patterns, col_group = np.unique(valid[lo:hi].T, axis=0, return_inverse=True)
+            for k, pattern in enumerate(patterns):
+                rows = lo + np.flatnonzero(pattern)
+                if len(rows) == 0:
+                    continue
+                group_lcap = _group_na_handler(lcap[rows].reshape(-1, 1), np.zeros(len(rows), dtype=int),
+                                               na_handler)[:, 0]
+                has_cap = ~np.isnan(group_lcap)
+                rows = rows[has_cap]
+                if len(rows) == 0:
+                    continue
+                cols = np.flatnonzero(col_group == k)
+                industry_codes, _ = pd.factorize(industry[rows])
+                residues[np.ix_(rows, cols)] = _neutralize_on_date(industry_codes, group_lcap[has_cap],
+                                                                   y[np.ix_(rows, cols)])
+    return index, residues
+
+
+def neutralize_batch(factors, industries, caps=None, na_handler=FactorNAHandler.ReplaceWithMedian):
+    """
+    :param factors: pd.Series, multi index = [tiaoCangDate, secID], 多个调仓日的因子
+    :param industries: pd.Series, multi index = [tiaoCangDate, secID], value = 行业名称
+    :param caps: optional, pd.Series, multi index = [tiaoCangDate, secID], value = caps value
+    :param na_handler: enum, handler for na values
+    :return: pd.Series, multi index = [tiaoCangDate, secID], 中性化后的因子
+    对所有调仓日一次性中性化, 结果与逐日调用neutralize相同(按调仓日排序)
+    """
+    pyFinWarning(factors.size == industries.size, Warning, "size of factors does not equal to that of industries")
+    if caps is not None:
+        pyFinWarning(factors.size == caps.size, Warning, "size of factors does not equal to that of caps")
+    index, residues = _neutralize_values(factors.index, factors.values.reshape(-1, 1), industries, caps, na_handler)
+    return pd.Series(residues[:, 0], index=index, name=factors.name).dropna()
+
+
+def _align_factors(factors):
+    """
+    :param factors: list of pd.Series, multi index = [tiaoCangDate, secID]
+    :return: tuple, (并集index, np.array shape = (nb_sec, nb_factor) 对齐后的因子, np.array of bool 每个因子实际包含的行)
+    """
+    index = factors[0].index
+    if all(factor.index is index or factor.index.equals(index) for factor in factors[1:]):
+        values = np.column_stack([factor.values.astype(np.float64) for factor in factors])
+        return index, values, np.ones(values.shape, dtype=bool)
+
+    index = index.append([factor.index for factor in factors[1:]]).drop_duplicates()
+    values = np.empty((len(index), len(factors)))
+    values.fill(np.nan)
+    valid = np.zeros(values.shape, dtype=bool)
+    for k, factor in enumerate(factors):
+        pos = index.get_indexer(factor.index)
+        values[pos, k] = factor.values
+        valid[pos, k] = True
+    return index, values, valid
+
+
+def normalize_multi_factor_data(factors, industries=None, caps=None):
+    """
+    :param factors: list of pd.Series, multi index = [tiaoCangDate, secID], value = factors
+    :param industries: pd.Series, multi index = [tiaoCangDate, secID], value = 行业名称
+    :param caps: optional, pd.Series, multi index = [tiaoCangDate, secID], value = caps value
+    :return: list of pd.Series, 去极值、中性化、标准化的因子, 与逐个调用normalize_single_factor_data的结果相同
+    所有因子对齐到index的并集上合并为一个矩阵处理, 并记录每个因子实际包含的行(对齐补充的行不参与计算),
+    每个调仓日有效行相同的因子通过一次矩阵求解得到残差; index有重复的因子单独处理
+    """
+    batch = [i for i, factor in enumerate(factors) if factor.index.is_unique]
+    groups = ([batch] if len(batch) > 0 else []) + [[i] for i in range(len(factors)) if i not in batch]
+
+    returns = [None] * len(factors)
+    for group in groups:
+        index, values, valid = _align_factors([factors[i] for i in group])
+        date_codes, _ = pd.factorize(index.get_level_values('tiaoCangDate').values)
+        values = _winsorize_by_group(values, date_codes)
+        values = _standardize_by_group(values, date_codes)
+        sorted_index, residues = _neutralize_values(index, values, industries, caps, valid=valid)
+        for k, i in enumerate(group):
+            ret = pd.Series(residues[:, k], index=sorted_index, name=factors[i].name)
+            factor_index = factors[i].index
+            if factor_index is not index and not factor_index.equals(index):
+                # 恢复该因子自身按调仓日稳定排序后的行顺序
+                order = np.argsort(factor_index.get_level_values('tiaoCangDate').values, kind='mergesort')
+                ret = ret.reindex(factor_index[order])
+            ret = ret.dropna()
+            ret.index.names = ['tiaoCangDate', 'secID']
+            returns[i] = ret
+    return returns
+
+
 def normalize_single_factor_data(factors, industries=None, caps=None):
     """
     :param factors: pd.Series, multi index = [tiaoCangDate, secID], value = factors
     :param industries:
     :param caps:
     :return: 去极值、中性化、标准化的因子
+    所有调仓日一次性按日期分组处理, 结果与逐日调用normalize相同
     """
-    returns = pd.Series(name=factors.name)
-    tiaocang_date = sorted(set(factors.index.get_level_values('tiaoCangDate')))
-    for date in tiaocang_date:
-        factor_to_use = get_multi_index_data(factors, 'tiaoCangDate', date)
-        industry_to_use = get_multi_index_data(industries, 'tiaoCangDate',
-                                               date) if industries is not None else None
-        cap_to_use = get_multi_index_data(caps, 'tiaoCangDate', date) if caps is not None else None
-        data_normed = normalize(factor_to_use, industry_to_use, cap_to_use)
-        returns = returns.append(data_normed)
-
-    # save in multi index format
-    index = pd.MultiIndex.from_tuples(returns.index, names=['tiaoCangDate', 'secID'])
-    returns = pd.Series(data=returns.values, index=index, name=factors.name)
-    return returns
+    return normalize_multi_factor_data([factors], industries, caps)[0]
+
 
 if __name__ == "__main__":
     index = ['000001.SZ', '000002.SZ', '000003.SZ', '000004.SZ', '000005.SZ', '000006.SZ', '000007.SZ', '000008.SZ',
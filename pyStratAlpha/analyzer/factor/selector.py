@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
 
+import numpy as np
 import pandas as pd
 from PyFin.Utilities import pyFinAssert
 
-from pyStratAlpha.analyzer.factor.cleanData import get_multi_index_data
+from pyStratAlpha.analyzer.factor.factorPanel import as_factor_series
 from pyStratAlpha.analyzer.indexComp.indexComp import IndexComp
-from pyStratAlpha.utils.misc import top
 
 
 class Selector(object):
@@ -19,7 +19,7 @@ class Selector(object):
                  nb_sec_selected_total=100,
                  ignore_zero_weight=False):
         """
-        :param sec_score: pd.Series, index = [tiaoCangDate, secID], value = score
+        :param sec_score: pd.Series/FactorPanel, index = [tiaoCangDate, secID], value = score
         :param industry: pd.Series, optional, index = [tiaoCangDate, secID], value = industry name
         :param nb_sec_selected_per_industry_min: int, optional, nb sec to be selected each industry minimum
         :param index_comp: index composition class object, optional
@@ -27,7 +27,7 @@ class Selector(object):
         :param use_industry_name: bool, optional, whether to use name instead of code in return dataframe
         :return:
         """
-        self._secScore = sec_score
+        self._secScore = as_factor_series(sec_score)
         self._secScore.sort_values(ascending=False, inplace=True)
         self._industry = industry
         self._nbSecSelectedPerIndustryMin = nb_sec_selected_per_industry_min
@@ -35,6 +35,8 @@ class Selector(object):
         self._saveSecSelected = save_sec_selected
         self._secSelectedFullInfo = None
         self._secSelected = None
+        self._secIDUniverse = None
+        self._secSelectedCodes = None
         self._tiaoCangDate = pd.to_datetime(sorted(set(self._secScore.index.get_level_values('tiaoCangDate'))))
         self._industryNeutral = True
         self._useIndustryName = use_industry_name
@@ -58,56 +60,112 @@ class Selector(object):
         pyFinAssert(isinstance(flag, bool), TypeError, "flag must be bool type variable")
         self._industryNeutral = flag
 
+    @property
+    def sec_selected_codes(self):
+        """
+        :return: dict, key = tiaoCangDate, value = np.array of int, 入选股票在sec_id_universe中的编号
+        """
+        return self._secSelectedCodes
+
+    @property
+    def sec_id_universe(self):
+        """
+        :return: np.array of str, 排好序的全部入选股票代码, 编号即为数组下标
+        """
+        return self._secIDUniverse
+
     @staticmethod
-    def _save_sec_selected_from_full_info(sec_selected_full_info):
+    def _encode_sec_selected(sec_selected_full_info):
         """
         :param sec_selected_full_info: pd.DataFrame, multi index =[tiaoCangDate, secID], value = score / industry
+        :return: tuple, (np.array of str, 排好序的股票代码, dict, key = tiaoCangDate, value = np.array of int 股票编号)
+        按调仓日一次分组, 每日内保持原有的股票顺序
+        """
+        index = sec_selected_full_info.index
+        date_codes, dates = pd.factorize(index.get_level_values('tiaoCangDate'), sort=True)
+        sec_codes, sec_ids = pd.factorize(index.get_level_values('secID'), sort=True)
+        order = np.argsort(date_codes, kind='mergesort')
+        bounds = np.searchsorted(date_codes[order], np.arange(1, len(dates)))
+        sec_codes_on_date = np.split(sec_codes[order], bounds)
+        return np.asarray(sec_ids), dict(zip(dates, sec_codes_on_date))
+
+    @staticmethod
+    def _decode_sec_selected(sec_ids, sec_selected_codes):
+        """
+        :param sec_ids: np.array of str, see _encode_sec_selected
+        :param sec_selected_codes: dict, see _encode_sec_selected
         :return: pd.Series, index = tiaoCangDate, value = list of secID selected
         """
+        dates = sorted(sec_selected_codes.keys())
+        ret = pd.Series([sec_ids[sec_selected_codes[date]].tolist() for date in dates], index=dates)
+        return ret
 
-        date_list = sec_selected_full_info.index.get_level_values('tiaoCangDate').tolist()
-        ret = pd.Series()
-        for date in date_list:
-            sliced_data = get_multi_index_data(sec_selected_full_info, 'tiaoCangDate', date)
-            sec_ids = sliced_data.index.get_level_values('secID').tolist()
-            ret[date] = sec_ids
+    @staticmethod
+    def _save_sec_selected_from_full_info(sec_selected_full_info):
+        """
+        :param sec_selected_full_info: pd.DataFrame, multi index =[tiaoCangDate, secID], value = score / industry
+        :return: pd.Series, index = tiaoCangDate, value = list of secID selected
+        """
+        return Selector._decode_sec_selected(*Selector._encode_sec_selected(sec_selected_full_info))
 
-        return ret
+    def _get_industry_weight_matrix(self, dates):
+        """
+        :param dates: list of datetime, 调仓日
+        :return: tuple, (pd.DataFrame, index = dates, col = industry, value = 行业权重(%),
+        pd.DataFrame of bool, 同形状, True = 调仓日有该行业的数据)
+        """
+        return (self._indexComp.get_industry_weight_on_dates(dates),
+                self._indexComp.get_industry_presence_on_dates(dates))
 
     def sec_selection(self):
         if self._industry is not None:
             sec_score = pd.concat([self._secScore, self._industry], join_axes=[self._secScore.index], axis=1)
         else:
-            sec_score = self._secScore
-        ret = pd.DataFrame()
-        for date in self._tiaoCangDate:
-            sec_score_on_date = get_multi_index_data(sec_score, 'tiaoCangDate', date)
-            sec_score_on_date = sec_score_on_date.copy()
-            sec_score_on_date.sort_values(by='score', ascending=False, inplace=True)
-            if self._industryNeutral:
-                pyFinAssert(self._industry is not None, ValueError, "industry information missing ")
-                sec_score_on_date[self._industry.name] = sec_score_on_date[self._industry.name].fillna('other')
-                industry_weight = self._indexComp.get_industry_weight_on_date(date)
-                for name, group in sec_score_on_date.groupby(self._industry.name):
-                    if self._ignoreZeroWeight and industry_weight[name] == 0:
-                        continue
-                    else:
-                        nb_sec_selected_per_industry = max(len(group) * 0.1,
-                                                           self._nbSecSelectedPerIndustryMin)
-                        nb_sec_selected_per_industry = int(nb_sec_selected_per_industry)
-                        if len(group) > nb_sec_selected_per_industry:
-                            single_sec_weight = industry_weight[name] / nb_sec_selected_per_industry / 100.0
-                            largest_score = top(group, column='score', n=nb_sec_selected_per_industry)
-                            largest_score['weight'] = [single_sec_weight] * nb_sec_selected_per_industry
-                        else:
-                            largest_score = group.copy()
-                            largest_score['weight'] = industry_weight[name] / len(group) / 100.0
-
-                        ret = pd.concat([ret, largest_score], axis=0)
-            else:
-                sec_score_on_date = sec_score_on_date[:self._nbSecSelectedTotal + 1]
-                sec_score_on_date['weight'] = 1.0 / self._nbSecSelectedTotal
-                ret = pd.concat([ret, sec_score_on_date], axis=0)
+            sec_score = self._secScore.to_frame()
+
+        # 所有调仓日一次性处理: 按(调仓日, [行业, ]分数从高到低)排序, 分数相同时保持原有顺序
+        date_codes, dates = pd.factorize(sec_score.index.get_level_values('tiaoCangDate'), sort=True)
+        score = sec_score['score'].values
+        pos = np.arange(len(sec_score))
+        if self._industryNeutral:
+            pyFinAssert(self._industry is not None, ValueError, "industry information missing ")
+            sec_score[self._industry.name] = sec_score[self._industry.name].fillna('other')
+            industry_codes, industries = pd.factorize(sec_score[self._industry.name], sort=True)
+            order = np.lexsort((pos, -score, industry_codes, date_codes))
+            date_codes, industry_codes = date_codes[order], industry_codes[order]
+
+            # 每个(调仓日, 行业)组内的排名和股票数
+            group_codes = date_codes * len(industries) + industry_codes
+            is_group_start = np.concatenate([[True], group_codes[1:] != group_codes[:-1]])
+            group_start = np.flatnonzero(is_group_start)
+            group_size = np.diff(np.append(group_start, len(group_codes)))
+            group_id = np.cumsum(is_group_start) - 1
+            rank_in_group = np.arange(len(group_codes)) - group_start[group_id]
+            nb_sec_in_group = group_size[group_id]
+
+            # 每组选取max(0.1 * 组内股票数, nb_sec_selected_per_industry_min)只股票, 行业权重在组内平均分配
+            industry_weight, is_present = self._get_industry_weight_matrix(dates)
+            industry_pos = industry_weight.columns.get_indexer(industries)
+            missing_industries = industries[industry_pos < 0].tolist()
+            if len(missing_industries) > 0:
+                raise KeyError(missing_industries[0])
+            weight_on_group = industry_weight.values[date_codes, industry_pos[industry_codes]]
+            # 行业在调仓日没有数据; 有数据但权重为NaN的行业照常入选, 权重为NaN
+            is_missing = ~is_present.values[date_codes, industry_pos[industry_codes]]
+            if is_missing.any():
+                raise KeyError(industries[industry_codes[np.argmax(is_missing)]])
+            nb_sec_selected = np.maximum(nb_sec_in_group * 0.1, self._nbSecSelectedPerIndustryMin).astype(int)
+            is_selected = rank_in_group < nb_sec_selected
+            if self._ignoreZeroWeight:
+                is_selected &= (weight_on_group != 0)
+            weight = weight_on_group / np.minimum(nb_sec_in_group, nb_sec_selected) / 100.0
+            ret = sec_score.iloc[order[is_selected]].assign(weight=weight[is_selected])
+        else:
+            order = np.lexsort((pos, -score, date_codes))
+            date_codes = date_codes[order]
+            rank_in_date = np.arange(len(order)) - np.searchsorted(date_codes, date_codes, side='left')
+            ret = sec_score.iloc[order[rank_in_date < self._nbSecSelectedTotal + 1]]
+            ret = ret.assign(weight=1.0 / self._nbSecSelectedTotal)
 
         if self._useIndustryName:
             industry_name = IndexComp.map_industry_code_to_name(ret[self._industry.name])
@@ -115,7 +173,8 @@ class Selector(object):
             ret = pd.concat([ret, industry_name], join_axes=[ret.index], axis=1)
 
         self._secSelectedFullInfo = ret
-        self._secSelected = self._save_sec_selected_from_full_info(ret)
+        self._secIDUniverse, self._secSelectedCodes = self._encode_sec_selected(ret)
+        self._secSelected = self._decode_sec_selected(self._secIDUniverse, self._secSelectedCodes)
         if self._saveSecSelected:
             self._secSelectedFullInfo.to_csv('sec_selected.csv', date_format='%Y-%m-%d', encoding='gbk')
         return
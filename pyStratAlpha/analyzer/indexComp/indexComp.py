@@ -1,24 +1,83 @@
 # -*- coding: utf-8 -*-
 
+import numpy as np
+import pandas as pd
+
 from pyStratAlpha.analyzer.factor import get_multi_index_data
+from pyStratAlpha.analyzer.factor.factorPanel import as_factor_series
 
 
 class IndexComp(object):
     def __init__(self, industry_weight):
-        self._industryWeight = industry_weight
+        """
+        :param industry_weight: pd.Series/FactorPanel, index = [tiaoCangDate, secID], value = 行业权重(%)
+        :return:
+        """
+        self._industryWeight = as_factor_series(industry_weight)
+        # 构造时一次性转为 调仓日 x 行业 的矩阵, 并预先计算剩余权重'other'列
+        # 行业按原始数据中出现的顺序排列, 使每日权重按原顺序求和
+        industries = pd.unique(self._industryWeight.index.get_level_values('secID'))
+        weight = self._industryWeight.unstack('secID')[industries]
+        weight['other'] = np.maximum(100 - np.nansum(weight.values, axis=1), 0)
+        self._industryWeightMatrix = weight
+        # 调仓日是否有该行业的数据, 用于区分缺失的行业和权重为NaN的行业
+        is_present = pd.Series(True, index=self._industryWeight.index).unstack('secID')[industries].notnull()
+        is_present['other'] = True
+        self._industryPresence = is_present
+
+    @property
+    def industry_weight_matrix(self):
+        """
+        :return: pd.DataFrame, index = tiaoCangDate, col = industry code + 'other', value = 行业权重(%)
+        """
+        return self._industryWeightMatrix
 
     def get_industry_weight_on_date(self, date):
-        data = get_multi_index_data(self._industryWeight, 'tiaoCangDate', date)
-        data = data.reset_index().set_index('secID')
-        data = data.drop(['tiaoCangDate'], axis=1)
-        data.loc['other'] = max(100 - data[self._industryWeight.name].sum(), 0)
-        ret = data[self._industryWeight.name].to_dict()
+        """
+        :param date: datetime, 调仓日
+        :return: dict, key = industry code + 'other', value = 行业权重(%)
+        只包含当日有数据的行业, 数据中权重为NaN的行业保留NaN
+        """
+        if date not in self._industryWeightMatrix.index:
+            return {'other': 100.0}
+        weight = self._industryWeightMatrix.loc[date]
+        return weight[self._industryPresence.loc[date].values].to_dict()
+
+    def get_industry_weight_on_dates(self, dates):
+        """
+        :param dates: list of datetime, 调仓日
+        :return: pd.DataFrame, index = dates, col = industry code + 'other', value = 行业权重(%)
+        没有数据的调仓日行业权重为NaN, 'other'为100
+        """
+        ret = self._industryWeightMatrix.reindex(pd.to_datetime(dates))
+        ret['other'] = ret['other'].fillna(100.0)
+        return ret
+
+    def get_industry_presence_on_dates(self, dates):
+        """
+        :param dates: list of datetime, 调仓日
+        :return: pd.DataFrame of bool, index = dates, col = industry code + 'other', True = 调仓日有该行业的数据
+        与get_industry_weight_on_dates同形状, 用于区分缺失的行业和权重为NaN的行业, 'other'总是存在
+        """
+        ret = self._industryPresence.reindex(pd.to_datetime(dates)).fillna(False).astype(bool)
+        ret['other'] = True
         return ret
 
+    def get_industry_weight_series(self, industry_name):
+        """
+        :param industry_name: str, industry code or name
+        :return: pd.Series, index = tiaoCangDate, value = 该行业各调仓日的权重(%)
+        """
+        return self._industryWeightMatrix[self._get_industry_code(industry_name)]
+
     def get_industry_weight_on_name(self, industry_name):
-        if not industry_name.endswith('SI'):
-            industry_name = _industryDict.keys()[_industryDict.values().index(industry_name)]
-        return get_multi_index_data(self._industryWeight, 'secID', industry_name)
+        return get_multi_index_data(self._industryWeight, 'secID', self._get_industry_code(industry_name))
+
+    @staticmethod
+    def _get_industry_code(industry_name):
+        if industry_name.endswith('SI') or industry_name == 'other':
+            return industry_name
+        return _industryNameToCode[industry_name]
 
     @classmethod
     def map_industry_code_to_name(cls, industry):
@@ -74,3 +133,6 @@ _industryDict = {
     '801890.SI': '机械设备',
     'other': '无行业'
 }
+
+# 行业名称 -> 行业代码, 名称重复时(如'机械设备')取代码较小者
+_industryNameToCode = dict((name, code) for code, name in sorted(_industryDict.items(), reverse=True))
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 
 from pyStratAlpha.analyzer.portfolio.portfolio import Portfolio
+from pyStratAlpha.analyzer.portfolio.secFilter import calc_sec_filters
+from pyStratAlpha.analyzer.portfolio.secFilter import merge_sec_filters
 
-__all__ = ['Portfolio']
\ No newline at end of file
+__all__ = ['Portfolio',
+           'calc_sec_filters',
+           'merge_sec_filters']
\ No newline at end of file
@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 from PyFin.DateUtilities import Calendar
 from PyFin.DateUtilities import Date
 from PyFin.DateUtilities import Period
-from PyFin.api.DateUtilities import bizDatesList
+from PyFin.Utilities import pyFinAssert
 from matplotlib.pyplot import *
 from pyStratAlpha.analyzer.factor import get_multi_index_data
 from pyStratAlpha.analyzer.performance import strat_evaluation
+from pyStratAlpha.analyzer.portfolio.secFilter import calc_sec_filters
+from pyStratAlpha.analyzer.portfolio.secFilter import merge_sec_filters
 from pyStratAlpha.enums import DataSource
 from pyStratAlpha.enums import FreqType
 from pyStratAlpha.enums import ReturnType
@@ -41,6 +44,7 @@ class Portfolio(object):
         date will be filtered out
         :param data_source: enum, source to read price data
         :param benchmark_sec_id: str, benchmakr sec id used to compute alpha return
+        :param kwargs: extra_filters, dict, optional, 额外的调仓日过滤条件, see secFilter.calc_sec_filters
         :return:
         """
         self._sec_selected = sec_selected
@@ -55,17 +59,49 @@ class Portfolio(object):
         self._csv_path = kwargs.get('csv_path', None)
         self._save_perf_file = kwargs.get('save_perf_file', None)
         self._risk_free = kwargs.get('risk_free', 0.0)
+        self._extra_filters = kwargs.get('extra_filters', None)
+        self._sec_price = None
+        self._sec_filter_mask = None
+        self._target_weight = None
 
-    def _get_sec_price_between_tiaocang_date(self, tiaocang_start_date, tiaocang_end_date):
-        tiaocang_data = get_multi_index_data(self._sec_selected, 'tiaoCangDate', tiaocang_start_date)
-        sec_ids = tiaocang_data.index.get_level_values('secID').tolist()
-        date = bizDatesList('China.SSE', tiaocang_start_date, tiaocang_end_date)
-        price_data = get_sec_price(start_date=date[0],
-                                   end_date=date[-1],
+    @staticmethod
+    def _get_filter_dates(tiaocang_date):
+        """
+        :param tiaocang_date: datetime, 调仓日
+        :return: tuple, (调仓日前两个交易日, 调仓日前一个交易日)
+        """
+        sse_cal = Calendar('China.SSE')
+        tiaocang_date_prev = sse_cal.advanceDate(Date.strptime(str(tiaocang_date)[:10]), Period('-1b')).toDateTime()
+        tiaocang_date_prev2 = sse_cal.advanceDate(Date.strptime(str(tiaocang_date)[:10]), Period('-2b')).toDateTime()
+        return tiaocang_date_prev2, tiaocang_date_prev
+
+    def prefetch_sec_price(self):
+        """
+        一次性读取整个回测区间(第一个调仓日前两个交易日至end_date)内所有入选股票的价格,
+        之后各调仓期的价格和调仓日过滤所需价格均从内存中获取, 不再重复读取数据源
+        """
+        sec_ids = sorted(set(self._sec_selected.index.get_level_values('secID')))
+        start_date, _ = self._get_filter_dates(self._tiaocang_date[0])
+        price_data = get_sec_price(start_date=start_date,
+                                   end_date=self._tiaocang_date[-1],
                                    sec_ids=sec_ids,
                                    data_source=self._data_source,
                                    csv_path=self._csv_path)
-        return price_data
+        self._sec_price = price_data.sort_index()
+        self._sec_filter_mask = None
+        self._target_weight = None
+
+    def _get_sec_filter_mask(self):
+        """
+        :return: pd.DataFrame of bool, index = tradeDate, col = secID, True = 当日不可交易
+        在预取的价格数据上一次性计算所有交易日的过滤条件
+        """
+        if self._sec_filter_mask is None:
+            if self._sec_price is None:
+                self.prefetch_sec_price()
+            sec_filters = calc_sec_filters(self._sec_price, self._filter_return_on_tiaocang_date, self._extra_filters)
+            self._sec_filter_mask = merge_sec_filters(sec_filters)
+        return self._sec_filter_mask
 
     @staticmethod
     def _get_sec_price_on_date(data, date):
@@ -74,60 +110,54 @@ class Portfolio(object):
         return price
 
     def _get_weight_on_date(self, date):
-        weight = get_multi_index_data(self._sec_selected, 'tiaoCangDate', date)
-        weight = weight.reset_index().set_index('secID')
-        weight = weight.drop(['tiaoCangDate'], axis=1)
-        filters = self._filter_sec_on_tiaocang_date(date, weight.index.tolist())
-        filter_weight = self._update_weight_after_filter(weight, filters)
-        # 处理特殊情况： 某行业股票全部被剔除
-        filter_weight = filter_weight['weight'] / filter_weight['weight'].sum()
-        return filter_weight
-
-    def _filter_sec_on_tiaocang_date(self, tiaocang_date, sec_id):
-        sse_cal = Calendar('China.SSE')
-        tiaocang_date_prev = sse_cal.advanceDate(Date.strptime(str(tiaocang_date)[:10]), Period('-1b')).toDateTime()
-        tiaocang_date_prev2 = sse_cal.advanceDate(Date.strptime(str(tiaocang_date)[:10]), Period('-2b')).toDateTime()
-        price_data = get_sec_price(start_date=tiaocang_date_prev2,
-                                   end_date=tiaocang_date,
-                                   sec_ids=sec_id,
-                                   data_source=self._data_source,
-                                   csv_path=self._csv_path)
-        price_data = price_data.transpose()
-        price_data.index.name = 'secID'
-        # 去除涨幅过大可能买不到的
-        price_data['returnFilter'] = price_data[tiaocang_date] / price_data[
-            tiaocang_date_prev] > 1 + self._filter_return_on_tiaocang_date
-        # 去除有NaN的， 新股
-        price_data['ipoFilter'] = pd.isnull(
-            price_data[tiaocang_date] * price_data[tiaocang_date_prev] * price_data[tiaocang_date_prev2])
-        # 去除停牌的，此处判断标准就是连续三天收盘价格一样
-        price_data['tingpaiFilter'] = ((price_data[tiaocang_date] == price_data[tiaocang_date_prev]) & (
-            price_data[tiaocang_date_prev] == price_data[tiaocang_date_prev2]))
-
-        price_data['filters'] = 1 - (1 - price_data['returnFilter']) * (1 - price_data['ipoFilter']) * (
-            1 - price_data['tingpaiFilter'])
-
-        return price_data['filters']
-
-    def _update_weight_after_filter(self, weight, filters):
-        filter_weight = pd.concat([weight, filters], join_axes=[weight.index], axis=1)
-        ret = pd.DataFrame()
-        for name, group in filter_weight.groupby(self._sec_selected.columns[1]):
-            group = group.copy()
-            total_weight = group['weight'].sum()
-            total_sec = group['weight'].count()
-            nb_sec_filtered = group['filters'].sum()
-            if nb_sec_filtered == 0:
-                ret = pd.concat([ret, group], axis=0)
-                continue
-            else:
-                adj_weight = total_weight / (total_sec - nb_sec_filtered) if total_sec > nb_sec_filtered else 0
-                group.loc[group['filters'] == 1, 'weight'] = 0.0
-                group.loc[group['filters'] == 0, 'weight'] = adj_weight
-                ret = pd.concat([ret, group], axis=0)
-
+        """
+        :param date: datetime, 调仓日
+        :return: pd.Series, index = secID (按行业排列), value = 调仓日的目标权重, see calc_target_weight
+        """
+        industry_name = self._sec_selected.columns[1]
+        sec_selected = get_multi_index_data(self._sec_selected, 'tiaoCangDate', date)
+        sec_selected = sec_selected[sec_selected[industry_name].notnull()]
+        industry_codes, _ = pd.factorize(sec_selected[industry_name], sort=True)
+        sec_ids = sec_selected.index.get_level_values('secID')[np.argsort(industry_codes, kind='mergesort')]
+        ret = self.calc_target_weight().loc[date].reindex(sec_ids)
+        ret.index.name = 'secID'
+        ret.name = 'weight'
         return ret
 
+    def calc_target_weight(self):
+        """
+        :return: pd.DataFrame, index = tiaoCangDate, col = secID, value = 目标权重
+        所有调仓日一次性处理: 剔除调仓日不可交易的股票, 其权重在同一调仓日同一行业内重新分配, 再按调仓日归一化
+        某调仓日的股票全部被剔除时抛出ValueError; 结果在重新预取价格前保持缓存
+        """
+        if self._target_weight is not None:
+            return self._target_weight
+        filter_mask = self._get_sec_filter_mask()
+        industry_name = self._sec_selected.columns[1]
+        sec_selected = self._sec_selected[self._sec_selected[industry_name].notnull()]
+        tiaocang_date = sec_selected.index.get_level_values('tiaoCangDate')
+
+        date_pos = filter_mask.index.get_indexer(tiaocang_date)
+        missing_dates = tiaocang_date[date_pos < 0].unique().tolist()
+        if len(missing_dates) > 0:
+            raise KeyError(missing_dates[0])
+        sec_pos = filter_mask.columns.get_indexer(sec_selected.index.get_level_values('secID'))
+        # 价格数据中没有的股票视为不可交易
+        filters = np.where(sec_pos >= 0, filter_mask.values[date_pos, sec_pos], True).astype(int)
+
+        filter_weight = pd.DataFrame({'weight': sec_selected['weight'].values, 'filters': filters},
+                                     index=sec_selected.index)
+        weight = _redistribute_weight(filter_weight, [tiaocang_date, sec_selected[industry_name].values])
+        # 处理特殊情况： 某行业股票全部被剔除
+        total_weight = weight.groupby(level='tiaoCangDate').transform('sum')
+        empty_dates = tiaocang_date[~(total_weight.values > 0)].unique().tolist()
+        pyFinAssert(len(empty_dates) == 0,
+                    ValueError,
+                    "all securities selected on tiaoCangDate {0} are filtered out".format(empty_dates))
+        weight = weight / total_weight
+        self._target_weight = weight.unstack('secID').fillna(0.0)
+        return self._target_weight
+
     @staticmethod
     def _get_quantity(init_ptf_value, weight, price):
         # concat weight and price
@@ -137,42 +167,38 @@ class Portfolio(object):
         ret['quantity'] = ret['quantity'].apply(int)
         return ret['quantity']
 
-    def _calc_ptf_value_between_tiaocang_date(self, init_ptf_value, tiaocang_start_date, tiaocang_end_date):
-        # get price date table between tiaoCangDate
-        price_data = self._get_sec_price_between_tiaocang_date(tiaocang_start_date, tiaocang_end_date)
-
-        # get price table at tiaoCangDate
-        price = self._get_sec_price_on_date(price_data, tiaocang_start_date)
-
-        # get quantity series at tiaoCangDate
-        weight = self._get_weight_on_date(tiaocang_start_date)
-        # weight.to_csv('weight.csv', encoding='gbk')
-        quantity = self._get_quantity(init_ptf_value, weight, price)
-
-        # loop over all trade dates to calc ptf value
-        trade_date_list = price_data.index.get_level_values('tradeDate').tolist()
-        ret = pd.Series(index=trade_date_list)
-        ret.loc[trade_date_list[0]] = init_ptf_value
-        for date in trade_date_list[1:]:
-            price = self._get_sec_price_on_date(price_data, date)
-            ret[date] = np.sum(quantity * price)
-
-        return ret
-
     def calc_ptf_value_curve(self):
-        ret = pd.Series()
-        for i in range(len(self._tiaocang_date) - 1):
-            tiaocang_start_date = self._tiaocang_date[i]
-            tiaocang_end_date = self._tiaocang_date[i + 1]
-            init_ptf_value = self._initial_capital if i == 0 else ret.values[-1]
-            ptf_curve = self._calc_ptf_value_between_tiaocang_date(init_ptf_value, tiaocang_start_date,
-                                                                   tiaocang_end_date)
-            ret = pd.concat([ret, ptf_curve], axis=0)
-
-        # normalize
-        ret = ret.drop_duplicates()
-        ret = ret / ret[0]
-        ret.index = pd.to_datetime(ret.index)
+        """
+        :return: pd.Series, index = trade date, value = 归一化后的组合净值
+        调仓边界规则: 调仓日收盘按旧持仓计算净值, 并以该净值按新权重建仓, 新持仓从下一个交易日起计入净值,
+        因此每个交易日只对应一个净值
+        """
+        if self._sec_price is None:
+            self.prefetch_sec_price()
+        price_data = self._sec_price.loc[self._tiaocang_date[0]:self._tiaocang_date[-1]]
+        price = price_data.values
+        trade_date = price_data.index
+        tiaocang_pos = np.array([trade_date.get_loc(date) for date in self._tiaocang_date[:-1]])
+
+        target_weight = self.calc_target_weight()
+
+        # 逐调仓日计算持仓数量, 仅依赖调仓日当天的组合净值
+        quantity = np.zeros((len(tiaocang_pos), price.shape[1]))
+        ptf_value = self._initial_capital
+        for i, pos in enumerate(tiaocang_pos):
+            if i > 0:
+                ptf_value = np.nansum(quantity[i - 1] * price[pos])
+            weight = target_weight.loc[trade_date[pos]].rename('weight')
+            price_on_date = self._get_sec_price_on_date(price_data, trade_date[pos])
+            sec_quantity = self._get_quantity(ptf_value, weight, price_on_date)
+            quantity[i] = sec_quantity.reindex(price_data.columns).fillna(0).values
+
+        # 持仓矩阵(交易日 x 股票): 每个交易日使用此前最近一次调仓的持仓
+        period = np.maximum(np.searchsorted(tiaocang_pos, np.arange(len(trade_date)), side='left') - 1, 0)
+        ret = np.nansum(quantity[period] * price, axis=1)
+        ret[:tiaocang_pos[0] + 1] = self._initial_capital
+
+        ret = pd.Series(ret / self._initial_capital, index=trade_date)
         return ret
 
     def evaluate_ptf_return(self):
@@ -191,3 +217,23 @@ class Portfolio(object):
                          risk_free=self._risk_free)
 
         return
+
+
+def _redistribute_weight(filter_weight, by):
+    """
+    :param filter_weight: pd.DataFrame, col = [weight, filters]
+    :param by: groupby keys, 如行业或[调仓日, 行业]
+    :return: pd.Series, 组内有股票被剔除(filters = 1)时, 被剔除股票权重为0, 其余股票平分组内总权重; 否则权重不变
+    """
+    grouped = filter_weight.groupby(by)
+    total_weight = grouped['weight'].transform('sum').values
+    total_sec = grouped['weight'].transform('count').values
+    nb_sec_filtered = grouped['filters'].transform('sum').values
+    nb_sec_left = total_sec - nb_sec_filtered
+    adj_weight = np.where(nb_sec_left > 0, total_weight / np.where(nb_sec_left > 0, nb_sec_left, 1), 0.0)
+
+    weight = filter_weight['weight'].values
+    filters = filter_weight['filters'].values
+    ret = np.where(filters == 1, 0.0, np.where(filters == 0, adj_weight, weight))
+    ret = np.where(nb_sec_filtered == 0, weight, ret)
+    return pd.Series(ret, index=filter_weight.index, name='weight')
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+
+
+def get_return_filter(price, threshold):
+    """
+    :param price: pd.DataFrame, index = tradeDate, col = secID, value = price
+    :param threshold: float, 当日涨幅超过该值的股票可能买不到, 需要剔除
+    :return: pd.DataFrame of bool, index = tradeDate, col = secID, True = 不可交易
+    """
+    return price / price.shift(1) > 1 + threshold
+
+
+def get_ipo_filter(price):
+    """
+    :param price: pd.DataFrame, index = tradeDate, col = secID, value = price
+    :return: pd.DataFrame of bool, 最近三个交易日内价格有NaN的(新股)为True
+    """
+    return pd.isnull(price * price.shift(1) * price.shift(2))
+
+
+def get_tingpai_filter(price):
+    """
+    :param price: pd.DataFrame, index = tradeDate, col = secID, value = price
+    :return: pd.DataFrame of bool, 连续三个交易日收盘价格一样的(停牌)为True
+    """
+    price_prev = price.shift(1)
+    return (price == price_prev) & (price_prev == price.shift(2))
+
+
+def calc_sec_filters(price, filter_return_on_tiaocang_date=0.09, extra_filters=None):
+    """
+    :param price: pd.DataFrame, index = tradeDate, col = secID, value = price, 行须为连续的交易日
+    :param filter_return_on_tiaocang_date: float, optional, see get_return_filter
+    :param extra_filters: dict, optional, key = filter name, value = pd.DataFrame of bool (index = tradeDate,
+    col = secID) 或以price为参数返回该DataFrame的函数, 如成交量、ST标记等
+    :return: dict, key = filter name, value = pd.DataFrame of bool, 与price同形状, True = 不可交易
+    """
+    ret = {'returnFilter': get_return_filter(price, filter_return_on_tiaocang_date),
+           'ipoFilter': get_ipo_filter(price),
+           'tingpaiFilter': get_tingpai_filter(price)}
+    if extra_filters is not None:
+        for name, sec_filter in extra_filters.items():
+            mask = sec_filter(price) if callable(sec_filter) else sec_filter
+            ret[name] = mask.reindex(index=price.index, columns=price.columns).fillna(False).astype(bool)
+    return ret
+
+
+def merge_sec_filters(sec_filters):
+    """
+    :param sec_filters: dict, see calc_sec_filters
+    :return: pd.DataFrame of bool, 任一过滤条件为True即不可交易
+    """
+    ret = None
+    for mask in sec_filters.values():
+        ret = mask if ret is None else ret | mask
+    return ret
@@ -2,8 +2,18 @@
 
 from pyStratAlpha.maths.matrix import eig_val_pct
 from pyStratAlpha.maths.matrix import pca_decomp
+from pyStratAlpha.maths.stats import ks_2samp_2d
+from pyStratAlpha.maths.stats import levene_2d
+from pyStratAlpha.maths.stats import pearson_corr
 from pyStratAlpha.maths.stats import running_sum
+from pyStratAlpha.maths.stats import spearman_corr
+from pyStratAlpha.maths.stats import ttest_ind_2d
 
 __all__ = ['eig_val_pct',
            'pca_decomp',
-           'running_sum']
\ No newline at end of file
+           'ks_2samp_2d',
+           'levene_2d',
+           'pearson_corr',
+           'running_sum',
+           'spearman_corr',
+           'ttest_ind_2d']
\ No newline at end of file
@@ -2,6 +2,11 @@
 
 import itertools
 
+import numpy as np
+import pandas as pd
+import scipy.stats as st
+from PyFin.Utilities import pyFinAssert
+
 
 def running_sum(s, n):
     """
@@ -25,5 +30,189 @@ def running_sum(s, n):
         rs += hi() - lo()
 
 
+def _get_group_codes(groups, nb_obs):
+    """
+    :param groups: array-like/list of array-like/None, 分组标签, 多个标签时按标签组合分组
+    :param nb_obs: int, 样本数
+    :return: tuple, (np.array, 每个样本所在组的编号, pd.Index, 按编号排列的组标签)
+    """
+    if groups is None:
+        return np.zeros(nb_obs, dtype=np.int64), pd.Index([0])
+    if not isinstance(groups, list):
+        groups = [groups]
+    keys = pd.DataFrame(dict((i, np.asarray(key)) for i, key in enumerate(groups)), columns=range(len(groups)))
+    grouped = keys.groupby(list(range(len(groups))), sort=True)
+    return grouped.ngroup().values, grouped.size().index.set_names([None] * len(groups))
+
+
+def _group_sum(values, codes, nb_group):
+    """
+    :param values: np.array, shape = (n_obs, k)
+    :param codes: np.array, 组编号
+    :param nb_group: int, 组数
+    :return: np.array, shape = (nb_group, k), 每组各列之和
+    """
+    return np.column_stack([np.bincount(codes, weights=values[:, j], minlength=nb_group)
+                            for j in range(values.shape[1])])
+
+
+def _check_corr_input(x, y, nan_policy):
+    pyFinAssert(nan_policy in ('propagate', 'omit', 'raise'),
+                ValueError,
+                "nan_policy must be one of 'propagate', 'omit' and 'raise'")
+    x = np.asarray(x, dtype=np.float64)
+    x = x.reshape(-1, 1) if x.ndim == 1 else x
+    y = np.asarray(y, dtype=np.float64)
+    y = y.reshape(-1, 1) if y.ndim == 1 else y
+    pyFinAssert(len(x) == len(y) and y.shape[1] in (1, x.shape[1]),
+                ValueError,
+                "shape of x {0} does not match that of y {1}".format(x.shape, y.shape))
+    if nan_policy == 'raise':
+        pyFinAssert(not (np.isnan(x).any() or np.isnan(y).any()), ValueError, "input contains nan")
+    return x, y
+
+
+def _get_columns(x, columns):
+    if columns is not None:
+        return list(columns)
+    if isinstance(x, pd.DataFrame):
+        return x.columns.tolist()
+    return list(range(np.shape(x)[1])) if np.ndim(x) == 2 else [0]
+
+
+def _format_corr(corr, labels, columns, groups):
+    if groups is None:
+        return pd.Series(corr[0], index=columns)
+    return pd.DataFrame(corr, index=labels, columns=columns)
+
+
+def _pearson_corr(x, y, codes, nb_group, nan_policy):
+    """
+    :return: np.array, shape = (nb_group, k), 组内x各列与y的pearson相关系数
+    propagate: 组内x或y含有na时为na(与scipy.stats相同); omit: 每列只使用x和y均不为na的样本
+    """
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    count = _group_sum(valid.astype(np.float64), codes, nb_group)
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = _group_sum(x, codes, nb_group) / count
+        mean_y = _group_sum(y, codes, nb_group) / count
+        # 减去组内均值后再求和, 避免大数相减的精度损失
+        x = np.where(valid, x - mean_x[codes], 0.0)
+        y = np.where(valid, y - mean_y[codes], 0.0)
+        corr = _group_sum(x * y, codes, nb_group) / np.sqrt(_group_sum(x ** 2, codes, nb_group) *
+                                                            _group_sum(y ** 2, codes, nb_group))
+    corr[count < 2] = np.nan
+    if nan_policy == 'propagate':
+        group_size = np.bincount(codes, minlength=nb_group)[:, np.newaxis]
+        corr[count < group_size] = np.nan
+    return corr
+
+
+def pearson_corr(x, y, groups=None, nan_policy='propagate', columns=None):
+    """
+    :param x: np.array/pd.DataFrame, shape = (n_obs, k), 例如k个因子
+    :param y: np.array/pd.Series, shape = (n_obs,), 例如收益
+    :param groups: array-like/list of array-like, optional, 分组标签(例如调仓日), 多个标签时按标签组合分组
+    :param nan_policy: str, optional, propagate(组内含有na时为na)/omit(逐列剔除含na的样本对)/raise
+    :param columns: list, optional, 结果的列名, 默认为x的列名
+    :return: pd.DataFrame, index = 组标签, col = x的各列, 组内pearson相关系数; groups为None时返回pd.Series
+    所有组和所有列一次性计算
+    """
+    columns = _get_columns(x, columns)
+    x, y = _check_corr_input(x, y, nan_policy)
+    codes, labels = _get_group_codes(groups, len(x))
+    corr = _pearson_corr(x, y, codes, len(labels), nan_policy)
+    return _format_corr(corr, labels, columns, groups)
+
+
+def spearman_corr(x, y, groups=None, nan_policy='propagate', columns=None):
+    """
+    :param x: np.array/pd.DataFrame, shape = (n_obs, k), 例如k个因子
+    :param y: np.array/pd.Series, shape = (n_obs,), 例如收益
+    :param groups: array-like/list of array-like, optional, 分组标签(例如调仓日), 多个标签时按标签组合分组
+    :param nan_policy: str, optional, propagate(组内含有na时为na, 与scipy.stats.spearmanr相同)/omit(逐列剔除含na的样本对)/raise
+    :param columns: list, optional, 结果的列名, 默认为x的列名
+    :return: pd.DataFrame, index = 组标签, col = x的各列, 组内spearman秩相关系数(rank ic); groups为None时返回pd.Series
+    spearman相关系数即组内排序值(相同值取平均排序)的pearson相关系数, 所有组和所有列一次性计算
+    """
+    columns = _get_columns(x, columns)
+    x, y = _check_corr_input(x, y, nan_policy)
+    codes, labels = _get_group_codes(groups, len(x))
+    if nan_policy == 'omit':
+        # 每列只对x和y均不为na的样本排序
+        valid = ~np.isnan(x) & ~np.isnan(y)
+        if not valid.all():
+            x = np.where(valid, x, np.nan)
+            y = np.where(valid, y, np.nan)
+    rank_x = pd.DataFrame(x).groupby(codes).rank(method='average').values
+    rank_y = pd.DataFrame(y).groupby(codes).rank(method='average').values
+    corr = _pearson_corr(rank_x, rank_y, codes, len(labels), nan_policy)
+    return _format_corr(corr, labels, columns, groups)
+
+
+def ttest_ind_2d(a, b, equal_var=False):
+    """
+    :param a: np.array, shape = (n1, k), 第一组样本, 每列为一个变量
+    :param b: np.array, shape = (n2, k), 第二组样本
+    :param equal_var: bool, optional, 是否假设两组样本方差相同, 默认为Welch t检验
+    :return: tuple of np.array, (t, p_value), shape = (k,)
+    对k个变量同时做两独立样本均值的t检验, 原假设为两个独立样本的均值相同
+    """
+    t, p = st.ttest_ind(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64), axis=0,
+                        equal_var=equal_var)
+    return np.atleast_1d(t), np.atleast_1d(p)
+
+
+def levene_2d(a, b):
+    """
+    :param a: np.array, shape = (n1, k), 第一组样本, 每列为一个变量
+    :param b: np.array, shape = (n2, k), 第二组样本
+    :return: tuple of np.array, (w, p_value), shape = (k,)
+    对k个变量同时做方差齐性的levene检验(以中位数为中心, 与scipy.stats.levene的默认方式相同), 原假设为两个独立样本的方差相同
+    """
+    samples = [np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)]
+    nb_group = len(samples)
+    ni = np.array([len(sample) for sample in samples], dtype=np.float64)
+    n_tot = ni.sum()
+
+    zij = [np.abs(sample - np.median(sample, axis=0)) for sample in samples]
+    zbari = np.array([np.mean(z, axis=0) for z in zij])
+    zbar = np.sum(zbari * ni[:, np.newaxis], axis=0) / n_tot
+    numer = (n_tot - nb_group) * np.sum(ni[:, np.newaxis] * (zbari - zbar) ** 2, axis=0)
+    denom = (nb_group - 1.0) * sum(np.sum((z - zbari[i]) ** 2, axis=0) for i, z in enumerate(zij))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = numer / denom
+    return w, st.f.sf(w, nb_group - 1, n_tot - nb_group)
+
+
+def ks_2samp_2d(a, b):
+    """
+    :param a: np.array, shape = (n1, k), 第一组样本, 每列为一个变量
+    :param b: np.array, shape = (n2, k), 第二组样本
+    :return: tuple of np.array, (ks, p_value), shape = (k,)
+    对k个变量同时做两样本K-S检验, 原假设为两个独立样本来自同一个连续分布, 结果与scipy.stats.ks_2samp相同
+    两组样本合并后每列排序一次, 两组的经验分布函数由累积计数得到, 相同的取值只在最后一个位置比较
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    n1, n2 = a.shape[0], b.shape[0]
+    data_all = np.concatenate([a, b])
+    order = np.argsort(data_all, axis=0, kind='mergesort')
+    sorted_data = np.take_along_axis(data_all, order, axis=0)
+    cdf1 = np.cumsum(order < n1, axis=0) / float(n1)
+    cdf2 = np.cumsum(order >= n1, axis=0) / float(n2)
+
+    # 每段相同取值(包括na)的最后一个位置
+    is_nan = np.isnan(sorted_data)
+    run_end = np.ones(sorted_data.shape, dtype=bool)
+    run_end[:-1] = (sorted_data[:-1] != sorted_data[1:]) & ~(is_nan[:-1] & is_nan[1:])
+    d = np.max(np.where(run_end, np.abs(cdf1 - cdf2), 0.0), axis=0)
+
+    en = np.sqrt(n1 * n2 / float(n1 + n2))
+    return d, st.kstwobign.sf((en + 0.12 + 0.11 / en) * d)
+
+
 if __name__ == "__main__":
     print list(running_sum([1, 2, 3, 4], 3))
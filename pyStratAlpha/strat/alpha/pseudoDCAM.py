@@ -18,13 +18,11 @@ from pyStratAlpha.enums import FactorWeightType
 from pyStratAlpha.enums import FreqType
 from pyStratAlpha.enums import FactorNAHandler
 from pyStratAlpha.utils import time_counter
-from pyStratAlpha.utils import pickle_dump_data
-from pyStratAlpha.utils import pickle_load_data
 
 _sec_selected_path = 'sec_selected.csv'
 _sec_score_path = 'sec_score.csv'
 _sec_price_path = 'priceData.csv'
-_factor_pkl_path = 'factor.pkl'
+_factor_cache_path = 'factor_cache'
 
 
 def load_sec_score(path):
@@ -59,6 +57,7 @@ def dcam_strat_main(factor_loader_params,
     factor_weight_type = analyzer_params.get('factor_weight_type', FactorWeightType.ICWeight)
     tiaocang_date_window_size = analyzer_params.get('tiaocang_date_window_size', 12)
     save_sec_score = analyzer_params.get('save_sec_score', True)
+    n_jobs = analyzer_params.get('n_jobs', 1)
 
     # selector params
     save_sec_selected = selector_params.get('save_sec_selected', True)
@@ -83,12 +82,9 @@ def dcam_strat_main(factor_loader_params,
     factor = FactorLoader(start_date=start_date,
                           end_date=end_date,
                           factor_norm_dict=factor_norm_dict,
-                          na_handler=na_handler)
-    if update_factor:
-        factor_data = factor.get_norm_factor_data()
-        pickle_dump_data(factor_data, _factor_pkl_path)
-    else:
-        factor_data = pickle_load_data(_factor_pkl_path)
+                          na_handler=na_handler,
+                          cache_path=_factor_cache_path)
+    factor_data = factor.get_norm_factor_data(refresh_cache=update_factor)
 
     if update_sec_score:
         layer_factor = [factor_data[name] for name in factor_norm_dict.keys() if
@@ -104,7 +100,8 @@ def dcam_strat_main(factor_loader_params,
                                 tiaocang_date_window_size=tiaocang_date_window_size,
                                 save_sec_score=save_sec_score,
                                 factor_weight_type=factor_weight_type,
-                                alpha_factor_sign=alpha_factor_sign)
+                                alpha_factor_sign=alpha_factor_sign,
+                                n_jobs=n_jobs)
 
         sec_score = analyzer.calc_sec_score()
     else:
@@ -2,12 +2,20 @@
 
 from pyStratAlpha.tests.analyzer.factor.testCleanData import TestCleanData
 from pyStratAlpha.tests.analyzer.factor.testDynamicContext import TestDynamicContext
+from pyStratAlpha.tests.analyzer.factor.testFactorCache import TestFactorCache
+from pyStratAlpha.tests.analyzer.factor.testFactorPanel import TestFactorPanel
+from pyStratAlpha.tests.analyzer.factor.testFactorStore import TestFactorStore
 from pyStratAlpha.tests.analyzer.factor.testLoadData import TestLoadData
 from pyStratAlpha.tests.analyzer.factor.testNorm import TestNorm
 from pyStratAlpha.tests.analyzer.factor.testSelector import TestSelector
+from pyStratAlpha.tests.analyzer.factor.testSelector import TestSelectorSynthetic
 
 __all__ = ['TestCleanData',
            'TestNorm',
            'TestDynamicContext',
+           'TestFactorCache',
+           'TestFactorPanel',
+           'TestFactorStore',
            'TestLoadData',
-           'TestSelector']
+           'TestSelector',
+           'TestSelectorSynthetic']
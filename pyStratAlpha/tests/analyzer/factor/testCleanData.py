@@ -1,12 +1,19 @@
 # -*- coding: utf-8 -*-
+import os
 import unittest
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 
 from pyStratAlpha.analyzer.factor.cleanData import adjust_factor_date
 from pyStratAlpha.analyzer.factor.cleanData import get_multi_index_data
 from pyStratAlpha.analyzer.factor.cleanData import get_report_date
+from pyStratAlpha.analyzer.factor.cleanData import get_universe_multi_factor
+from pyStratAlpha.analyzer.factor.cleanData import get_universe_single_factor
+from pyStratAlpha.enums import FactorNAHandler
+from pyStratAlpha.utils import date_utils
+from pyStratAlpha.utils import unzip_csv_folder
 
 
 class TestCleanData(unittest.TestCase):
@@ -143,6 +150,38 @@ class TestCleanData(unittest.TestCase):
                                                              names=['tiaoCangDate', 'secID']))
         pd.util.testing.assert_series_equal(calculated, expected)
 
+    def testAdjustFactorDateMultiReportDate(self):
+        # 多个报告日、乱序数据, 结果应与逐调仓日筛选的实现完全一致; DataFrame输入读取'factor'列
+        np.random.seed(0)
+        report_dates = [datetime(2014, 9, 30), datetime(2015, 3, 31), datetime(2015, 6, 30),
+                        datetime(2015, 9, 30), datetime(2015, 12, 31)]
+        nb_rows = 60
+        trade_date = [report_dates[i] for i in np.random.randint(0, len(report_dates), nb_rows)]
+        sec_id = ['%06d.SZ' % i for i in np.random.randint(0, 20, nb_rows)]
+        factor_raw = pd.Series(np.random.randn(nb_rows), name='factor',
+                               index=pd.MultiIndex.from_arrays([trade_date, sec_id], names=['tradeDate', 'secID']))
+
+        def adjust_factor_date_by_loop(factor, start_date, end_date, freq):
+            ret = pd.Series()
+            tiaocang_date = date_utils.get_pos_adj_date(start_date, end_date, freq=freq)
+            report_date = [get_report_date(date, return_biz_day=True) for date in tiaocang_date]
+            for i in range(len(tiaocang_date)):
+                query = factor.loc[factor.index.get_level_values('tradeDate') == report_date[i]]
+                query = query.reset_index().drop('tradeDate', axis=1)
+                query['tiaoCangDate'] = [tiaocang_date[i]] * query['secID'].count()
+                ret = pd.concat([ret, query], axis=0)
+            ret = ret[['tiaoCangDate', 'secID', 'factor']]
+            index = pd.MultiIndex.from_arrays([ret['tiaoCangDate'].values, ret['secID'].values],
+                                              names=['tiaoCangDate', 'secID'])
+            return pd.Series(ret['factor'].values, index=index, name='factor')
+
+        expected = adjust_factor_date_by_loop(factor_raw, '2015-01-01', '2016-03-31', 'm')
+        self.assertTrue(len(expected) > 0)
+        calculated = adjust_factor_date(factor_raw, '2015-01-01', '2016-03-31', freq='m')
+        pd.util.testing.assert_series_equal(calculated, expected)
+        calculated = adjust_factor_date(factor_raw.to_frame(), '2015-01-01', '2016-03-31', freq='m')
+        pd.util.testing.assert_series_equal(calculated, expected)
+
     def testGetMultiIndexData(self):
         index = pd.MultiIndex.from_arrays(
             [[datetime(2015, 1, 1), datetime(2015, 1, 2), datetime(2015, 1, 2),
@@ -178,3 +217,62 @@ class TestCleanData(unittest.TestCase):
              ['B', 'C', 'C']],
             names=['date', 'category']))
         pd.util.testing.assert_series_equal(calculated, expected)
+
+    def testGetMultiIndexDataUnsorted(self):
+        # 乱序的multi index, 结果应与isin筛选完全一致(包括行的顺序)
+        np.random.seed(0)
+        dates = pd.date_range('2015-01-01', periods=10)
+        index = pd.MultiIndex.from_arrays([dates[np.random.randint(0, 10, 200)],
+                                           ['sec' + str(i) for i in np.random.randint(0, 30, 200)]],
+                                          names=['date', 'category'])
+        multi = pd.DataFrame({'a': np.random.randn(200), 'b': np.random.randn(200)}, index=index)
+
+        date_val = [dates[3], dates[7], datetime(2020, 1, 1)]
+        sec_val = ['sec1', 'sec5', 'sec29', 'none']
+        calculated = get_multi_index_data(multi, 'date', date_val, 'category', sec_val)
+        expected = multi[index.get_level_values('date').isin(date_val)]
+        expected = expected[expected.index.get_level_values('category').isin(sec_val)]
+        pd.util.testing.assert_frame_equal(calculated, expected)
+
+        calculated = get_multi_index_data(multi, 'category', 'sec2')
+        expected = multi[index.get_level_values('category').isin(['sec2'])]
+        pd.util.testing.assert_frame_equal(calculated, expected)
+
+        calculated = get_multi_index_data(multi, 'date', '2015-01-05')
+        expected = multi[index.get_level_values('date').isin(['2015-01-05'])]
+        pd.util.testing.assert_frame_equal(calculated, expected)
+
+        calculated = get_multi_index_data(multi, 'date', datetime(2020, 1, 1))
+        self.assertTrue(calculated.empty)
+
+    def testGetMultiIndexDataAfterRename(self):
+        # index的names被原地修改后, 不能继续使用修改前建立的索引
+        index = pd.MultiIndex.from_arrays([[datetime(2015, 1, 1), datetime(2015, 1, 2), datetime(2015, 1, 2)],
+                                           ['A', 'B', 'A']], names=['tradeDate', 'secID'])
+        multi = pd.Series([1.0, 2.0, 3.0], index=index)
+        calculated = get_multi_index_data(multi, 'secID', 'A')
+        self.assertEqual(calculated.tolist(), [1.0, 3.0])
+
+        multi.index.names = ['tiaoCangDate', 'secID']
+        calculated = get_multi_index_data(multi, 'tiaoCangDate', datetime(2015, 1, 2))
+        self.assertEqual(calculated.tolist(), [2.0, 3.0])
+
+        multi.index.names = ['secID', 'tiaoCangDate']
+        calculated = get_multi_index_data(multi, 'secID', datetime(2015, 1, 2))
+        self.assertEqual(calculated.tolist(), [2.0, 3.0])
+        calculated = get_multi_index_data(multi, 'tiaoCangDate', 'B')
+        self.assertEqual(calculated.tolist(), [2.0])
+
+    def testGetUniverseMultiFactor(self):
+        dir_name = os.path.dirname(os.path.abspath(__file__))
+        zip_path = os.path.join(dir_name, 'data')
+        unzip_csv_folder(zip_path)
+        path = zip_path + '//DCAM_factor_input.csv'
+        factor_names = ['MV', 'SP_TTM', 'INDUSTRY']
+
+        for na_handler in [FactorNAHandler.Drop, FactorNAHandler.Ignore]:
+            calculated = get_universe_multi_factor(path, factor_names=factor_names, na_handler=na_handler)
+            self.assertEqual(sorted(calculated.keys()), sorted(factor_names))
+            for name in factor_names:
+                expected = get_universe_single_factor(path, factor_name=name, na_handler=na_handler)
+                pd.util.testing.assert_series_equal(calculated[name], expected)
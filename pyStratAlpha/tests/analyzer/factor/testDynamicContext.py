@@ -2,14 +2,21 @@
 
 import datetime
 import os as os
+import shutil
+import tempfile
 import unittest
 
+import numpy as np
 import pandas as pd
+import scipy.stats as st
+from numpy.testing import assert_array_almost_equal
 from pandas.util.testing import assert_frame_equal
 from pandas.util.testing import assert_series_equal
 
 from pyStratAlpha.analyzer.factor import DCAMAnalyzer
 from pyStratAlpha.analyzer.factor import DCAMHelper
+from pyStratAlpha.analyzer.factor import get_multi_index_data
+from pyStratAlpha.analyzer.factor.dynamicContext import SecGroupCache
 from pyStratAlpha.analyzer.factor.dynamicContext import sigmoid_modif
 from pyStratAlpha.analyzer.factor.loadData import FactorLoader
 from pyStratAlpha.enums import DCAMFactorType
@@ -65,7 +72,9 @@ class TestDynamicContext(unittest.TestCase):
                                      tiaocang_date_window_size=3)
 
         self.data = {'alpha_factor': alpha_factor,
-                     'layer_factor': layer_factor}
+                     'layer_factor': layer_factor,
+                     'sec_return': factor_data['RETURN'],
+                     'tiaocang_date': factor_loader.get_tiaocang_date()}
 
     def testGetAnalysis(self):
         self.analyzer.na_handler = FactorNAHandler.ReplaceWithMean
@@ -98,6 +107,17 @@ class TestDynamicContext(unittest.TestCase):
                                   -0.44705772, 0.66735199, 0.51378898, 0.49389527, 0.4, 0.69740488]])
         assert_frame_equal(calculated, expected)
 
+    def testGetAnalysisAllLayerFactors(self):
+        expected = self.analyzer.get_analysis(layer_factor_name='MV')
+        calculated = self.analyzer.get_analysis()
+        self.assertEqual(calculated.index.names, ['layerFactor', 'alphaFactor'])
+        self.assertEqual(calculated.index.get_level_values('layerFactor').tolist(), ['MV'] * 3)
+        assert_array_almost_equal(calculated.values, expected.values)
+
+        # 使用缓存的rank ic
+        calculated = self.analyzer.get_analysis(layer_factor_name='MV')
+        assert_frame_equal(calculated, expected)
+
     def testGetSecGroup(self):
         factor = self.data['alpha_factor']
 
@@ -157,6 +177,74 @@ class TestDynamicContext(unittest.TestCase):
              '600087.SH'])
         self.assertEqual(calculated, expected)
 
+    def testGetSecGroupTable(self):
+        factor = self.data['alpha_factor'][1]
+        dates = [datetime.datetime(2010, 4, 30), datetime.datetime(2010, 6, 30)]
+        calculated = self.helper.get_sec_group_table(factor, dates)
+        for j, date in enumerate(dates):
+            group_low, group_high = self.helper.seperate_sec_group(factor, date)
+            table = calculated[calculated['datePos'] == j]
+            self.assertEqual(table.loc[table['group'] == 0, 'secID'].tolist(), group_low)
+            self.assertEqual(table.loc[table['group'] == 1, 'secID'].tolist(), group_high)
+
+    def testSeperateSecGroupMultiBucket(self):
+        factor = self.data['alpha_factor'][1]
+        date = datetime.datetime(2010, 6, 30)
+        group_low, group_high = self.helper.seperate_sec_group(factor, date)
+        calculated = self.helper.seperate_sec_group(factor, date, nb_group=4)
+        nb_sec = len(group_low) + len(group_high)
+        self.assertEqual([len(group) for group in calculated],
+                         [nb_sec * (i + 1) // 4 - nb_sec * i // 4 for i in range(4)])
+        self.assertEqual(sum(calculated, []), group_low + group_high)
+
+    def testCalcSecScoreMultiBucket(self):
+        analyzer = DCAMAnalyzer(layer_factor=self.data['layer_factor'],
+                                alpha_factor=self.data['alpha_factor'],
+                                sec_return=self.data['sec_return'],
+                                tiaocang_date=self.data['tiaocang_date'],
+                                tiaocang_date_window_size=3,
+                                save_sec_score=False,
+                                nb_group=3)
+        rank_ic = analyzer.calc_rank_ic()
+        self.assertEqual(len(rank_ic), 3)
+
+        # 每组的rank ic与scipy.stats.spearmanr的结果相同
+        layer_factor = self.data['layer_factor'][0]
+        dates = self.data['tiaocang_date']
+        groups = self.helper.seperate_sec_group(layer_factor, dates[1], nb_group=3)
+        for group, sec_ids in enumerate(groups):
+            factor = self.helper.get_factor_on_date(self.data['alpha_factor'], sec_ids, dates[1])
+            sec_return = self.helper.get_sec_return_on_date(self.data['sec_return'], sec_ids, dates[2])
+            data = pd.concat([sec_return, factor], axis=1)
+            data = data.fillna(data.median())
+            for name in factor.columns:
+                expected = st.spearmanr(data.iloc[:, 0], data[name])[0]
+                self.assertAlmostEqual(rank_ic[group][layer_factor.name][name][dates[1]], expected)
+
+        calculated = analyzer.calc_sec_score()
+        self.assertEqual(calculated.index.get_level_values('tiaoCangDate').unique().tolist(), dates[3:])
+        alpha_factor_rank = analyzer.calc_alpha_factor_rank_on_date(dates[-1],
+                                                                    *analyzer.calc_alpha_factor_weight_on_date(
+                                                                        dates[-1]))
+        self.assertEqual(sorted(alpha_factor_rank.index.get_level_values('low_high').unique().tolist()),
+                         ['group1', 'group2', 'group3'])
+
+    def testSecGroupCache(self):
+        layer_factor = self.data['layer_factor'][0]
+        date = datetime.datetime(2010, 7, 30)
+        cache = SecGroupCache(self.data['alpha_factor'])
+        calculated = cache.seperate_sec_group(layer_factor, date)
+        expected = self.helper.seperate_sec_group(layer_factor, date)
+        self.assertEqual(calculated, expected)
+
+        factor_low, factor_high = cache.get_alpha_factor_on_date(layer_factor, date)
+        assert_frame_equal(factor_low, self.helper.get_factor_on_date(self.data['alpha_factor'], expected[0], date))
+        assert_frame_equal(factor_high, self.helper.get_factor_on_date(self.data['alpha_factor'], expected[1], date))
+        self.assertIs(cache.get_alpha_factor_on_date(layer_factor, date)[0], factor_low)
+
+        cache.invalidate(layer_factor_name=layer_factor.name, date=date)
+        self.assertIsNot(cache.get_alpha_factor_on_date(layer_factor, date)[0], factor_low)
+
     def testGetAlphaFactor(self):
         factor = self.data['alpha_factor']
         calculated = self.helper.get_factor_on_date(factors=factor,
@@ -178,21 +266,21 @@ class TestDynamicContext(unittest.TestCase):
                                    -0.04007528113048988, -0.076173616975536276],
                              index=pd.DatetimeIndex(['2010-04-30', '2010-05-31', '2010-06-30', '2010-07-30',
                                                      '2010-08-31'],
-                                                    dtype='datetime64[ns]', freq=None), name='BP_LF', dtype='object')
+                                                    dtype='datetime64[ns]', freq=None), name='BP_LF')
         assert_series_equal(calculated[0][0]['BP_LF'], expected)
 
         expected = pd.Series(data=[-0.21294876950626468, -0.049119183761540001, -0.21454149383784427,
                                    0.024253151753783911, 0.17842633224587792],
                              index=pd.DatetimeIndex(['2010-04-30', '2010-05-31', '2010-06-30', '2010-07-30',
                                                      '2010-08-31'],
-                                                    dtype='datetime64[ns]', freq=None), name='EP2_TTM', dtype='object')
+                                                    dtype='datetime64[ns]', freq=None), name='EP2_TTM')
         assert_series_equal(calculated[0][0]['EP2_TTM'], expected)
 
         expected = pd.Series(data=[-0.027558303221317654, 0.11740894625005693, 0.029275646297033137,
                                    0.037517735172113618, 0.025129242936595752],
                              index=pd.DatetimeIndex(['2010-04-30', '2010-05-31', '2010-06-30', '2010-07-30',
                                                      '2010-08-31'],
-                                                    dtype='datetime64[ns]', freq=None), name='SP_TTM', dtype='object')
+                                                    dtype='datetime64[ns]', freq=None), name='SP_TTM')
         assert_series_equal(calculated[1][0]['SP_TTM'], expected)
 
     def testCalcLayerFactorDistance(self):
@@ -218,6 +306,14 @@ class TestDynamicContext(unittest.TestCase):
         expected = -4.890130573694068
         self.assertAlmostEqual(calculated, expected, places=6)
 
+        calculated = self.analyzer.calc_layer_factor_distance(np.array([[0.9, 0.75], [0.3, 0.05]]))
+        expected = np.array([[4.820137900379084, 4.2414181997875655], [-3.8079707797788243, -4.890130573694068]])
+        assert_array_almost_equal(calculated, expected)
+
+        self.analyzer.factor_weight_type = FactorWeightType.EqualWeight
+        calculated = self.analyzer.calc_layer_factor_distance(np.array([0.9, 0.3]))
+        assert_array_almost_equal(calculated, np.array([1.0, 1.0]))
+
     def testSigmoidModif(self):
         calculated = sigmoid_modif(0.9)
         expected = 4.820137900379084
@@ -264,6 +360,22 @@ class TestDynamicContext(unittest.TestCase):
         assert_frame_equal(alpha_weight_low, expected_low)
         assert_frame_equal(alpha_weight_high, expected_high)
 
+    def testCalcAlphaFactorICWeight(self):
+        weight_low, weight_high = self.analyzer.calc_alpha_factor_ic_weight()
+        rank_ic_low, rank_ic_high = self.analyzer.calc_rank_ic()
+        tiaocang_date = self.analyzer._tiaoCangDate
+        for pos in range(3, len(tiaocang_date)):
+            window = tiaocang_date[pos - 3:pos]
+            low = rank_ic_low['MV'].loc[window]
+            high = rank_ic_high['MV'].loc[window]
+            assert_array_almost_equal(weight_low[pos][0], (low.mean() / low.std()).values)
+            assert_array_almost_equal(weight_high[pos][0], (high.mean() / high.std()).values)
+        self.assertTrue(np.isnan(weight_low[:3]).all())
+
+        # 改变na值的处理方式后, 权重重新计算
+        self.analyzer.na_handler = FactorNAHandler.Drop
+        self.assertFalse(self.analyzer.calc_alpha_factor_ic_weight()[0] is weight_low)
+
     def testCalcAlphaFactorRankOnDate(self):
         date = datetime.datetime(2010, 9, 30)
         alpha_weight_low, alpha_weight_high = self.analyzer.calc_alpha_factor_weight_on_date(date)
@@ -295,3 +407,101 @@ class TestDynamicContext(unittest.TestCase):
         index.names = ['tiaoCangDate', 'secID']
         expected = pd.Series(data=self.calc_score_result['score2'].values, index=index, name='score')
         assert_series_equal(calculated, expected)
+
+    def testCalcSecScoreParallel(self):
+        self.analyzer._saveSecScore = False
+        expected = self.analyzer.calc_sec_score(n_jobs=1)
+        calculated = self.analyzer.calc_sec_score(n_jobs=2)
+        assert_series_equal(calculated, expected)
+
+    def testCalcSecScoreSweep(self):
+        param_grid = {'tiaocang_date_window_size': [2, 3],
+                      'na_handler': [FactorNAHandler.ReplaceWithMedian, FactorNAHandler.ReplaceWithMean]}
+        calculated = self.analyzer.calc_sec_score_sweep(param_grid)
+        self.assertEqual(calculated.columns.tolist(), ['tiaocang_date_window_size', 'factor_weight_type', 'na_handler',
+                                                       'tiaoCangDate', 'secID', 'score'])
+        for window_size in param_grid['tiaocang_date_window_size']:
+            for na_handler in param_grid['na_handler']:
+                analyzer = DCAMAnalyzer(layer_factor=self.data['layer_factor'],
+                                        alpha_factor=self.data['alpha_factor'],
+                                        sec_return=self.data['sec_return'],
+                                        tiaocang_date=self.data['tiaocang_date'],
+                                        tiaocang_date_window_size=window_size,
+                                        save_sec_score=False,
+                                        na_handler=na_handler)
+                expected = analyzer.calc_sec_score()
+                result = calculated[(calculated['tiaocang_date_window_size'] == window_size) &
+                                    (calculated['na_handler'] == na_handler)]
+                self.assertTrue((result['factor_weight_type'] == FactorWeightType.ICWeight).all())
+                result = result.set_index(['tiaoCangDate', 'secID'])['score']
+                assert_series_equal(result, expected)
+
+    def testAppendPeriod(self):
+        dates = self.data['tiaocang_date']
+        window = 3
+        nb_new_date = 2
+
+        def split_factor(factor):
+            data = get_multi_index_data(factor, 'tiaoCangDate', dates[:-nb_new_date])
+            data.name = factor.name
+            new_data = []
+            for date in dates[-nb_new_date:]:
+                new_data.append(get_multi_index_data(factor, 'tiaoCangDate', date))
+                new_data[-1].name = factor.name
+            return data, new_data
+
+        layer_factor = [split_factor(factor) for factor in self.data['layer_factor']]
+        alpha_factor = [split_factor(factor) for factor in self.data['alpha_factor']]
+        sec_return = split_factor(self.data['sec_return'])
+        analyzer = DCAMAnalyzer(layer_factor=[factor[0] for factor in layer_factor],
+                                alpha_factor=[factor[0] for factor in alpha_factor],
+                                sec_return=sec_return[0],
+                                tiaocang_date=dates[:-nb_new_date],
+                                tiaocang_date_window_size=window,
+                                save_sec_score=False)
+        analyzer.calc_alpha_factor_ic_weight()
+
+        # 保存并恢复状态后继续增加调仓日
+        state_dir = tempfile.mkdtemp()
+        state_path = os.path.join(state_dir, 'dcam_state.pkl')
+        analyzer.save_state(state_path)
+        analyzer = DCAMAnalyzer.load_state(state_path)
+        shutil.rmtree(state_dir)
+
+        expected_weight = self.analyzer.calc_alpha_factor_ic_weight()
+        expected_ic = self.analyzer.calc_rank_ic()
+        for i in range(nb_new_date):
+            date = dates[len(dates) - nb_new_date + i]
+            calculated = analyzer.append_period(date,
+                                                [factor[1][i] for factor in layer_factor],
+                                                [factor[1][i] for factor in alpha_factor],
+                                                sec_return[1][i])
+            expected = self.analyzer.calc_sec_score_on_date(date)
+            assert_series_equal(calculated, expected)
+
+            # 只保留滚动状态: 最近window + 1个调仓日及其权重, 最近window行rank ic, 最后一个调仓日的因子
+            end = len(dates) - nb_new_date + i + 1
+            self.assertEqual(analyzer._tiaoCangDate, dates[end - window - 1:end])
+            for factor in analyzer._layerFactor + analyzer._alphaFactor + [analyzer._secReturn]:
+                self.assertEqual(factor.index.get_level_values('tiaoCangDate').unique().tolist(), [date])
+            for calculated_weight, weight in zip(analyzer.calc_alpha_factor_ic_weight(), expected_weight):
+                assert_array_almost_equal(calculated_weight, weight[end - window - 1:end])
+            for calculated_ic, ic in zip(analyzer._rank_ic, expected_ic):
+                assert_frame_equal(calculated_ic['MV'], ic['MV'].iloc[end - window - 1:end - 1])
+
+        # 滚动状态下不能由历史数据重新计算
+        with self.assertRaises(ValueError):
+            analyzer.na_handler = FactorNAHandler.Drop
+        with self.assertRaises(ValueError):
+            analyzer.invalidate_cache()
+        with self.assertRaises(ValueError):
+            analyzer.calc_rank_ic()
+        with self.assertRaises(ValueError):
+            analyzer.get_analysis()
+        with self.assertRaises(ValueError):
+            analyzer.calc_sec_score()
+        with self.assertRaises(ValueError):
+            analyzer.calc_sec_score_sweep({'tiaocang_date_window_size': [2]})
+        with self.assertRaises(ValueError):
+            analyzer.calc_sec_score_on_date(dates[-2])
+        assert_series_equal(analyzer.calc_sec_score_on_date(dates[-1]), self.analyzer.calc_sec_score_on_date(dates[-1]))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+from pandas.util.testing import assert_series_equal
+
+from pyStratAlpha.analyzer.factor.factorCache import FactorCache
+from pyStratAlpha.analyzer.factor.loadData import FactorLoader
+from pyStratAlpha.enums import DCAMFactorType
+from pyStratAlpha.enums import FactorICSign
+from pyStratAlpha.enums import FactorNAHandler
+from pyStratAlpha.enums import FactorNormType
+
+
+class TestFactorCache(unittest.TestCase):
+    def setUp(self):
+        dir_name = os.path.dirname(os.path.abspath(__file__))
+        self.zip_path = os.path.join(dir_name, 'data')
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp_dir, 'cache')
+        self.factor_path_dict = {
+            'MV': {'path': self.zip_path + '//DCAM_factor_input.csv', 'freq': 'm'},
+            'EP2_TTM': {'path': self.zip_path + '//DCAM_factor_input.csv', 'freq': 'q'},
+            'INDUSTRY': {'path': self.zip_path + '//DCAM_factor_input.csv', 'freq': 'm'},
+            'RETURN': {'path': self.zip_path + '//DCAM_factor_input.csv', 'freq': 'm'}}
+        self.factor_norm_dict = {
+            'MV': [FactorNormType.Null, DCAMFactorType.layerFactor, FactorICSign.Null],
+            'EP2_TTM': [FactorNormType.IndustryNeutral, DCAMFactorType.alphaFactor, FactorICSign.Positive],
+            'INDUSTRY': [FactorNormType.Null, DCAMFactorType.industryFactor, FactorICSign.Null],
+            'RETURN': [FactorNormType.Null, DCAMFactorType.returnFactor, FactorICSign.Null]}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _get_loader(self, factor_norm_dict, cache_path=None):
+        return FactorLoader(start_date='2010-04-29',
+                            end_date='2010-10-15',
+                            factor_norm_dict=factor_norm_dict,
+                            factor_path_dict=self.factor_path_dict,
+                            zip_path=self.zip_path,
+                            na_handler=FactorNAHandler.Drop,
+                            cache_path=cache_path)
+
+    def testSaveAndLoad(self):
+        cache = FactorCache(self.cache_path)
+        key = FactorCache.get_key('MV', '20100101', 'm', int(FactorNormType.Null))
+        self.assertTrue(key not in cache)
+        self.assertEqual(cache.load(key), None)
+        data = pd.Series([1.0, 2.0], index=['a', 'b'])
+        cache.save(key, data)
+        assert_series_equal(cache.load(key), data)
+        self.assertNotEqual(key, FactorCache.get_key('MV', '20100101', 'm', int(FactorNormType.IndustryNeutral)))
+
+    def testEvict(self):
+        cache = FactorCache(self.cache_path, max_size=0)
+        cache.save('a', range(100))
+        cache.save('b', range(100))
+        # 超出容量上限时淘汰旧的缓存, 但保留刚写入的缓存
+        self.assertFalse('a' in cache)
+        self.assertTrue('b' in cache)
+
+    def testGetNormFactorDataWithCache(self):
+        expected = self._get_loader(self.factor_norm_dict).get_norm_factor_data()
+        calculated = self._get_loader(self.factor_norm_dict, self.cache_path).get_norm_factor_data()
+        self.assertEqual(len(os.listdir(self.cache_path)), len(self.factor_norm_dict))
+        cached = self._get_loader(self.factor_norm_dict, self.cache_path).get_norm_factor_data()
+        for name in self.factor_norm_dict.keys():
+            assert_series_equal(calculated[name], expected[name])
+            assert_series_equal(cached[name], expected[name])
+
+        # 只改变一个因子的标准化方式时, 其它因子的缓存仍然有效
+        loader = self._get_loader(self.factor_norm_dict, self.cache_path)
+        old_keys = dict((name, loader._get_cache_key(name)) for name in self.factor_norm_dict.keys())
+        factor_norm_dict = dict(self.factor_norm_dict)
+        factor_norm_dict['EP2_TTM'] = [FactorNormType.Null, DCAMFactorType.alphaFactor, FactorICSign.Positive]
+        loader = self._get_loader(factor_norm_dict, self.cache_path)
+        for name in self.factor_norm_dict.keys():
+            self.assertEqual(loader._get_cache_key(name) == old_keys[name], name != 'EP2_TTM')
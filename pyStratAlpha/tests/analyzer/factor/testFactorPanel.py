@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import unittest
+
+import numpy as np
+import pandas as pd
+from pandas.util.testing import assert_frame_equal
+from pandas.util.testing import assert_series_equal
+
+from pyStratAlpha.analyzer.factor.cleanData import get_multi_index_data
+from pyStratAlpha.analyzer.factor.factorPanel import FactorPanel
+
+
+class TestFactorPanel(unittest.TestCase):
+    def setUp(self):
+        index = pd.MultiIndex.from_arrays(
+            [[datetime.datetime(2015, 1, 30)] * 3 + [datetime.datetime(2015, 2, 27)] * 2,
+             ['001', '002', '003', '001', '003']],
+            names=['tiaoCangDate', 'secID'])
+        self.mv = pd.Series([1.0, 2.0, np.nan, 4.0, 5.0], index=index, name='MV')
+        index = pd.MultiIndex.from_arrays(
+            [[datetime.datetime(2015, 1, 30)] * 2 + [datetime.datetime(2015, 3, 31)],
+             ['002', '004', '004']],
+            names=['tiaoCangDate', 'secID'])
+        self.bp = pd.Series([0.1, 0.2, 0.3], index=index, name='BP_LF')
+        self.panel = FactorPanel.from_series([self.mv, self.bp])
+
+    def testFromSeries(self):
+        self.assertEqual(self.panel.shape, (3, 4, 2))
+        self.assertEqual(self.panel.factor_names, ['MV', 'BP_LF'])
+        self.assertEqual(self.panel.sec_ids.tolist(), ['001', '002', '003', '004'])
+        # 原始数据中存在的NaN值在mask中保留
+        self.assertTrue(self.panel.mask[0, 2, 0])
+        self.assertFalse(self.panel.mask[0, 3, 0])
+
+        panel = FactorPanel.from_series({'MV': self.mv, 'BP_LF': self.bp}, factor_names=['BP_LF'])
+        self.assertEqual(panel.factor_names, ['BP_LF'])
+
+        self.assertRaises(TypeError, FactorPanel.from_series, [pd.Series(['a'], index=self.mv.index[:1])])
+
+    def testToSeries(self):
+        assert_series_equal(self.panel.to_series('MV'), self.mv)
+        assert_series_equal(self.panel.to_series('BP_LF'), self.bp)
+        self.assertRaises(ValueError, self.panel.to_series)
+
+    def testGetCrossSection(self):
+        calculated = self.panel.get_cross_section('2015-01-30')
+        expected = pd.DataFrame({'MV': [1.0, 2.0, np.nan, np.nan], 'BP_LF': [np.nan, 0.1, np.nan, 0.2]},
+                                index=pd.Index(['001', '002', '003', '004'], name='secID'),
+                                columns=['MV', 'BP_LF'])
+        assert_frame_equal(calculated, expected)
+
+    def testSliceDates(self):
+        panel = self.panel.slice_dates('2015-02-01', '2015-12-31')
+        self.assertEqual(panel.dates.tolist(), [datetime.datetime(2015, 2, 27), datetime.datetime(2015, 3, 31)])
+        assert_series_equal(panel.to_series('BP_LF'), self.bp.iloc[2:])
+
+    def testGetMultiIndexData(self):
+        panel = FactorPanel.from_series([self.mv])
+        calculated = get_multi_index_data(panel, 'tiaoCangDate', datetime.datetime(2015, 1, 30), 'secID',
+                                          ['001', '003'])
+        expected = get_multi_index_data(self.mv, 'tiaoCangDate', datetime.datetime(2015, 1, 30), 'secID',
+                                        ['001', '003'])
+        assert_series_equal(calculated, expected)
+
+        calculated = get_multi_index_data(panel, 'secID', '001')
+        expected = get_multi_index_data(self.mv, 'secID', '001')
+        assert_series_equal(calculated, expected)
+
+    def testGetMultiIndexDataRowOrder(self):
+        # 面板不保留原始行顺序, 结果按日期、secID升序排列
+        mv = self.mv.iloc[[4, 1, 0, 3, 2]]
+        panel = FactorPanel.from_series([mv])
+        calculated = get_multi_index_data(panel, 'secID', ['001', '003'])
+        self.assertEqual(calculated.index.tolist(), [(datetime.datetime(2015, 1, 30), '001'),
+                                                     (datetime.datetime(2015, 1, 30), '003'),
+                                                     (datetime.datetime(2015, 2, 27), '001'),
+                                                     (datetime.datetime(2015, 2, 27), '003')])
+        expected = get_multi_index_data(mv, 'secID', ['001', '003'])
+        self.assertNotEqual(calculated.index.tolist(), expected.index.tolist())
+        assert_series_equal(calculated, expected.sort_index())
+        assert_series_equal(panel.to_series(), mv.sort_index())
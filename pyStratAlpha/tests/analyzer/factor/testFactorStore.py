@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+import pandas as pd
+from pandas.util.testing import assert_series_equal
+
+from pyStratAlpha.analyzer.factor.cleanData import get_universe_multi_factor
+from pyStratAlpha.analyzer.factor.factorStore import FactorStore
+from pyStratAlpha.analyzer.factor.factorStore import convert_csv_to_factor_store
+from pyStratAlpha.analyzer.factor.factorStore import is_factor_store_outdated
+from pyStratAlpha.analyzer.factor.loadData import FactorLoader
+from pyStratAlpha.enums import DCAMFactorType
+from pyStratAlpha.enums import FactorICSign
+from pyStratAlpha.enums import FactorNAHandler
+from pyStratAlpha.enums import FactorNormType
+from pyStratAlpha.utils import unzip_csv_folder
+
+
+class TestFactorStore(unittest.TestCase):
+    def setUp(self):
+        dir_name = os.path.dirname(os.path.abspath(__file__))
+        self.zip_path = os.path.join(dir_name, 'data')
+        unzip_csv_folder(self.zip_path)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.tmp_dir, 'DCAM_factor_input.csv')
+        shutil.copy(os.path.join(self.zip_path, 'DCAM_factor_input.csv'), self.csv_path)
+        self.store_path = convert_csv_to_factor_store(self.csv_path)
+        self.store = FactorStore(self.store_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def testConvertCsvToFactorStore(self):
+        self.assertFalse(is_factor_store_outdated(self.csv_path))
+        self.assertEqual(self.store.factor_names, ['MV', 'BP_LF', 'EP2_TTM', 'SP_TTM', 'RETURN', 'INDUSTRY'])
+
+    def testLoadFactors(self):
+        factor_names = ['MV', 'SP_TTM', 'INDUSTRY']
+        for na_handler in [FactorNAHandler.Drop, FactorNAHandler.Ignore, FactorNAHandler.ReplaceWithMean]:
+            calculated = self.store.load_factors(factor_names, na_handler=na_handler)
+            expected = get_universe_multi_factor(self.csv_path, factor_names, na_handler=na_handler)
+            for name in factor_names:
+                assert_series_equal(calculated[name], expected[name])
+
+    def testLoadFactorWithDateRange(self):
+        calculated = self.store.load_factor('RETURN', start_date='2010-03-01', end_date=datetime(2010, 5, 31))
+        expected = get_universe_multi_factor(self.csv_path, ['RETURN'])['RETURN']
+        dates = expected.index.get_level_values('tradeDate')
+        expected = expected[(dates >= datetime(2010, 3, 1)) & (dates <= datetime(2010, 5, 31))]
+        assert_series_equal(calculated, expected)
+
+    def testLoadFactorsKeepCsvOrder(self):
+        # 日期未排序, 含日期缺失、secID缺失和因子值缺失的行: 与csv读取的行顺序和行相同
+        csv_path = os.path.join(self.tmp_dir, 'unsorted.csv')
+        with open(csv_path, 'w') as f:
+            f.write('tradeDate,secID,MV,INDUSTRY\n'
+                    '20100226,000002.SZ,2.0,a\n'
+                    '20100129,000001.SZ,1.0,b\n'
+                    ',000003.SZ,3.0,a\n'
+                    '20100129,000004.SZ,4.0,\n'
+                    '20100226,,5.0,a\n'
+                    '20100129,000002.SZ,,b\n')
+        store = FactorStore(convert_csv_to_factor_store(csv_path))
+        factor_names = ['MV', 'INDUSTRY']
+        calculated = store.load_factors(factor_names, na_handler=FactorNAHandler.Drop)
+        expected = get_universe_multi_factor(csv_path, factor_names, na_handler=FactorNAHandler.Drop)
+        for name in factor_names:
+            assert_series_equal(calculated[name], expected[name])
+
+        # secID缺失时两者都无法处理
+        with self.assertRaises(ValueError):
+            store.load_factors(factor_names, na_handler=FactorNAHandler.Ignore)
+        with self.assertRaises(ValueError):
+            get_universe_multi_factor(csv_path, factor_names, na_handler=FactorNAHandler.Ignore)
+
+        # 不含secID缺失的行时, 日期缺失的行也保留
+        data = pd.read_csv(csv_path)
+        data[data['secID'].notnull()].to_csv(csv_path, index=False)
+        store = FactorStore(convert_csv_to_factor_store(csv_path))
+        calculated = store.load_factors(factor_names, na_handler=FactorNAHandler.Ignore)
+        expected = get_universe_multi_factor(csv_path, factor_names, na_handler=FactorNAHandler.Ignore)
+        for name in factor_names:
+            assert_series_equal(calculated[name], expected[name])
+            self.assertEqual(calculated[name].index.get_level_values('secID').tolist(),
+                             ['000002.SZ', '000001.SZ', '000003.SZ', '000004.SZ', '000002.SZ'])
+
+        # 给定日期范围时不返回日期缺失的行, 其余行保持csv中的顺序
+        calculated = store.load_factor('MV', start_date='2010-01-01', na_handler=FactorNAHandler.Ignore)
+        self.assertEqual(calculated.index.get_level_values('secID').tolist(),
+                         ['000002.SZ', '000001.SZ', '000004.SZ', '000002.SZ'])
+
+    def testFactorLoaderUseFactorStore(self):
+        factor_path_dict = {
+            'MV': {'path': self.csv_path, 'freq': 'm'},
+            'SP_TTM': {'path': self.csv_path, 'freq': 'q'},
+            'RETURN': {'path': self.csv_path, 'freq': 'm'}}
+        factor_norm_dict = {'MV': [FactorNormType.Null, DCAMFactorType.layerFactor, FactorICSign.Null],
+                            'SP_TTM': [FactorNormType.Null, DCAMFactorType.alphaFactor, FactorICSign.Positive],
+                            'RETURN': [FactorNormType.Null, DCAMFactorType.returnFactor, FactorICSign.Null]}
+
+        def get_factor_data(use_factor_store):
+            loader = FactorLoader(start_date='2010-04-01',
+                                  end_date='2010-10-31',
+                                  factor_norm_dict=factor_norm_dict,
+                                  factor_path_dict=factor_path_dict,
+                                  zip_path=self.zip_path,
+                                  na_handler=FactorNAHandler.Drop,
+                                  use_factor_store=use_factor_store)
+            return loader.get_factor_data()
+
+        calculated = get_factor_data(True)
+        expected = get_factor_data(False)
+        for name in factor_norm_dict.keys():
+            assert_series_equal(calculated[name], expected[name])
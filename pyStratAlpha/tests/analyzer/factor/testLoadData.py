@@ -8,6 +8,7 @@ import pandas as pd
 from pandas.util.testing import assert_series_equal
 
 from pyStratAlpha.analyzer.factor import FactorLoader
+from pyStratAlpha.analyzer.factor.norm import normalize_multi_factor_data
 from pyStratAlpha.enums import DCAMFactorType
 from pyStratAlpha.enums import FactorICSign
 from pyStratAlpha.enums import FactorNAHandler
@@ -134,3 +135,23 @@ class TestLoadData(unittest.TestCase):
         index.names = ['tiaoCangDate', 'secID']
         expected = pd.Series(data_factors['RETURN'].dropna().values, index=index, name='RETURN').dropna()
         assert_series_equal(calculated, expected)
+
+    def testGetNormFactorDataUsesRawNeutralizers(self):
+        # MV自身做行业中性化时, 其余因子仍用原始MV/INDUSTRY做中性化
+        factor_norm_dict = dict(self.factor_loader._factorNormDict)
+        factor_norm_dict['MV'] = [FactorNormType.IndustryNeutral, DCAMFactorType.layerFactor, FactorICSign.Null]
+        factor_loader = FactorLoader(start_date='2010-01-01',
+                                     end_date='2010-12-31',
+                                     factor_norm_dict=factor_norm_dict,
+                                     factor_path_dict=self.factor_loader._factorPathDict,
+                                     zip_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'),
+                                     na_handler=FactorNAHandler.Drop)
+        norm_factor = factor_loader.get_norm_factor_data()
+        raw_factor = factor_loader.get_factor_data()
+
+        expected_mv, = normalize_multi_factor_data([raw_factor['MV']], industries=raw_factor['INDUSTRY'])
+        assert_series_equal(norm_factor['MV'], expected_mv)
+        expected_sp, = normalize_multi_factor_data([raw_factor['SP_TTM']],
+                                                   industries=raw_factor['INDUSTRY'],
+                                                   caps=raw_factor['MV'])
+        assert_series_equal(norm_factor['SP_TTM'], expected_sp)
@@ -7,7 +7,10 @@ from numpy.testing import assert_array_almost_equal
 from pandas.util.testing import assert_series_equal
 from pyStratAlpha.analyzer.factor.norm import get_industry_matrix
 from pyStratAlpha.analyzer.factor.norm import neutralize
+from pyStratAlpha.analyzer.factor.norm import neutralize_batch
 from pyStratAlpha.analyzer.factor.norm import normalize
+from pyStratAlpha.analyzer.factor.norm import normalize_multi_factor_data
+from pyStratAlpha.analyzer.factor.norm import normalize_single_factor_data
 from pyStratAlpha.analyzer.factor.norm import standardize
 from pyStratAlpha.analyzer.factor.norm import winsorize
 
@@ -129,3 +132,58 @@ class TestNorm(unittest.TestCase):
                    '000008.SZ',
                    '000009.SZ', '000010.SZ'], name='factor')
         assert_series_equal(calculated, expected)
+
+    def _get_multi_date_data(self):
+        # 两个调仓日的数据, 第二天的行业和市值各有一个缺失
+        dates = [pd.Timestamp('2015-01-30')] * 10 + [pd.Timestamp('2015-02-27')] * 10
+        sec_ids = self.data['factor'].index.tolist() * 2
+        index = pd.MultiIndex.from_arrays([dates, sec_ids], names=['tiaoCangDate', 'secID'])
+        factor = pd.Series(self.data['factor'].tolist() + (self.data['factor'] * 0.5 + 1.0).tolist(), index=index,
+                           name='factor')
+        industry = pd.Series(self.data['industry1'].tolist() * 2, index=index).drop((dates[-1], sec_ids[-1]))
+        cap = pd.Series(self.data['cap'].tolist() * 2, index=index).drop((dates[-2], sec_ids[-2]))
+        return factor, industry, cap
+
+    def testNeutralizeBatch(self):
+        factor, industry, cap = self._get_multi_date_data()
+        for caps in [None, cap]:
+            calculated = neutralize_batch(factor, industry, caps)
+            expected = pd.concat([neutralize(factor.loc[[date]], industry.loc[[date]],
+                                             caps.loc[[date]] if caps is not None else None)
+                                  for date in factor.index.levels[0]])
+            assert_series_equal(calculated, expected)
+
+    def testNormalizeSingleFactorData(self):
+        factor, industry, cap = self._get_multi_date_data()
+        for caps in [None, cap]:
+            calculated = normalize_single_factor_data(factor, industry, caps)
+            expected = pd.concat([normalize(factor.loc[[date]], industry.loc[[date]],
+                                            caps.loc[[date]] if caps is not None else None)
+                                  for date in factor.index.levels[0]])
+            assert_series_equal(calculated, expected)
+
+    def testNormalizeMultiFactorData(self):
+        factor, industry, cap = self._get_multi_date_data()
+        factor2 = pd.Series(np.random.RandomState(0).randn(len(factor)), index=factor.index, name='factor2')
+        factor3 = factor.drop(factor.index[3]).rename('factor3')
+        for caps in [None, cap]:
+            calculated = normalize_multi_factor_data([factor, factor2, factor3], industry, caps)
+            for i, data in enumerate([factor, factor2, factor3]):
+                assert_series_equal(calculated[i], normalize_single_factor_data(data, industry, caps))
+
+    def testNormalizeMultiFactorDataDifferentIndex(self):
+        # 各因子的index不同: 缺行、多出的股票、不同的行顺序、na值; 结果应与逐个因子处理相同
+        factor, industry, cap = self._get_multi_date_data()
+        rs = np.random.RandomState(1)
+        factor2 = factor.drop(factor.index[[1, 12]]).rename('factor2')
+        extra_index = pd.MultiIndex.from_arrays([[pd.Timestamp('2015-01-30'), pd.Timestamp('2015-02-27')],
+                                                 ['000011.SZ', '000012.SZ']], names=['tiaoCangDate', 'secID'])
+        factor3 = pd.Series(rs.randn(len(factor)), index=factor.index, name='factor3')
+        factor3 = pd.concat([factor3, pd.Series([0.5, -0.5], index=extra_index, name='factor3')])
+        factor3 = factor3.iloc[rs.permutation(len(factor3))]
+        factor3.iloc[4] = np.nan
+        factors = [factor, factor2, factor3]
+        for caps in [None, cap]:
+            calculated = normalize_multi_factor_data(factors, industry, caps)
+            for i, data in enumerate(factors):
+                assert_series_equal(calculated[i], normalize_single_factor_data(data, industry, caps))
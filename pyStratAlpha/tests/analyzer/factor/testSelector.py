@@ -3,8 +3,11 @@ import datetime
 import os
 import unittest
 
+import numpy as np
 import pandas as pd
+from pandas.util.testing import assert_frame_equal
 
+from pyStratAlpha.analyzer.factor import get_multi_index_data
 from pyStratAlpha.analyzer.factor.selector import Selector
 from pyStratAlpha.analyzer.indexComp.indexComp import IndexComp
 
@@ -122,3 +125,142 @@ class TestSelector(unittest.TestCase):
              '600176.SH', '000887.SZ', '600361.SH', '002681.SZ', '002508.SZ', '601231.SH', '600478.SH', '300392.SZ',
              '002657.SZ', '600030.SH', '002143.SZ', '000069.SZ', '600686.SH']]
         self.assertEqual(list(calculated.values), expected)
+
+
+def sec_selection_by_loop(sec_score, industry, index_comp, nb_sec_selected_per_industry_min, nb_sec_selected_total,
+                          industry_neutral, ignore_zero_weight):
+    # 逐个调仓日、逐个行业选股的原始实现, 作为参照
+    sec_score = pd.concat([sec_score, industry], join_axes=[sec_score.index], axis=1)
+    ret = pd.DataFrame()
+    for date in sorted(set(sec_score.index.get_level_values('tiaoCangDate'))):
+        sec_score_on_date = get_multi_index_data(sec_score, 'tiaoCangDate', date).copy()
+        sec_score_on_date.sort_values(by='score', ascending=False, inplace=True, kind='mergesort')
+        if industry_neutral:
+            sec_score_on_date[industry.name] = sec_score_on_date[industry.name].fillna('other')
+            industry_weight = index_comp.get_industry_weight_on_date(date)
+            for name, group in sec_score_on_date.groupby(industry.name):
+                if ignore_zero_weight and industry_weight[name] == 0:
+                    continue
+                nb_sec_selected = int(max(len(group) * 0.1, nb_sec_selected_per_industry_min))
+                if len(group) > nb_sec_selected:
+                    largest_score = group[:nb_sec_selected].copy()
+                    largest_score['weight'] = industry_weight[name] / nb_sec_selected / 100.0
+                else:
+                    largest_score = group.copy()
+                    largest_score['weight'] = industry_weight[name] / len(group) / 100.0
+                ret = pd.concat([ret, largest_score], axis=0)
+        else:
+            sec_score_on_date = sec_score_on_date[:nb_sec_selected_total + 1]
+            sec_score_on_date['weight'] = 1.0 / nb_sec_selected_total
+            ret = pd.concat([ret, sec_score_on_date], axis=0)
+    return ret
+
+
+class TestSelectorSynthetic(unittest.TestCase):
+    def setUp(self):
+        # 两个调仓日: 行业A股票数多于最少入选数且分数有并列, 行业B股票数少于最少入选数,
+        # 行业C在第一个调仓日权重为0, 行业缺失的股票归入'other'
+        dates = [datetime.datetime(2015, 1, 30), datetime.datetime(2015, 2, 27)]
+        industries = ['A'] * 12 + ['B'] * 2 + ['C'] * 4 + [np.nan] * 2
+        scores = [[5.0, 3.0, 3.0, 3.0, 2.0, 9.0, 1.0, 0.5, 3.0, 0.1, 0.2, 0.3, 4.0, 4.0, 7.0, 7.0, 6.0, 1.5, 8.0, 2.5],
+                  [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 6.0, 6.0, 0.0, 0.5, 2.5, 3.5, 0.2, 9.0, 2.0, 2.0, 7.0, 1.0, 3.0, 3.0]]
+        sec_ids = ['{0:06d}.SZ'.format(i) for i in range(len(industries))]
+        index = pd.MultiIndex.from_product([dates, sec_ids], names=['tiaoCangDate', 'secID'])
+        self.sec_score = pd.Series(scores[0] + scores[1], index=index, name='score')
+        self.industry = pd.Series(industries * 2, index=index, name='INDUSTRY')
+        index = pd.MultiIndex.from_product([dates, ['A', 'B', 'C']], names=['tiaoCangDate', 'secID'])
+        self.industry_weight = pd.Series([60.0, 30.0, 0.0, 50.0, 20.0, 20.0], index=index, name='IND_WGT')
+
+    def _get_selector(self, **kwargs):
+        return Selector(sec_score=self.sec_score.copy(),
+                        industry=self.industry,
+                        index_comp=IndexComp(industry_weight=self.industry_weight),
+                        use_industry_name=False,
+                        **kwargs)
+
+    def testSecSelection(self):
+        for industry_neutral in [True, False]:
+            for ignore_zero_weight in [True, False]:
+                selector = self._get_selector(nb_sec_selected_per_industry_min=3,
+                                              nb_sec_selected_total=5,
+                                              ignore_zero_weight=ignore_zero_weight)
+                selector.industry_neutral = industry_neutral
+                selector.sec_selection()
+                expected = sec_selection_by_loop(selector._secScore, self.industry, selector._indexComp, 3, 5,
+                                                 industry_neutral, ignore_zero_weight)
+                assert_frame_equal(selector.sec_selected_full_info, expected)
+
+    def testSecSelectionCounts(self):
+        selector = self._get_selector(nb_sec_selected_per_industry_min=3, nb_sec_selected_total=5,
+                                      ignore_zero_weight=True)
+        selector.sec_selection()
+        calculated = selector.sec_selected_full_info
+        count = calculated.groupby([calculated.index.get_level_values('tiaoCangDate'), 'INDUSTRY']).size()
+        # A选3只, B只有2只全部入选, C在第一个调仓日权重为0不入选
+        self.assertEqual(count.loc[datetime.datetime(2015, 1, 30)].to_dict(), {'A': 3, 'B': 2, 'other': 2})
+        self.assertEqual(count.loc[datetime.datetime(2015, 2, 27)].to_dict(), {'A': 3, 'B': 2, 'C': 3, 'other': 2})
+        self.assertAlmostEqual(calculated['weight'].loc[datetime.datetime(2015, 2, 27)].sum(), 1.0)
+
+        selector.industry_neutral = False
+        selector.sec_selection()
+        self.assertEqual(selector.sec_selected.map(len).tolist(), [6, 6])
+
+    def testSecSelectionMissingIndustryWeight(self):
+        self.industry_weight = self.industry_weight.drop((datetime.datetime(2015, 2, 27), 'B'))
+        selector = self._get_selector(nb_sec_selected_per_industry_min=3)
+        with self.assertRaises(KeyError):
+            selector.sec_selection()
+
+    def testSecSelectionNaNIndustryWeight(self):
+        # 行业在调仓日有数据但权重为NaN: 与逐日实现相同, 照常入选且权重为NaN
+        # 先只在第二个调仓日为NaN, 再在所有调仓日均为NaN
+        for date in [datetime.datetime(2015, 2, 27), datetime.datetime(2015, 1, 30)]:
+            self.industry_weight.loc[(date, 'B')] = np.nan
+            self._check_nan_industry_weight()
+
+    def _check_nan_industry_weight(self):
+        for ignore_zero_weight in [True, False]:
+            selector = self._get_selector(nb_sec_selected_per_industry_min=3, ignore_zero_weight=ignore_zero_weight)
+            selector.sec_selection()
+            expected = sec_selection_by_loop(selector._secScore, self.industry, selector._indexComp, 3, 100, True,
+                                             ignore_zero_weight)
+            assert_frame_equal(selector.sec_selected_full_info, expected)
+            calculated = get_multi_index_data(selector.sec_selected_full_info, 'tiaoCangDate',
+                                              datetime.datetime(2015, 2, 27))
+            self.assertTrue(calculated.loc[calculated['INDUSTRY'] == 'B', 'weight'].isnull().all())
+            self.assertEqual((calculated['INDUSTRY'] == 'B').sum(), 2)
+
+    def testEncodeSecSelected(self):
+        # 行按调仓日乱序排列, 每个调仓日内的股票顺序需保持不变
+        dates = [datetime.datetime(2015, 2, 27), datetime.datetime(2015, 1, 30), datetime.datetime(2015, 2, 27),
+                 datetime.datetime(2015, 1, 30)]
+        index = pd.MultiIndex.from_arrays([dates, ['000002.SZ', '000003.SZ', '000001.SZ', '000001.SZ']],
+                                          names=['tiaoCangDate', 'secID'])
+        full_info = pd.DataFrame({'score': [4.0, 3.0, 2.0, 1.0]}, index=index)
+        sec_ids, codes = Selector._encode_sec_selected(full_info)
+        self.assertEqual(sec_ids.tolist(), ['000001.SZ', '000002.SZ', '000003.SZ'])
+        self.assertEqual(sorted(codes.keys()), [datetime.datetime(2015, 1, 30), datetime.datetime(2015, 2, 27)])
+        self.assertEqual(codes[datetime.datetime(2015, 1, 30)].tolist(), [2, 0])
+        self.assertEqual(codes[datetime.datetime(2015, 2, 27)].tolist(), [1, 0])
+
+        expected = pd.Series([['000003.SZ', '000001.SZ'], ['000002.SZ', '000001.SZ']],
+                             index=[datetime.datetime(2015, 1, 30), datetime.datetime(2015, 2, 27)])
+        self.assertEqual(Selector._decode_sec_selected(sec_ids, codes).to_dict(), expected.to_dict())
+        self.assertEqual(Selector._save_sec_selected_from_full_info(full_info).to_dict(), expected.to_dict())
+
+        # 没有入选股票
+        sec_ids, codes = Selector._encode_sec_selected(full_info.iloc[:0])
+        self.assertEqual(len(sec_ids), 0)
+        self.assertEqual(codes, {})
+        self.assertEqual(len(Selector._decode_sec_selected(sec_ids, codes)), 0)
+
+    def testSecSelectedCodes(self):
+        selector = self._get_selector(nb_sec_selected_per_industry_min=3)
+        selector.sec_selection()
+        full_info = selector.sec_selected_full_info
+        sec_id_universe = selector.sec_id_universe
+        self.assertEqual(sec_id_universe.tolist(), sorted(set(full_info.index.get_level_values('secID'))))
+        for date, sec_selected in selector.sec_selected.iteritems():
+            expected = get_multi_index_data(full_info, 'tiaoCangDate', date).index.get_level_values('secID').tolist()
+            self.assertEqual(sec_id_universe[selector.sec_selected_codes[date]].tolist(), expected)
+            self.assertEqual(sec_selected, expected)
@@ -30,6 +30,22 @@ class TestIndexComp(unittest.TestCase):
                     '801890.SI': 6.7000000000000002, '801200.SI': 3.7400000000000002}
         self.assertEqual(calculated, expected)
 
+    def testGetIndustryWeightOnDateWithNaN(self):
+        # 当日有数据但权重为NaN的行业需保留, 当日没有数据的行业不返回
+        index = pd.MultiIndex.from_arrays([[datetime(2015, 1, 30), datetime(2015, 1, 30), datetime(2015, 2, 27),
+                                            datetime(2015, 2, 27)],
+                                           ['801080.SI', '801030.SI', '801080.SI', '801020.SI']],
+                                          names=['tiaoCangDate', 'secID'])
+        index_comp = IndexComp(pd.Series([60.0, float('nan'), 50.0, 30.0], index=index, name='Weight'))
+        calculated = index_comp.get_industry_weight_on_date(datetime(2015, 1, 30))
+        self.assertEqual(sorted(calculated.keys()), ['801030.SI', '801080.SI', 'other'])
+        self.assertTrue(pd.isnull(calculated['801030.SI']))
+        self.assertEqual(calculated['801080.SI'], 60.0)
+        self.assertEqual(calculated['other'], 40.0)
+
+        calculated = index_comp.get_industry_weight_on_date(datetime(2015, 2, 27))
+        self.assertEqual(calculated, {'801080.SI': 50.0, '801020.SI': 30.0, 'other': 20.0})
+
     def testGetIndustryWeightOnName(self):
         calculated = self.indexComp.get_industry_weight_on_name("801080.SI")
         index = pd.MultiIndex.from_arrays(
@@ -49,6 +65,23 @@ class TestIndexComp(unittest.TestCase):
         calculated = self.indexComp.get_industry_weight_on_name("电子")
         assert_series_equal(calculated, expected)
 
+    def testGetIndustryWeightOnDates(self):
+        dates = [datetime(2015, 1, 30), datetime(2014, 12, 31), datetime(2030, 1, 1)]
+        calculated = self.indexComp.get_industry_weight_on_dates(dates)
+        self.assertEqual(list(calculated.index), dates)
+        for date in dates[:2]:
+            self.assertEqual(calculated.loc[date].dropna().to_dict(), self.indexComp.get_industry_weight_on_date(date))
+        self.assertEqual(calculated.loc[dates[2]].dropna().to_dict(), {'other': 100.0})
+        self.assertEqual(self.indexComp.get_industry_weight_on_date(dates[2]), {'other': 100.0})
+
+    def testGetIndustryWeightSeries(self):
+        calculated = self.indexComp.get_industry_weight_series("电子")
+        expected = self.indexComp.get_industry_weight_on_name("801080.SI")
+        self.assertEqual(calculated.tolist(), expected.tolist())
+        self.assertEqual(list(calculated.index), list(expected.index.get_level_values('tiaoCangDate')))
+
+        self.assertEqual(IndexComp._get_industry_code("机械设备"), '801070.SI')
+
     def testMapIndustryCodeToName(self):
         industry = pd.Series(['801200.SI', '801090.SI'], index=['300158.SZ', '600328.SH'])
         calculated = self.indexComp.map_industry_code_to_name(industry)
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+from pyStratAlpha.tests.analyzer.portfolio.testPortfolio import TestPortfolio
+from pyStratAlpha.tests.analyzer.portfolio.testSecFilter import TestSecFilter
+
+__all__ = ['TestPortfolio',
+           'TestSecFilter']
@@ -1,14 +1,21 @@
 # -*- coding: utf-8 -*-
 import os
+import shutil
+import tempfile
 import unittest
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
+from PyFin.api.DateUtilities import bizDatesList
+from numpy.testing import assert_array_almost_equal
 from pandas.util.testing import assert_frame_equal
 from pandas.util.testing import assert_series_equal
 
 from pyStratAlpha.analyzer.factor.cleanData import get_multi_index_data
 from pyStratAlpha.analyzer.portfolio.portfolio import Portfolio
+from pyStratAlpha.analyzer.portfolio.secFilter import calc_sec_filters
+from pyStratAlpha.analyzer.portfolio.secFilter import merge_sec_filters
 from pyStratAlpha.enums import DataSource
 
 
@@ -46,13 +53,6 @@ class TestPortfolio(unittest.TestCase):
 
         self.get_filtered_result = get_filtered_result
 
-    def testGetSecPriceBetweenTiaoCangDate(self):
-        calculated = self.portfolio._get_sec_price_between_tiaocang_date(datetime(2012, 8, 31),
-                                                                         datetime(2012, 9, 30))
-        expected = self.price_data[self.price_data.index >= datetime(2012, 7, 31)]
-        expected = expected[expected.index <= datetime(2012, 8, 31)]
-        assert_frame_equal(calculated, expected)
-
     def testGetSecPriceOnDate(self):
         calculated = self.portfolio._get_sec_price_on_date(self.price_data, datetime(2012, 8, 6))
         expected = self.price_data.loc[datetime(2012, 8, 6)]
@@ -60,34 +60,73 @@ class TestPortfolio(unittest.TestCase):
         assert_series_equal(calculated, expected)
 
     def testGetWeightOnDate(self):
-        calculated = self.portfolio._get_weight_on_date(datetime(2012, 8, 31))
-        expected = self.get_filtered_result('secID_2', 'weight_2', 'secID', 'weight')
-        assert_series_equal(calculated, expected)
-
-    def testFilterSecOnTiaoCangDate(self):
-        sec_id = ['000702.SZ', '600538.SH', '600975.SH', '002143.SZ', '002286.SZ', '002548.SZ', '002477.SZ',
-                  '002124.SZ', '600508.SH', '601001.SH', '600403.SH', '300164.SZ', '600971.SH', '300192.SZ',
-                  '600094.SH', '000985.SZ', '002217.SZ', '600378.SH', '300163.SZ', '002455.SZ', '002054.SZ',
-                  '002343.SZ', '002113.SZ', '600731.SH', '600985.SH', '000782.SZ', '002361.SZ', '300132.SZ']
-
-        calculated = self.portfolio._filter_sec_on_tiaocang_date(datetime(2012, 8, 31), sec_id)
-
-        expected = self.get_filtered_result('secID_1', 'filters_1', 'secID', 'filters')
-        expected = expected.astype('int32')
-        assert_series_equal(calculated, expected)
-
-    def testUpdateWeightAfterFilter(self):
-        filtered = self.get_filtered_result('secID_1', 'filters_1', 'secID', 'filters')
-        weight = get_multi_index_data(self.portfolio._sec_selected, 'tiaoCangDate', datetime(2012, 8, 31), 'secID',
-                                      filtered.index.values)
-        weight = weight.reset_index().set_index('secID')
-        weight = weight[['weight', 'INDUSTRY']]
-        calculated = self.portfolio._update_weight_after_filter(weight, filtered)
-
+        # 价格数据只覆盖第一个调仓日
+        date = datetime(2012, 8, 31)
+        sec_selected = get_multi_index_data(self.portfolio._sec_selected, 'tiaoCangDate', [date])
+        portfolio = self._get_portfolio_on_price(sec_selected, self.price_data, '2012-09-28')
+        calculated = portfolio._get_weight_on_date(date)
+        # 目标权重矩阵只计算一次
+        target_weight = portfolio.calc_target_weight()
+        portfolio._get_weight_on_date(date)
+        self.assertIs(portfolio.calc_target_weight(), target_weight)
+        # 按行业排列的顺序不变
+        self.assertEqual(calculated.index.tolist(), self.get_filtered_result('secID_2', 'weight_2', 'secID',
+                                                                             'weight').index.tolist())
+
+        # 不可交易(包括价格数据中没有)的股票权重为0, 其权重由同行业其余股票平分, 再归一化
+        sec_selected = sec_selected.reset_index(level='tiaoCangDate', drop=True)
+        filters = merge_sec_filters(calc_sec_filters(self.price_data)).loc[date]
+        filters = filters.reindex(sec_selected.index, fill_value=True)
+        expected = pd.Series(0.0, index=sec_selected.index, name='weight')
+        for _, group in sec_selected.groupby('INDUSTRY'):
+            is_filtered = filters.loc[group.index]
+            if not is_filtered.any():
+                expected.loc[group.index] = group['weight']
+            elif not is_filtered.all():
+                expected.loc[is_filtered.index[~is_filtered.values]] = group['weight'].sum() / (~is_filtered).sum()
+        expected = expected / expected.sum()
+        assert_series_equal(calculated, expected.loc[calculated.index])
+        self.assertAlmostEqual(calculated.sum(), 1.0)
+
+    def testCalcTargetWeightAllFiltered(self):
+        trade_date = pd.to_datetime(bizDatesList('China.SSE', '2012-07-02', '2012-09-28'))
+        price_data = pd.DataFrame({'000001.SZ': 10.0 + 0.1 * np.arange(len(trade_date)),
+                                   '000002.SZ': 20.0 - 0.05 * np.arange(len(trade_date))},
+                                  index=trade_date)
+        price_data.index.name = 'tradeDate'
+        # 第二个调仓日前所有入选股票均停牌
+        price_data.loc[datetime(2012, 8, 29):datetime(2012, 8, 31)] = [[10.0, 20.0]] * 3
+
+        tiaocang_date = [datetime(2012, 7, 31), datetime(2012, 8, 31)]
+        index = pd.MultiIndex.from_product([tiaocang_date, ['000001.SZ', '000002.SZ']],
+                                           names=['tiaoCangDate', 'secID'])
+        sec_selected = pd.DataFrame({'weight': [0.5] * 4, 'INDUSTRY': ['ind1', 'ind2'] * 2},
+                                    index=index, columns=['weight', 'INDUSTRY'])
+        portfolio = self._get_portfolio_on_price(sec_selected, price_data, '2012-09-28')
+        with self.assertRaisesRegexp(ValueError, '2012-08-31'):
+            portfolio.calc_target_weight()
+        with self.assertRaises(ValueError):
+            portfolio.calc_ptf_value_curve()
+
+    def testSecFilterMask(self):
+        date = datetime(2012, 8, 31)
+        expected = self.get_filtered_result('secID_1', 'filters_1', 'secID', 'filters').astype(bool)
+        calculated = merge_sec_filters(calc_sec_filters(self.price_data)).loc[date].reindex(expected.index)
+        self.assertEqual(calculated.tolist(), expected.tolist())
+
+        # 组合在预取的价格上计算的过滤条件与之相同
+        calculated = self.portfolio._get_sec_filter_mask().loc[date].reindex(expected.index)
+        self.assertEqual(calculated.tolist(), expected.tolist())
+    def testCalcTargetWeightOnFixture(self):
+        # 只含有价格数据的股票时, 调仓日目标权重为过滤并在行业内重新分配后的权重再归一化
+        date = datetime(2012, 8, 31)
         expected = self.get_filtered_result('secID_4', ['weight_4', 'INDUSTRY', 'filters_4'], 'secID',
                                             ['weight', 'INDUSTRY', 'filters'])
-        assert_frame_equal(calculated, expected)
-
+        sec_selected = get_multi_index_data(self.portfolio._sec_selected, 'tiaoCangDate', date, 'secID',
+                                            expected.index.tolist())
+        portfolio = self._get_portfolio_on_price(sec_selected, self.price_data, '2012-09-28')
+        calculated = portfolio.calc_target_weight().loc[date].reindex(expected.index)
+        assert_array_almost_equal(calculated.values, (expected['weight'] / expected['weight'].sum()).values)
     def testGetQuantity(self):
         init_ptf_value = 10000000
         filtered = self.filtered[['filters_1', 'secID_1']].dropna().set_index('secID_1')
@@ -102,3 +141,82 @@ class TestPortfolio(unittest.TestCase):
         expected = self.get_filtered_result('secID_3', 'quantity', 'secID', 'quantity')
         expected = expected.astype('int64')
         assert_series_equal(calculated, expected)
+
+    def testPrefetchSecPrice(self):
+        self.assertIsNone(self.portfolio._sec_price)
+        self.portfolio.prefetch_sec_price()
+        assert_frame_equal(self.portfolio._sec_price, self.price_data[self.portfolio._sec_price.columns])
+
+        calculated = self.portfolio._get_sec_filter_mask()
+        expected = merge_sec_filters(calc_sec_filters(self.price_data))[calculated.columns]
+        assert_frame_equal(calculated, expected)
+    @staticmethod
+    def _get_portfolio_on_price(sec_selected, price_data, end_date, **kwargs):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            price_data_path = os.path.join(tmp_dir, 'price_data.csv')
+            price_data.to_csv(price_data_path)
+            portfolio = Portfolio(sec_selected=sec_selected,
+                                  end_date=end_date,
+                                  data_source=DataSource.CSV,
+                                  csv_path=price_data_path,
+                                  **kwargs)
+            portfolio.prefetch_sec_price()
+        finally:
+            shutil.rmtree(tmp_dir)
+        return portfolio
+
+    def testCalcPtfValueCurve(self):
+        trade_date = pd.to_datetime(bizDatesList('China.SSE', '2012-07-02', '2012-09-28'))
+        price = np.array([10.0 + 0.1 * np.arange(len(trade_date)), 20.0 - 0.05 * np.arange(len(trade_date))]).T
+        # 两个连续交易日价格不变, 净值相同, 两个净值都应保留
+        price[40] = price[39]
+        price_data = pd.DataFrame(price, index=trade_date, columns=['000001.SZ', '600000.SH'])
+        price_data.index.name = 'tradeDate'
+
+        tiaocang_date = [datetime(2012, 7, 31), datetime(2012, 8, 31)]
+        index = pd.MultiIndex.from_product([tiaocang_date, ['000001.SZ', '600000.SH']],
+                                           names=['tiaoCangDate', 'secID'])
+        sec_selected = pd.DataFrame({'weight': 0.5, 'INDUSTRY': 'ind'}, index=index, columns=['weight', 'INDUSTRY'])
+
+        portfolio = self._get_portfolio_on_price(sec_selected, price_data, '2012-09-28', initial_capital=1000000.0)
+        calculated = portfolio.calc_ptf_value_curve()
+
+        # 调仓日按旧持仓计算净值, 新持仓从下一个交易日起生效
+        price_data = price_data[price_data.index >= tiaocang_date[0]]
+        ptf_value = pd.Series(1000000.0, index=price_data.index)
+        quantity = (1000000.0 * 0.5 / price_data.loc[tiaocang_date[0]]).apply(int)
+        for date in price_data.index[1:]:
+            ptf_value[date] = (quantity * price_data.loc[date]).sum()
+            if date == tiaocang_date[1]:
+                quantity = (ptf_value[date] * 0.5 / price_data.loc[date]).apply(int)
+        expected = ptf_value / 1000000.0
+        assert_series_equal(calculated, expected)
+        self.assertEqual(len(calculated), len(set(calculated.index)))
+
+    def testCalcTargetWeight(self):
+        trade_date = pd.to_datetime(bizDatesList('China.SSE', '2012-07-02', '2012-09-28'))
+        price_data = pd.DataFrame({'000001.SZ': 10.0 + 0.1 * np.arange(len(trade_date)),
+                                   '000002.SZ': 20.0 - 0.05 * np.arange(len(trade_date)),
+                                   '000003.SZ': 5.0 + 0.01 * np.arange(len(trade_date))},
+                                  index=trade_date)
+        price_data.index.name = 'tradeDate'
+        # 000002.SZ 在第二个调仓日前停牌
+        price_data.loc[datetime(2012, 8, 29):datetime(2012, 8, 31), '000002.SZ'] = 19.0
+
+        tiaocang_date = [datetime(2012, 7, 31), datetime(2012, 8, 31)]
+        index = pd.MultiIndex.from_product([tiaocang_date, ['000001.SZ', '000002.SZ', '000003.SZ']],
+                                           names=['tiaoCangDate', 'secID'])
+        sec_selected = pd.DataFrame({'weight': [0.3, 0.3, 0.4] * 2, 'INDUSTRY': ['ind1', 'ind1', 'ind2'] * 2},
+                                    index=index, columns=['weight', 'INDUSTRY'])
+        portfolio = self._get_portfolio_on_price(sec_selected, price_data, '2012-09-28')
+
+        calculated = portfolio.calc_target_weight()
+        expected = pd.DataFrame([[0.3, 0.3, 0.4], [0.6, 0.0, 0.4]],
+                                index=pd.DatetimeIndex(tiaocang_date, name='tiaoCangDate'),
+                                columns=pd.Index(['000001.SZ', '000002.SZ', '000003.SZ'], name='secID'))
+        assert_frame_equal(calculated, expected)
+
+        for date in tiaocang_date:
+            weight = portfolio._get_weight_on_date(date)
+            self.assertEqual(weight.to_dict(), calculated.loc[date].to_dict())
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import numpy as np
+import pandas as pd
+from pandas.util.testing import assert_frame_equal
+
+from pyStratAlpha.analyzer.portfolio.secFilter import calc_sec_filters
+from pyStratAlpha.analyzer.portfolio.secFilter import merge_sec_filters
+
+
+class TestSecFilter(unittest.TestCase):
+    def setUp(self):
+        index = pd.to_datetime(['2012-08-27', '2012-08-28', '2012-08-29', '2012-08-30', '2012-08-31'])
+        self.price = pd.DataFrame({'000001.SZ': [10.0, 10.1, 10.2, 10.3, 11.33],
+                                   '000002.SZ': [np.nan, np.nan, 5.0, 5.1, 5.2],
+                                   '000003.SZ': [8.0, 8.1, 8.2, 8.2, 8.2],
+                                   '000004.SZ': [6.0, 6.1, 6.2, 6.3, 6.4]},
+                                  index=index,
+                                  columns=['000001.SZ', '000002.SZ', '000003.SZ', '000004.SZ'])
+
+    def testCalcSecFilters(self):
+        calculated = calc_sec_filters(self.price, filter_return_on_tiaocang_date=0.09)
+        last_date = self.price.index[-1]
+        self.assertEqual(calculated['returnFilter'].loc[last_date].tolist(), [True, False, False, False])
+        self.assertEqual(calculated['ipoFilter'].loc[last_date].tolist(), [False, False, False, False])
+        self.assertEqual(calculated['ipoFilter'].loc[self.price.index[3]].tolist(), [False, True, False, False])
+        self.assertEqual(calculated['tingpaiFilter'].loc[last_date].tolist(), [False, False, True, False])
+
+        merged = merge_sec_filters(calculated)
+        self.assertEqual(merged.loc[last_date].tolist(), [True, False, True, False])
+
+        # 每个交易日的结果与只用该日及前两个交易日价格计算的结果一致
+        for i in range(2, len(self.price)):
+            expected = merge_sec_filters(calc_sec_filters(self.price.iloc[i - 2:i + 1])).iloc[-1]
+            self.assertEqual(merged.iloc[i].tolist(), expected.tolist())
+
+    def testExtraFilters(self):
+        st_flag = pd.DataFrame({'000004.SZ': [True]}, index=[self.price.index[-1]])
+        calculated = calc_sec_filters(self.price,
+                                      extra_filters={'stFilter': st_flag,
+                                                     'priceFilter': lambda price: price < 6.0})
+        expected = pd.DataFrame(False, index=self.price.index, columns=self.price.columns)
+        expected.loc[self.price.index[-1], '000004.SZ'] = True
+        assert_frame_equal(calculated['stFilter'], expected)
+
+        expected = self.price < 6.0
+        assert_frame_equal(calculated['priceFilter'], expected)
+
+        merged = merge_sec_filters(calculated)
+        self.assertEqual(merged.loc[self.price.index[-1]].tolist(), [True, True, True, True])
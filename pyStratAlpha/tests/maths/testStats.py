@@ -1,7 +1,15 @@
 # -*- coding: utf-8 -*-
 import unittest
 
+import numpy as np
+import scipy.stats as st
+from numpy.testing import assert_array_almost_equal
+from pyStratAlpha.maths.stats import ks_2samp_2d
+from pyStratAlpha.maths.stats import levene_2d
+from pyStratAlpha.maths.stats import pearson_corr
 from pyStratAlpha.maths.stats import running_sum
+from pyStratAlpha.maths.stats import spearman_corr
+from pyStratAlpha.maths.stats import ttest_ind_2d
 
 
 class TestStats(unittest.TestCase):
@@ -13,3 +21,47 @@ class TestStats(unittest.TestCase):
         calculated = list(running_sum([1, 2, 3, 4], 2))
         expected = [3, 5, 7]
         self.assertListEqual(calculated, expected, "Calculated Running Sum is wrong")
+
+    def testTwoSampleTests(self):
+        a = np.array([[0.1, 1.2, 0.3],
+                      [0.5, -0.2, 0.3],
+                      [-0.3, 0.4, 0.8],
+                      [0.2, 0.4, -0.1],
+                      [0.9, 1.1, 0.2]])
+        b = np.array([[0.4, 0.2, 0.3],
+                      [-0.5, 0.7, 1.5],
+                      [0.2, 0.1, 0.9],
+                      [0.6, -0.4, 0.3]])
+        tests = [(ttest_ind_2d, lambda x, y: st.ttest_ind(x, y, equal_var=False)),
+                 (levene_2d, st.levene),
+                 (ks_2samp_2d, st.ks_2samp)]
+        for func, expected_func in tests:
+            calculated = func(a, b)
+            expected = np.array([expected_func(a[:, j], b[:, j]) for j in range(a.shape[1])]).T
+            assert_array_almost_equal(calculated, expected)
+
+    def testGroupCorr(self):
+        x = np.array([[0.1, 1.2, 0.3],
+                      [0.5, -0.2, 0.3],
+                      [-0.3, 0.4, np.nan],
+                      [0.2, 0.4, -0.1],
+                      [0.9, 1.1, 0.2],
+                      [0.4, 0.2, 0.3],
+                      [-0.5, 0.7, 1.5],
+                      [0.2, 0.1, 0.9],
+                      [0.6, -0.4, 0.3]])
+        y = np.array([0.3, -0.1, 0.2, 0.5, 0.1, -0.2, 0.4, 0.0, 0.3])
+        groups = np.array([0, 0, 0, 0, 0, 1, 1, 1, 1])
+        for func, expected_func in [(spearman_corr, st.spearmanr), (pearson_corr, st.pearsonr)]:
+            calculated = func(x, y, groups=groups)
+            expected = [[expected_func(x[groups == i, j], y[groups == i])[0] for j in range(3)] for i in range(2)]
+            expected[0][2] = np.nan
+            assert_array_almost_equal(calculated.values, expected)
+
+            calculated = func(x, y, groups=groups, nan_policy='omit')
+            valid = ~np.isnan(x[:, 2]) & (groups == 0)
+            self.assertAlmostEqual(calculated.values[0, 2], expected_func(x[valid, 2], y[valid])[0])
+
+        calculated = spearman_corr(x[:, :2], y)
+        expected = [st.spearmanr(x[:, j], y)[0] for j in range(2)]
+        assert_array_almost_equal(calculated.values, expected)
@@ -28,6 +28,20 @@ def test():
     suite.addTests(tests)
     tests = unittest.TestLoader().loadTestsFromTestCase(analyzer.TestNavAnalyzer)
     suite.addTests(tests)
+    tests = unittest.TestLoader().loadTestsFromTestCase(analyzer.factor.TestFactorCache)
+    suite.addTests(tests)
+    tests = unittest.TestLoader().loadTestsFromTestCase(analyzer.factor.TestFactorPanel)
+    suite.addTests(tests)
+    tests = unittest.TestLoader().loadTestsFromTestCase(analyzer.factor.TestFactorStore)
+    suite.addTests(tests)
+    tests = unittest.TestLoader().loadTestsFromTestCase(analyzer.factor.TestSelectorSynthetic)
+    suite.addTests(tests)
+    tests = unittest.TestLoader().loadTestsFromTestCase(analyzer.indexComp.TestIndexComp)
+    suite.addTests(tests)
+    tests = unittest.TestLoader().loadTestsFromTestCase(analyzer.portfolio.TestPortfolio)
+    suite.addTests(tests)
+    tests = unittest.TestLoader().loadTestsFromTestCase(analyzer.portfolio.TestSecFilter)
+    suite.addTests(tests)
     tests = unittest.TestLoader().loadTestsFromTestCase(maths.TestMatrix)
     suite.addTests(tests)
     tests = unittest.TestLoader().loadTestsFromTestCase(maths.TestStats)